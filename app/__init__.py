@@ -1,24 +1,59 @@
 from flask import Flask
 from .config import Config
 from .extensions import db, migrate, jwt
+from .utils.compression import init_compression
+from .utils.db_pool import configure_engine_options, init_pool_metrics
+from .utils.db_routing import init_db_routing
+from .utils.json_provider import FastJSONProvider
+from .utils.metrics import init_metrics
+from .utils.sharding import init_sharding
 
 
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__)
     app.config.from_object(Config)
+    if config_overrides:
+        app.config.update(config_overrides)
 
+    app.json = FastJSONProvider(app)
+    init_compression(app)
+
+    configure_engine_options(app)
     db.init_app(app)
+    init_db_routing(app, db)
+    init_sharding(app, db)
+    init_pool_metrics(app, db)
+    init_metrics(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
 
     # Import models AFTER db is ready (prevents circular import)
     from app import models  # noqa: F401
 
+    from .services.change_feed import init_change_feed
+    from .services.cohort import init_cohort_cube
+    from .services.idempotency import init_idempotency
+    from .services.invalidation import init_invalidation
+    from .services.kb_cache import init_kb_cache
+    from .services.rbac_service import init_rbac_cache
+    from .services.session_store import init_session_store
+    from .services.symptom_priors import init_symptom_priors
+    init_invalidation(app)
+    init_kb_cache(app)
+    init_rbac_cache(app)
+    init_session_store(app)
+    init_idempotency(app)
+    init_change_feed(app)
+    init_cohort_cube(app)
+    init_symptom_priors(app)
+
     # Register blueprints
     from .routes.auth import auth_bp
     from .routes.admin_kb import admin_kb_bp
     from .routes.diagnosis import diagnosis_bp
+    from .routes.stateless import stateless_bp
     from .routes.admin_users import admin_users_bp
+    from .routes.admin_cases import admin_cases_bp
     from .routes.kb import kb_bp
     from .routes.kb_rules import kb_rules_bp
     from .routes.kb_advices import kb_advices_bp
@@ -28,13 +63,18 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(admin_kb_bp, url_prefix="/api/admin/kb")
     app.register_blueprint(admin_users_bp, url_prefix="/api/admin")
+    app.register_blueprint(admin_cases_bp, url_prefix="/api/admin")
     app.register_blueprint(diagnosis_bp, url_prefix="/api/diagnosis")
+    app.register_blueprint(stateless_bp, url_prefix="/api/diagnosis/stateless")
     app.register_blueprint(kb_bp, url_prefix="/api/kb")
     app.register_blueprint(kb_rules_bp, url_prefix="/api/kb")
     app.register_blueprint(kb_advices_bp, url_prefix="/api/kb")
 
 
 
+    from .cli import register_cli
+    register_cli(app)
+
     @app.get("/health")
     def health():
         return {"status": "ok"}
@@ -0,0 +1,327 @@
+import json
+
+import click
+from flask.cli import AppGroup, with_appcontext
+
+from app.extensions import db
+
+kb_cli = AppGroup("kb", help="Knowledge base snapshot tools.")
+
+
+@kb_cli.command("export")
+@click.argument("path", default="-")
+def kb_export(path):
+    """Write the KB as a versioned snapshot to PATH (.gz compresses, - for stdout)."""
+    from app.services.kb_snapshot import dump_snapshot, export_snapshot
+
+    snapshot = export_snapshot()
+    dump_snapshot(snapshot, path)
+    if path != "-":
+        click.echo(
+            f"exported kb_version={snapshot['kb_version']}: {len(snapshot['symptoms'])} symptoms, "
+            f"{len(snapshot['rules'])} rules, {len(snapshot['advices'])} advices -> {path}"
+        )
+
+
+@kb_cli.command("import")
+@click.argument("path")
+@click.option("--prune", is_flag=True, help="Delete KB items that are not in the snapshot.")
+@click.option("--insert-only", is_flag=True, help="Only add missing items, never modify existing ones.")
+@click.option("--dry-run", is_flag=True, help="Compute and print the diff, then roll back.")
+def kb_import(path, prune, insert_only, dry_run):
+    """Diff a snapshot against the database by natural key and apply it in one transaction."""
+    from app.services.kb_editor import KbEditError
+    from app.services.kb_snapshot import import_snapshot, load_snapshot
+
+    try:
+        summary = import_snapshot(load_snapshot(path), prune=prune, update_existing=not insert_only)
+    except KbEditError as e:
+        db.session.rollback()
+        raise click.ClickException(e.message)
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    click.echo(json.dumps({"dry_run": dry_run, **summary}, indent=2))
+
+
+cache_cli = AppGroup("cache", help="Cross-worker cache versions.")
+
+
+@cache_cli.command("versions")
+def cache_versions():
+    """Show the current version of every cache scope."""
+    from app.models import CacheVersion
+
+    for row in CacheVersion.query.order_by(CacheVersion.scope.asc()).all():
+        click.echo(f"{row.scope}\t{row.version}\t{row.updated_at.isoformat(timespec='seconds')}")
+
+
+@cache_cli.command("bump")
+@click.argument("scope", type=click.Choice(["kb", "rbac"]))
+def cache_bump(scope):
+    """Invalidate SCOPE on all workers (e.g. after editing roles directly in the database)."""
+    from app.services.invalidation import bump_cache_version
+
+    if scope == "kb":
+        from app.services.kb_version_service import bump_kb_version
+        version = bump_kb_version(note="MANUAL_INVALIDATION").id
+    else:
+        version = bump_cache_version(scope)
+    db.session.commit()
+    click.echo(f"{scope} -> {version}")
+
+
+shards_cli = AppGroup("shards", help="Assessment shards (DATABASE_SHARD_URLS).")
+
+
+@shards_cli.command("init")
+def shards_init():
+    """Create the assessment tables on every configured shard (existing tables are kept)."""
+    from app.utils.sharding import create_shard_schema, shard_router
+
+    if not shard_router.enabled:
+        raise click.ClickException("sharding is not configured (set DATABASE_SHARD_URLS)")
+    for key in create_shard_schema():
+        click.echo(f"{key}: ok")
+
+
+@shards_cli.command("status")
+def shards_status():
+    """Assessment counts per shard, next to what the directory expects."""
+    import sqlalchemy as sa
+    from app.models import Assessment, AssessmentDirectory
+    from app.utils.sharding import fan_out, shard_router
+
+    if not shard_router.enabled:
+        raise click.ClickException("sharding is not configured (set DATABASE_SHARD_URLS)")
+    expected = dict(
+        db.session.execute(
+            sa.select(AssessmentDirectory.shard_key, sa.func.count()).group_by(AssessmentDirectory.shard_key)
+        ).all()
+    )
+    counts = fan_out(lambda s: s.execute(sa.select(sa.func.count(Assessment.id))).scalar())
+    for key, count in counts.items():
+        click.echo(f"{key}\t{count}\tdirectory={expected.get(key, 0)}")
+
+
+sessions_cli = AppGroup("sessions", help="Write-behind state of in-progress assessments (SESSION_STORE).")
+
+
+@sessions_cli.command("flush")
+def sessions_flush():
+    """Write every pending answer to the database now."""
+    from app.services.session_store import session_store
+
+    if not session_store.enabled:
+        raise click.ClickException("SESSION_STORE is not configured")
+    click.echo(f"flushed {session_store.flush()} answers")
+
+
+@sessions_cli.command("status")
+def sessions_status():
+    """Number of assessments with answers not yet written."""
+    from app.services.session_store import session_store
+
+    if not session_store.enabled:
+        raise click.ClickException("SESSION_STORE is not configured")
+    click.echo(f"dirty assessments: {len(session_store.backend.dirty_ids())}")
+
+
+facts_cli = AppGroup("facts", help="Assessment fact encodings.")
+
+
+@facts_cli.command("backfill-masks")
+@click.option("--batch-size", default=1000, show_default=True)
+def facts_backfill_masks(batch_size):
+    """Compute fact_known/fact_values for assessments that predate them."""
+    from app.services.inference_engine import backfill_fact_masks
+
+    click.echo(f"updated {backfill_fact_masks(batch_size)} assessments")
+
+
+assessments_cli = AppGroup("assessments", help="Assessment lifecycle: abandoned sessions and archival.")
+
+
+@assessments_cli.command("sweep")
+@click.option("--idle", type=float, default=None, help="Seconds without activity (default ASSESSMENT_IDLE_TTL).")
+@click.option("--batch-size", default=None, type=int)
+def assessments_sweep(idle, batch_size):
+    """Finalize or expire IN_PROGRESS assessments nobody touched for --idle seconds (schedule it)."""
+    from flask import current_app
+    from app.services.archive import sweep_abandoned
+
+    cfg = current_app.config
+    done = sweep_abandoned(
+        idle if idle is not None else cfg["ASSESSMENT_IDLE_TTL"], batch_size or cfg["ASSESSMENT_SWEEP_BATCH"],
+    )
+    click.echo(f"completed {done['completed']}, expired {done['expired']}")
+
+
+@assessments_cli.command("archive")
+@click.option("--older-than-days", type=float, default=None, help="Default ASSESSMENT_ARCHIVE_AFTER_DAYS.")
+@click.option("--batch-size", default=None, type=int)
+def assessments_archive(older_than_days, batch_size):
+    """Move closed assessments past the retention window into tbl_assessment_archive (schedule it)."""
+    from flask import current_app
+    from app.services.archive import archive_closed
+
+    cfg = current_app.config
+    moved = archive_closed(
+        older_than_days if older_than_days is not None else cfg["ASSESSMENT_ARCHIVE_AFTER_DAYS"],
+        batch_size or cfg["ASSESSMENT_SWEEP_BATCH"],
+    )
+    click.echo(f"archived {moved} assessments")
+
+
+@assessments_cli.command("export")
+@click.argument("path", default="-")
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default="ndjson", show_default=True)
+@click.option("--from", "started_from", type=click.DateTime(), default=None, help="started_at >= this.")
+@click.option("--to", "started_to", type=click.DateTime(), default=None, help="started_at < this.")
+@click.option("--diagnosis-code", default=None)
+@click.option("--risk-level", default=None)
+@click.option("--status", default=None)
+def assessments_export(path, fmt, started_from, started_to, diagnosis_code, risk_level, status):
+    """Stream every assessment with answers and result to PATH (.gz compresses, - for stdout)."""
+    import gzip
+    import sys
+    from flask import current_app
+    from app.services.export import ExportFilters, iter_csv, iter_ndjson, iter_records, symptom_codes
+
+    filters = ExportFilters(
+        started_from, started_to, diagnosis_code, risk_level.upper() if risk_level else None,
+        status.upper() if status else None,
+    )
+    codes = symptom_codes()
+    records = iter_records(filters, codes, current_app.config["EXPORT_BATCH_SIZE"])
+    chunks = iter_csv(records, codes) if fmt == "csv" else iter_ndjson(records)
+    if path == "-":
+        out = sys.stdout.buffer
+    else:
+        out = gzip.open(path, "wb") if path.endswith(".gz") else open(path, "wb")
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if path != "-":
+            out.close()
+
+
+feed_cli = AppGroup("feed", help="Completion feed (/api/admin/cases/feed).")
+
+
+@feed_cli.command("trim")
+@click.option("--older-than-days", type=float, default=None, help="Default CHANGE_FEED_SEQUENCE_RETENTION_DAYS.")
+def feed_trim(older_than_days):
+    """Delete old completion sequence allocations (schedule it)."""
+    from flask import current_app
+    from app.services.change_feed import trim_sequence
+
+    days = older_than_days if older_than_days is not None else current_app.config["CHANGE_FEED_SEQUENCE_RETENTION_DAYS"]
+    click.echo(f"trimmed {trim_sequence(days * 86400)} sequence rows")
+
+
+rollups_cli = AppGroup("rollups", help="Daily dashboard counters (/api/admin/cases/stats).")
+
+
+@rollups_cli.command("rebuild")
+@click.option("--batch-size", default=None, type=int)
+def rollups_rebuild(batch_size):
+    """Recompute the daily rollups from live and archived assessments (run when traffic is quiet)."""
+    from flask import current_app
+    from app.services.rollups import rebuild
+
+    totals = rebuild(batch_size or current_app.config["EXPORT_BATCH_SIZE"])
+    click.echo(", ".join(f"{name} {n}" for name, n in totals.items()))
+
+
+priors_cli = AppGroup("priors", help="Learned answer priors for question selection (QUESTION_SELECTION).")
+
+
+@priors_cli.command("flush")
+def priors_flush():
+    """Write this process's pending answer counts."""
+    from app.services.symptom_priors import symptom_priors
+
+    click.echo(f"flushed {symptom_priors.flush()} answers")
+
+
+@priors_cli.command("rebuild")
+@click.option("--batch-size", default=None, type=int)
+def priors_rebuild(batch_size):
+    """Recompute the answer counters from every stored answer (run when traffic is quiet)."""
+    from flask import current_app
+    from app.services.question_selection import rebuild_priors
+
+    click.echo(f"counted {rebuild_priors(batch_size or current_app.config['EXPORT_BATCH_SIZE'])} answers")
+
+
+@priors_cli.command("compare")
+@click.option("--limit", default=None, type=int, help="Newest completed assessments per run (default all).")
+@click.option("--depth", default=None, type=int, help="Default PRIORS_SEARCH_DEPTH.")
+@click.option("--beam", default=None, type=int, help="Default PRIORS_BEAM.")
+def priors_compare(limit, depth, beam):
+    """Replay completed assessments with the heuristic and with the priors; print the comparison as JSON."""
+    from flask import current_app
+    from app.services.question_selection import compare_strategies
+
+    report = compare_strategies(limit, depth, beam, current_app.config["EXPORT_BATCH_SIZE"])
+    click.echo(json.dumps(report, indent=2))
+
+
+@click.command("export-facts")
+@click.argument("path")
+@click.option("--batch-size", default=None, type=int)
+@with_appcontext
+def export_facts(path, batch_size):
+    """Write completed assessments' facts to PATH as a bit-packed columnar file (app/utils/fact_columns.py)."""
+    from flask import current_app
+    from app.services.export import export_fact_file
+
+    done = export_fact_file(path, batch_size or current_app.config["EXPORT_BATCH_SIZE"])
+    click.echo(f"wrote {done['rows']} assessments to {path}")
+    if done["skipped"]:
+        click.echo(f"skipped {done['skipped']} without fact masks (run: flask facts backfill-masks)")
+
+
+@click.command("reinfer")
+@click.argument("report", default="-")
+@click.option("--apply", is_flag=True, help="Rewrite changed results (default: report only).")
+@click.option("--checkpoint", default=None, help="Progress file; an existing one is resumed.")
+@click.option("--workers", default=None, type=int, help="Evaluation processes (default REINFER_WORKERS).")
+@click.option("--batch-size", default=None, type=int)
+@with_appcontext
+def reinfer_cmd(report, apply, checkpoint, workers, batch_size):
+    """Re-evaluate completed assessments against the newest KB version; changed diagnoses go to REPORT as NDJSON."""
+    import sys
+    from flask import current_app
+    from app.services.reinfer import load_checkpoint, reinfer
+
+    cfg = current_app.config
+    resuming = load_checkpoint(checkpoint) is not None
+    out = sys.stdout if report == "-" else open(report, "a" if resuming else "w")
+    try:
+        totals = reinfer(out, apply, workers or cfg["REINFER_WORKERS"], batch_size or cfg["EXPORT_BATCH_SIZE"],
+                         checkpoint)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        if report != "-":
+            out.close()
+    click.echo(json.dumps(totals, indent=2), err=report == "-")
+
+
+def register_cli(app):
+    app.cli.add_command(kb_cli)
+    app.cli.add_command(cache_cli)
+    app.cli.add_command(shards_cli)
+    app.cli.add_command(sessions_cli)
+    app.cli.add_command(facts_cli)
+    app.cli.add_command(assessments_cli)
+    app.cli.add_command(feed_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(priors_cli)
+    app.cli.add_command(export_facts)
+    app.cli.add_command(reinfer_cmd)
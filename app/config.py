@@ -1,6 +1,28 @@
 import os
 
 
+def _replica_binds() -> dict:
+	urls = [u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+	return {f"replica_{i}": url for i, url in enumerate(urls)}
+
+
+def _shard_binds() -> dict:
+	urls = [u.strip() for u in os.environ.get("DATABASE_SHARD_URLS", "").split(",") if u.strip()]
+	return {f"shard_{i}": url for i, url in enumerate(urls)}
+
+
+def _env_int(name: str):
+	value = os.environ.get(name)
+	return int(value) if value not in (None, "") else None
+
+
+def _env_bool(name: str, default):
+	value = os.environ.get(name)
+	if value is None:
+		return default
+	return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 class Config:
 	"""Basic configuration for the Flask app.
 
@@ -11,5 +33,119 @@ class Config:
 	SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret")
 	SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///dev.db")
 	SQLALCHEMY_TRACK_MODIFICATIONS = False
+	SQLALCHEMY_BINDS = {**_replica_binds(), **_shard_binds()}
 	JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", SECRET_KEY)
 
+	# Connection pool (see app/utils/db_pool.py); unset = per-dialect default.
+	# Anything put in SQLALCHEMY_ENGINE_OPTIONS directly takes precedence.
+	DB_POOL_SIZE = _env_int("DB_POOL_SIZE")
+	DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW")
+	DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT")
+	DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE")
+	DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", None)
+
+	METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+
+	# Read replicas (see app/utils/db_routing.py): @read_only views use these binds
+	DB_REPLICA_BINDS = sorted(_replica_binds())
+	DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", "2.0"))
+	DB_REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_LAG_CHECK_INTERVAL", "1.0"))
+	DB_REPLICA_LAG_PROBE = os.environ.get("DB_REPLICA_LAG_PROBE", "auto")  # auto, mysql, heartbeat, none
+	DB_REPLICA_HEARTBEAT_THREAD = _env_bool("DB_REPLICA_HEARTBEAT_THREAD", True)
+	DB_STICKY_SECONDS = float(os.environ.get("DB_STICKY_SECONDS", "5.0"))
+
+	# Assessment sharding (see app/utils/sharding.py): DATABASE_SHARD_URLS become
+	# binds shard_0..shard_N-1; order matters, it drives user -> shard placement
+	DB_SHARD_BINDS = list(_shard_binds())
+	DB_SHARD_FANOUT_WORKERS = int(os.environ.get("DB_SHARD_FANOUT_WORKERS", "8"))
+
+	# JSON responses: "auto" uses orjson when installed, else the stdlib encoder
+	JSON_SERIALIZER = os.environ.get("JSON_SERIALIZER", "auto")
+
+	# Compiled KB versions kept in memory per worker (in-progress assessments are pinned to one)
+	KB_CACHE_MAX_VERSIONS = int(os.environ.get("KB_CACHE_MAX_VERSIONS", "4"))
+
+	# Cross-worker cache invalidation: poll tbl_cache_versions at most this often,
+	# plus an optional push transport ("", "local" or a redis:// URL)
+	CACHE_POLL_INTERVAL = float(os.environ.get("CACHE_POLL_INTERVAL", "2.0"))
+	CACHE_INVALIDATION_TRANSPORT = os.environ.get("CACHE_INVALIDATION_TRANSPORT", "")
+	RBAC_CACHE_MAX_USERS = int(os.environ.get("RBAC_CACHE_MAX_USERS", "10000"))
+	RBAC_CACHE_TTL = float(os.environ.get("RBAC_CACHE_TTL", "300"))
+
+	# In-progress assessment state with write-behind answers (see app/services/session_store.py):
+	# "" (off), "memory", "local" or a redis:// URL
+	SESSION_STORE = os.environ.get("SESSION_STORE", "")
+	SESSION_STORE_MAX_ITEMS = int(os.environ.get("SESSION_STORE_MAX_ITEMS", "10000"))
+	SESSION_STORE_TTL = float(os.environ.get("SESSION_STORE_TTL", "86400"))
+	SESSION_STORE_FLUSH_BATCH = int(os.environ.get("SESSION_STORE_FLUSH_BATCH", "50"))
+	SESSION_STORE_FLUSH_INTERVAL = float(os.environ.get("SESSION_STORE_FLUSH_INTERVAL", "2.0"))
+	SESSION_STORE_FLUSH_THREAD = _env_bool("SESSION_STORE_FLUSH_THREAD", True)
+
+	# ?lookahead=k on question responses: YES/NO branches up to this deep / this many nodes
+	LOOKAHEAD_MAX_DEPTH = int(os.environ.get("LOOKAHEAD_MAX_DEPTH", "3"))
+	LOOKAHEAD_MAX_NODES = int(os.environ.get("LOOKAHEAD_MAX_NODES", "62"))
+
+	# Stateless (anonymous) assessments: lifetime of the signed fact token, in seconds
+	STATELESS_TOKEN_MAX_AGE = int(os.environ.get("STATELESS_TOKEN_MAX_AGE", "86400"))
+
+	# Idempotency-Key on diagnosis writes (see app/services/idempotency.py):
+	# "" (off), "local" or a redis:// URL
+	IDEMPOTENCY_STORE = os.environ.get("IDEMPOTENCY_STORE", "local")
+	IDEMPOTENCY_MAX_KEYS = int(os.environ.get("IDEMPOTENCY_MAX_KEYS", "10000"))
+	IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", "86400"))
+	IDEMPOTENCY_LOCK_TIMEOUT = float(os.environ.get("IDEMPOTENCY_LOCK_TIMEOUT", "10"))
+
+	# Assessment lifecycle (flask assessments sweep|archive): IN_PROGRESS idle this many
+	# seconds is finalized/expired; closed assessments older than this many days are archived
+	ASSESSMENT_IDLE_TTL = float(os.environ.get("ASSESSMENT_IDLE_TTL", "86400"))
+	ASSESSMENT_ARCHIVE_AFTER_DAYS = float(os.environ.get("ASSESSMENT_ARCHIVE_AFTER_DAYS", "365"))
+	ASSESSMENT_SWEEP_BATCH = int(os.environ.get("ASSESSMENT_SWEEP_BATCH", "500"))
+
+	# Completion feed (/api/admin/cases/feed): max page size, and how long a fresh
+	# completion is held back so one still committing is not skipped
+	CHANGE_FEED_MAX_LIMIT = int(os.environ.get("CHANGE_FEED_MAX_LIMIT", "1000"))
+	CHANGE_FEED_SETTLE_SECONDS = float(os.environ.get("CHANGE_FEED_SETTLE_SECONDS", "2.0"))
+	# days of allocator rows `flask feed trim` keeps (tbl_completion_sequence)
+	CHANGE_FEED_SEQUENCE_RETENTION_DAYS = float(os.environ.get("CHANGE_FEED_SEQUENCE_RETENTION_DAYS", "7"))
+
+	# In-memory cohort cube (/api/admin/cases/cohort): seconds between catching up with
+	# new completions, and between full rebuilds (picks up re-inferred results)
+	COHORT_REFRESH_INTERVAL = float(os.environ.get("COHORT_REFRESH_INTERVAL", "5"))
+	COHORT_REBUILD_INTERVAL = float(os.environ.get("COHORT_REBUILD_INTERVAL", "3600"))
+
+	# Rule edit impact preview (POST /api/kb/rules/<id>/preview): rows evaluated by
+	# default (0 = every completed assessment in the cohort cube), time budget, examples
+	IMPACT_PREVIEW_SAMPLE = int(os.environ.get("IMPACT_PREVIEW_SAMPLE", "0"))
+	IMPACT_PREVIEW_BUDGET_MS = float(os.environ.get("IMPACT_PREVIEW_BUDGET_MS", "500"))
+	IMPACT_PREVIEW_MAX_EXAMPLES = int(os.environ.get("IMPACT_PREVIEW_MAX_EXAMPLES", "20"))
+
+	# Daily rollups (/api/admin/cases/stats): rows per day counters are spread over,
+	# and the longest range one request may read
+	ROLLUP_SLOTS = int(os.environ.get("ROLLUP_SLOTS", "8"))
+	ROLLUP_MAX_DAYS = int(os.environ.get("ROLLUP_MAX_DAYS", "731"))
+
+	# Question order (see app/services/question_selection.py): "heuristic" or "priors"
+	# (fewest expected questions given learned answer rates, searched DEPTH questions
+	# deep over the BEAM best heuristic candidates). Answers are counted either way.
+	QUESTION_SELECTION = os.environ.get("QUESTION_SELECTION", "heuristic")
+	PRIORS_RECORD = _env_bool("PRIORS_RECORD", True)
+	PRIORS_CONDITIONED = _env_bool("PRIORS_CONDITIONED", True)
+	PRIORS_MIN_SAMPLES = int(os.environ.get("PRIORS_MIN_SAMPLES", "20"))
+	PRIORS_SEARCH_DEPTH = int(os.environ.get("PRIORS_SEARCH_DEPTH", "2"))
+	PRIORS_BEAM = int(os.environ.get("PRIORS_BEAM", "6"))
+	PRIORS_FLUSH_BATCH = int(os.environ.get("PRIORS_FLUSH_BATCH", "200"))
+	PRIORS_FLUSH_INTERVAL = float(os.environ.get("PRIORS_FLUSH_INTERVAL", "30"))
+	PRIORS_FLUSH_THREAD = _env_bool("PRIORS_FLUSH_THREAD", True)
+	PRIORS_REFRESH_INTERVAL = float(os.environ.get("PRIORS_REFRESH_INTERVAL", "300"))
+
+	# flask reinfer: evaluation processes (1 = in the CLI process itself)
+	REINFER_WORKERS = int(os.environ.get("REINFER_WORKERS", str(os.cpu_count() or 1)))
+
+	# Rows fetched per round trip by the streaming assessment export
+	EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+
+	# Response compression (negotiated via Accept-Encoding)
+	COMPRESS_ENABLED = _env_bool("COMPRESS_ENABLED", True)
+	COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+	COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "6"))
+	COMPRESS_MIMETYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain")
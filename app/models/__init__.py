@@ -6,9 +6,17 @@ from .rbac import UserRole, RolePermission
 from .symptom import Symptom
 from .rule import Rule, RuleCondition
 from .advice import Advice
+from .kb_version import KbVersion
 
 from .assessment import Assessment, AssessmentAnswer, AssessmentResult
+from .assessment_directory import AssessmentDirectory
+from .assessment_archive import AssessmentArchive
 from .audit_log import AuditLog
+from .cache_version import CacheVersion
+from .completion_sequence import CompletionSequence
+from .stateless_save import StatelessSave
+from .analytics_rollup import DailyRollup, DailyOutcomeRollup
+from .symptom_answer_stat import SymptomAnswerStat
 
 __all__ = [
     "User",
@@ -20,8 +28,17 @@ __all__ = [
     "Rule",
     "RuleCondition",
     "Advice",
+    "KbVersion",
     "Assessment",
     "AssessmentAnswer",
     "AssessmentResult",
+    "AssessmentDirectory",
+    "AssessmentArchive",
     "AuditLog",
+    "CacheVersion",
+    "CompletionSequence",
+    "StatelessSave",
+    "DailyRollup",
+    "DailyOutcomeRollup",
+    "SymptomAnswerStat",
 ]
@@ -0,0 +1,35 @@
+from app.extensions import db
+
+
+class DailyRollup(db.Model):
+    """
+    Per-day assessment counters (default bind, not sharded), kept up to date
+    by app/services/rollups.py as assessments start and close. A day is split
+    over ``slot`` rows so concurrent writers rarely update the same row;
+    readers sum the slots.
+    """
+    __tablename__ = "tbl_rollup_daily"
+
+    day = db.Column(db.Date, primary_key=True)
+    slot = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    started = db.Column(db.Integer, default=0, nullable=False)  # by started_at
+    completed = db.Column(db.Integer, default=0, nullable=False)  # by completed_at
+    expired = db.Column(db.Integer, default=0, nullable=False)  # by completed_at
+    completed_questions = db.Column(db.Integer, default=0, nullable=False)  # answers of the completed ones
+
+    def __repr__(self) -> str:
+        return f"<DailyRollup {self.day} slot={self.slot}>"
+
+
+class DailyOutcomeRollup(db.Model):
+    """Completed assessments per day, diagnosis and risk level (see DailyRollup)."""
+    __tablename__ = "tbl_rollup_daily_outcome"
+
+    day = db.Column(db.Date, primary_key=True)
+    diagnosis_code = db.Column(db.String(80), primary_key=True)
+    risk_level = db.Column(db.String(30), primary_key=True)
+    slot = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    completed = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<DailyOutcomeRollup {self.day} {self.diagnosis_code}/{self.risk_level} slot={self.slot}>"
@@ -9,15 +9,28 @@ class Assessment(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id", ondelete="CASCADE"), nullable=False)
+    kb_version_id = db.Column(db.Integer, db.ForeignKey("tbl_kb_versions.id", ondelete="SET NULL"))  # pinned KB
 
-    status = db.Column(db.String(20), default="IN_PROGRESS", nullable=False)  # IN_PROGRESS, COMPLETED
+    status = db.Column(db.String(20), default="IN_PROGRESS", nullable=False)  # IN_PROGRESS, COMPLETED, EXPIRED
     started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     completed_at = db.Column(db.DateTime)
+    completion_seq = db.Column(db.BigInteger)  # position in the completion feed, set when COMPLETED
+
+    # answers mirrored as bitmasks over Symptom.bit_index (app/utils/fact_masks.py); NULL = not computed
+    fact_known = db.Column(db.LargeBinary)
+    fact_values = db.Column(db.LargeBinary)
 
     user = relationship("User", back_populates="assessments")
     answers = relationship("AssessmentAnswer", back_populates="assessment", cascade="all, delete-orphan")
     result = relationship("AssessmentResult", back_populates="assessment", uselist=False, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_assessments_status_kb_version", "status", "kb_version_id"),
+        Index("ix_assessments_completion_seq", "completion_seq"),
+        # archived ids must never be handed out again (SQLite reuses max(id)+1 otherwise)
+        {"sqlite_autoincrement": True},
+    )
+
     def __repr__(self) -> str:
         return f"<Assessment {self.id} user={self.user_id} status={self.status}>"
 
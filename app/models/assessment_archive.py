@@ -0,0 +1,31 @@
+from datetime import datetime
+from sqlalchemy import Index
+from app.extensions import db
+
+
+class AssessmentArchive(db.Model):
+    """
+    Cold storage for completed assessments past the retention window: one row
+    per assessment, answers and result packed into a compressed payload (see
+    app/services/archive.py). Lives next to tbl_assessments (same shard).
+    """
+    __tablename__ = "tbl_assessment_archive"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # the original tbl_assessments.id
+    user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id", ondelete="CASCADE"), nullable=False)
+    kb_version_id = db.Column(db.Integer)
+    status = db.Column(db.String(20), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    completed_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    diagnosis_code = db.Column(db.String(80))
+    risk_level = db.Column(db.String(30))
+    payload = db.Column(db.LargeBinary, nullable=False)  # zlib(JSON): answers, result, fact masks
+
+    __table_args__ = (
+        Index("ix_assessment_archive_user", "user_id"),
+        Index("ix_assessment_archive_completed_at", "completed_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<AssessmentArchive {self.id} user={self.user_id}>"
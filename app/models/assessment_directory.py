@@ -0,0 +1,23 @@
+from datetime import datetime
+from sqlalchemy import Index
+from app.extensions import db
+
+
+class AssessmentDirectory(db.Model):
+    """
+    Global id allocator and locator for sharded assessments (default bind).
+    Only written when DATABASE_SHARD_URLS is set; see app/utils/sharding.py.
+    """
+    __tablename__ = "tbl_assessment_directory"
+
+    id = db.Column(db.Integer, primary_key=True)  # == tbl_assessments.id on the shard
+    user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id", ondelete="CASCADE"), nullable=False)
+    shard_key = db.Column(db.String(40), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_assessment_directory_user", "user_id"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<AssessmentDirectory {self.id} user={self.user_id} shard={self.shard_key}>"
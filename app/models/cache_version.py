@@ -0,0 +1,18 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class CacheVersion(db.Model):
+    """
+    Monotonic version per cache scope ("kb", "rbac"). Writers bump it in the
+    same transaction as their change; workers poll this tiny table to learn
+    that their in-process caches for a scope are stale.
+    """
+    __tablename__ = "tbl_cache_versions"
+
+    scope = db.Column(db.String(40), primary_key=True)
+    version = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<CacheVersion {self.scope}={self.version}>"
@@ -0,0 +1,17 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class CompletionSequence(db.Model):
+    """
+    Global allocator for Assessment.completion_seq (default bind, like the
+    assessment directory): one row per completion, its id is the sequence.
+    See app/services/change_feed.py.
+    """
+    __tablename__ = "tbl_completion_sequence"
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<CompletionSequence {self.id}>"
@@ -0,0 +1,22 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class KbVersion(db.Model):
+    """
+    One row per committed knowledge-base change (symptoms, rules, conditions, advices).
+    The highest id is the current KB version.
+
+    ``snapshot`` freezes what the inference engine needs for this version
+    (zlib-compressed JSON, see app/services/kb_cache.py); it is never updated.
+    """
+    __tablename__ = "tbl_kb_versions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    actor_user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id", ondelete="SET NULL"))
+    note = db.Column(db.String(255))  # UPDATE_RULE_CONDITIONS, BULK_EDIT...
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    snapshot = db.Column(db.LargeBinary(length=(2 ** 32) - 1))  # LONGBLOB on MySQL
+
+    def __repr__(self) -> str:
+        return f"<KbVersion {self.id} {self.note}>"
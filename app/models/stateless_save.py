@@ -0,0 +1,19 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class StatelessSave(db.Model):
+    """
+    One row per saved stateless assessment (default bind), keyed by the nonce
+    its fact token was issued with at /start, so a token saves at most once.
+    See app/routes/stateless.py.
+    """
+    __tablename__ = "tbl_stateless_saves"
+
+    nonce = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id", ondelete="CASCADE"), nullable=False)
+    assessment_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<StatelessSave {self.nonce} assessment={self.assessment_id}>"
@@ -1,5 +1,6 @@
 from datetime import datetime, timezone
 from pydoc import text
+from sqlalchemy import UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.extensions import db
 
@@ -15,6 +16,7 @@ class Symptom(db.Model):
 
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     priority_order = db.Column(db.Integer, default=0, nullable=False)
+    bit_index = db.Column(db.Integer)  # stable position in assessment fact masks; set by the next KB version
     info_yes = db.Column(db.Text)   # explanation shown when answer is YES
     info_no = db.Column(db.Text)    # optional: explanation when answer is NO
     created_at = db.Column(
@@ -32,5 +34,9 @@ class Symptom(db.Model):
     rule_conditions = relationship("RuleCondition", back_populates="symptom", cascade="all, delete-orphan")
     answers = relationship("AssessmentAnswer", back_populates="symptom")
 
+    __table_args__ = (
+        UniqueConstraint("bit_index", name="uq_symptoms_bit_index"),
+    )
+
     def __repr__(self) -> str:
         return f"<Symptom {self.code}>"
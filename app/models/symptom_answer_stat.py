@@ -0,0 +1,20 @@
+from app.extensions import db
+
+
+class SymptomAnswerStat(db.Model):
+    """
+    How users answer each symptom (default bind, not sharded): overall
+    (context "") and given the rules still possible when it was asked
+    (context = hash of their ids). Maintained by app/services/symptom_priors.py;
+    spread over ``slot`` rows like the daily rollups, readers sum the slots.
+    """
+    __tablename__ = "tbl_symptom_answer_stats"
+
+    context = db.Column(db.String(16), primary_key=True)
+    symptom_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    slot = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    yes = db.Column(db.Integer, default=0, nullable=False)
+    no = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<SymptomAnswerStat {self.context or '*'} symptom={self.symptom_id} slot={self.slot}>"
@@ -0,0 +1,218 @@
+import heapq
+from datetime import date, datetime, timedelta
+
+from flask import Blueprint, current_app, request
+from flask_jwt_extended import jwt_required
+
+from app.extensions import db
+from app.models import Assessment, AssessmentResult, Symptom
+from app.services.change_feed import read_feed
+from app.services.cohort import GROUPS, cohort_cube
+from app.services.export import ExportFilters, iter_csv, iter_ndjson, iter_records, symptom_codes
+from app.services.rollups import summary
+from app.utils.compression import stream_response
+from app.utils.db_routing import read_only
+from app.utils.decorators import require_permission
+from app.utils.fact_masks import has_fact
+from app.utils.sharding import assessment_shards_for_user, fan_out, shard_router
+
+admin_cases_bp = Blueprint("admin_cases", __name__)
+
+MAX_LIMIT = 200
+
+
+def _case_payload(r):
+    return {
+        "assessment_id": r.id,
+        "user_id": r.user_id,
+        "status": r.status,
+        "kb_version_id": r.kb_version_id,
+        "started_at": r.started_at.isoformat() if r.started_at else None,
+        "completed_at": r.completed_at.isoformat() if r.completed_at else None,
+        "diagnosis_code": r.diagnosis_code,
+        "risk_level": r.risk_level,
+    }
+
+
+@admin_cases_bp.get("/cases")
+@read_only
+@jwt_required()
+@require_permission("CASE_VIEW_ALL")
+def search_cases():
+    """
+    Case search across all shards, newest first.
+    Filters: status, diagnosis_code, risk_level, user_id, fact=<symptom_code>:yes|no
+    (repeatable, evaluated on the fact masks in SQL); paging: before_id, limit.
+    """
+    args = request.args
+    try:
+        limit = min(max(int(args.get("limit", 50)), 1), MAX_LIMIT)
+        user_id = int(args["user_id"]) if args.get("user_id") else None
+        before_id = int(args["before_id"]) if args.get("before_id") else None
+    except ValueError:
+        return {"message": "limit, user_id and before_id must be int"}, 400
+
+    stmt = (
+        db.select(
+            Assessment.id, Assessment.user_id, Assessment.status, Assessment.kb_version_id,
+            Assessment.started_at, Assessment.completed_at,
+            AssessmentResult.diagnosis_code, AssessmentResult.risk_level,
+        )
+        .outerjoin(AssessmentResult, AssessmentResult.assessment_id == Assessment.id)
+        .order_by(Assessment.id.desc())
+        .limit(limit)
+    )
+    if args.get("status"):
+        stmt = stmt.where(Assessment.status == args["status"].strip().upper())
+    if args.get("diagnosis_code"):
+        stmt = stmt.where(AssessmentResult.diagnosis_code == args["diagnosis_code"].strip())
+    if args.get("risk_level"):
+        stmt = stmt.where(AssessmentResult.risk_level == args["risk_level"].strip().upper())
+    if user_id is not None:
+        stmt = stmt.where(Assessment.user_id == user_id)
+    if before_id is not None:
+        stmt = stmt.where(Assessment.id < before_id)
+
+    wanted = {}
+    for item in args.getlist("fact"):
+        code, _, answer = item.partition(":")
+        if answer.strip().lower() not in ("yes", "no", "true", "false", "1", "0"):
+            return {"message": "fact must look like <symptom_code>:yes|no"}, 400
+        wanted[code.strip()] = answer.strip().lower() in ("yes", "true", "1")
+    if wanted:
+        bits = dict(db.session.query(Symptom.code, Symptom.bit_index).filter(Symptom.code.in_(list(wanted))).all())
+        unknown = sorted(code for code in wanted if bits.get(code) is None)
+        if unknown:
+            return {"message": "unknown symptom code", "codes": unknown}, 400
+        for code, answer in wanted.items():
+            stmt = stmt.where(has_fact(Assessment.fact_known, Assessment.fact_values, bits[code], answer))
+
+    keys = assessment_shards_for_user(user_id) if user_id is not None and shard_router.enabled else None
+    parts = fan_out(lambda s: s.execute(stmt).all(), keys)
+    rows = list(heapq.merge(*parts.values(), key=lambda r: r.id, reverse=True))[:limit]
+
+    return {
+        "items": [_case_payload(r) for r in rows],
+        "next_before_id": rows[-1].id if len(rows) == limit else None,
+    }, 200
+
+
+@admin_cases_bp.get("/cases/feed")
+@read_only
+@jwt_required()
+@require_permission("CASE_VIEW_ALL")
+def completion_feed():
+    """
+    Assessments completed after ``cursor`` (a completion sequence; 0 = from the
+    start), oldest first. Pass back the returned cursor for the next page.
+    """
+    try:
+        cursor = int(request.args.get("cursor", 0))
+        limit = min(max(int(request.args.get("limit", 100)), 1), current_app.config["CHANGE_FEED_MAX_LIMIT"])
+    except ValueError:
+        return {"message": "cursor and limit must be int"}, 400
+    return read_feed(cursor, limit, current_app.config["CHANGE_FEED_SETTLE_SECONDS"]), 200
+
+
+@admin_cases_bp.get("/cases/cohort")
+@read_only
+@jwt_required()
+@require_permission("CASE_VIEW_ALL")
+@require_permission("CASE_VIEW_FACTS")
+def cohort_counts():
+    """
+    Count completed assessments matching a cohort, from the in-memory cube
+    (app/services/cohort.py). fact=<code>:yes|no (repeatable, ANDed; several
+    comma-separated in one fact are ORed), diagnosis_code, risk_level, from / to
+    (ISO dates on completed_at, to is exclusive), group_by=day|month|diagnosis_code|risk_level.
+    """
+    args = request.args
+    group_by = args.get("group_by") or None
+    if group_by is not None and group_by not in GROUPS:
+        return {"message": f"group_by must be one of {', '.join(GROUPS)}"}, 400
+    try:
+        completed_from = date.fromisoformat(args["from"]) if args.get("from") else None
+        completed_to = date.fromisoformat(args["to"]) if args.get("to") else None
+    except ValueError:
+        return {"message": "from and to must be ISO dates"}, 400
+
+    wanted = []
+    for item in args.getlist("fact"):
+        clause = []
+        for alternative in item.split(","):
+            code, _, answer = alternative.partition(":")
+            if answer.strip().lower() not in ("yes", "no", "true", "false", "1", "0"):
+                return {"message": "fact must look like <symptom_code>:yes|no[,<symptom_code>:yes|no...]"}, 400
+            clause.append((code.strip(), answer.strip().lower() in ("yes", "true", "1")))
+        wanted.append(clause)
+    codes = {code for clause in wanted for code, _ in clause}
+    bits = dict(db.session.query(Symptom.code, Symptom.bit_index).filter(Symptom.code.in_(codes)).all()) if codes else {}
+    unknown = sorted(code for code in codes if bits.get(code) is None)
+    if unknown:
+        return {"message": "unknown symptom code", "codes": unknown}, 400
+
+    return cohort_cube.query(
+        [[(bits[code], answer) for code, answer in clause] for clause in wanted],
+        group_by=group_by,
+        diagnosis_code=(args.get("diagnosis_code") or "").strip() or None,
+        risk_level=(args.get("risk_level") or "").strip().upper() or None,
+        completed_from=completed_from,
+        completed_to=completed_to,
+    ), 200
+
+
+@admin_cases_bp.get("/cases/stats")
+@read_only
+@jwt_required()
+@require_permission("CASE_VIEW_ALL")
+def case_stats():
+    """
+    Dashboard numbers from the daily rollups (app/services/rollups.py): started /
+    completed / expired per day, completion rate, average questions per completed
+    assessment, diagnosis and risk distribution. from / to: ISO dates, to is
+    exclusive; default the last 30 days including today (UTC).
+    """
+    try:
+        day_to = date.fromisoformat(request.args["to"]) if request.args.get("to") else datetime.utcnow().date() + timedelta(days=1)
+        day_from = date.fromisoformat(request.args["from"]) if request.args.get("from") else day_to - timedelta(days=30)
+    except ValueError:
+        return {"message": "from and to must be ISO dates"}, 400
+    if day_from >= day_to:
+        return {"message": "from must be before to"}, 400
+    if (day_to - day_from).days > current_app.config["ROLLUP_MAX_DAYS"]:
+        return {"message": f"at most {current_app.config['ROLLUP_MAX_DAYS']} days per request"}, 400
+    return summary(day_from, day_to), 200
+
+
+@admin_cases_bp.get("/cases/export")
+@jwt_required()
+@require_permission("CASE_VIEW_ALL")
+@require_permission("CASE_VIEW_FACTS")
+def export_cases():
+    """
+    Every assessment with its answers and result, streamed (all shards, archive
+    included). format=ndjson (default) or csv; filters: from, to (ISO dates on
+    started_at, to is exclusive), diagnosis_code, risk_level, status.
+    """
+    args = request.args
+    fmt = args.get("format", "ndjson").lower()
+    if fmt not in ("ndjson", "csv"):
+        return {"message": "format must be ndjson or csv"}, 400
+    try:
+        filters = ExportFilters(
+            started_from=datetime.fromisoformat(args["from"]) if args.get("from") else None,
+            started_to=datetime.fromisoformat(args["to"]) if args.get("to") else None,
+            diagnosis_code=(args.get("diagnosis_code") or "").strip() or None,
+            risk_level=(args.get("risk_level") or "").strip().upper() or None,
+            status=(args.get("status") or "").strip().upper() or None,
+        )
+    except ValueError:
+        return {"message": "from and to must be ISO dates"}, 400
+
+    codes = symptom_codes()
+    records = iter_records(filters, codes, current_app.config["EXPORT_BATCH_SIZE"])
+    name = f"assessments.{fmt}"
+    headers = {"Content-Disposition": f"attachment; filename={name}"}
+    if fmt == "csv":
+        return stream_response(iter_csv(records, codes), "text/csv", headers)
+    return stream_response(iter_ndjson(records), "application/x-ndjson", headers)
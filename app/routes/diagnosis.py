@@ -1,12 +1,24 @@
-from flask import Blueprint, request
+from datetime import datetime
+
+from flask import Blueprint, abort, current_app, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from app.extensions import db
+from app.utils.db_routing import read_only
 from app.utils.decorators import require_permission
+from app.utils.sharding import assessment_shards_for_user, fan_out, shard_router, use_assessment_shard, use_user_shard
 from app.models import Assessment, AssessmentAnswer, AssessmentResult, Symptom
 
-from app.services.inference_engine import infer_if_complete, next_question, ensure_fallback_result
+from app.services.inference_engine import (
+    current_facts, decide, fact_masks, ensure_fallback_result, infer_if_complete, lookahead, select_question,
+)
+from app.services.kb_cache import kb_for_assessment, pin_current_kb_version
+from app.services.archive import build_archived_report, load_archived
+from app.services.idempotency import idempotent
+from app.services.question_selection import choose_question, record_answers
 from app.services.report_builder import build_report
+from app.services.rollups import record_started
+from app.services.session_store import session_store
 
 diagnosis_bp = Blueprint("diagnosis", __name__)
 
@@ -15,6 +27,12 @@ def _current_user_id() -> int:
     return int(get_jwt_identity())
 
 
+def _get_assessment_or_404(assessment_id: int) -> Assessment:
+    if shard_router.enabled and use_assessment_shard(assessment_id) is None:
+        abort(404)
+    return Assessment.query.get_or_404(assessment_id)
+
+
 def _ensure_owner_or_perm(assessment: Assessment, permission: str):
     """
     User can only access their own assessments unless they have permission (doctor/admin).
@@ -38,41 +56,64 @@ def _symptom_payload(s: Symptom):
     }
 
 
+def _question_payload(kb, facts, s):
+    """
+    next_question payload, plus "lookahead" when the request asks for
+    ?lookahead=k (capped by LOOKAHEAD_MAX_DEPTH / LOOKAHEAD_MAX_NODES). A client
+    can walk the tree locally and submit the path as one {"answers": [...]}.
+    """
+    extra = {}
+    depth = min(request.args.get("lookahead", 0, type=int), current_app.config["LOOKAHEAD_MAX_DEPTH"])
+    if depth > 0:
+        extra["lookahead"] = lookahead(
+            kb, facts, s, depth, current_app.config["LOOKAHEAD_MAX_NODES"], _symptom_payload, choose_question,
+        )
+    return {"next_question": _symptom_payload(s), **extra}
+
+
 # -------------------------------------------------------
 # 1) Start assessment
 # -------------------------------------------------------
 @diagnosis_bp.post("/start")
 @jwt_required()
 @require_permission("DIAGNOSIS_START")
+@idempotent(lambda: f"user:{get_jwt_identity()}")
 def start_assessment():
     uid = _current_user_id()
+    use_user_shard(uid)
 
     # Optional: allow only one active assessment per user
     active = Assessment.query.filter_by(user_id=uid, status="IN_PROGRESS").first()
     if active:
         # return next question for existing session
-        s = next_question(active)
+        kb, facts = kb_for_assessment(active), current_facts(active)
+        s = choose_question(kb, facts)
         if not s:
             ensure_fallback_result(active)
             return build_report(active.id), 200
         return {
             "assessment_id": active.id,
             "status": active.status,
-            "next_question": _symptom_payload(s) if s else None,
+            **_question_payload(kb, facts, s),
         }, 200
 
-    a = Assessment(user_id=uid, status="IN_PROGRESS")
+    a = Assessment(
+        user_id=uid, status="IN_PROGRESS", kb_version_id=pin_current_kb_version(), started_at=datetime.utcnow(),
+    )
     db.session.add(a)
+    record_started(db.session, a.started_at)
     db.session.commit()
+    session_store.start(a)
 
-    s = next_question(a)
+    kb = kb_for_assessment(a)
+    s = choose_question(kb, {})
     if not s:
         ensure_fallback_result(a)
         return build_report(a.id), 200
     return {
         "assessment_id": a.id,
         "status": a.status,
-        "next_question": _symptom_payload(s) if s else None,
+        **_question_payload(kb, {}, s),
     }, 201
 
 
@@ -83,7 +124,7 @@ def start_assessment():
 @jwt_required()
 @require_permission("DIAGNOSIS_VIEW")
 def get_next_question(assessment_id: int):
-    a = Assessment.query.get_or_404(assessment_id)
+    a = _get_assessment_or_404(assessment_id)
 
     forbid = _ensure_owner_or_perm(a, "CASE_VIEW_ALL")
     if forbid:
@@ -93,11 +134,12 @@ def get_next_question(assessment_id: int):
         # Locked: return report/result not next question
         return build_report(a.id), 200
 
-    s = next_question(a)
+    kb, facts = kb_for_assessment(a), current_facts(a)
+    s = choose_question(kb, facts)
     return {
         "assessment_id": a.id,
         "status": a.status,
-        "next_question": _symptom_payload(s) if s else None,
+        **(_question_payload(kb, facts, s) if s else {"next_question": None}),
     }, 200
 
 
@@ -107,8 +149,21 @@ def get_next_question(assessment_id: int):
 @diagnosis_bp.post("/assessments/<int:assessment_id>/answer")
 @jwt_required()
 @require_permission("DIAGNOSIS_ANSWER")
+@idempotent(lambda assessment_id: f"assessment:{assessment_id}")
 def answer_question(assessment_id: int):
-    a = Assessment.query.get_or_404(assessment_id)
+    """
+    Body: {"symptom_id": 1, "answer": true}
+      or: {"answers": [{"symptom_id": 1, "answer": true}, ...]}
+
+    A list is validated as a whole (nothing is saved if any entry is
+    invalid), then applied in order until the engine would finalize -
+    the same point where sequential calls would start getting 409. The
+    response is the one the last applied answer would have produced, plus
+    "accepted" and, when the assessment finalized early, "skipped".
+
+    Retries carrying the same Idempotency-Key get the first response replayed.
+    """
+    a = _get_assessment_or_404(assessment_id)
 
     forbid = _ensure_owner_or_perm(a, "CASE_VIEW_ALL")
     if forbid:
@@ -118,52 +173,94 @@ def answer_question(assessment_id: int):
         return {"message": "assessment is locked/completed"}, 409
 
     data = request.get_json() or {}
-    symptom_id = data.get("symptom_id")
-    answer_bool = data.get("answer")
-
-    if symptom_id is None or answer_bool is None:
-        return {"message": "symptom_id and answer are required"}, 400
-
-    try:
-        symptom_id = int(symptom_id)
-    except Exception:
-        return {"message": "symptom_id must be int"}, 400
-
-    answer_bool = bool(answer_bool)
-
-    # validate symptom exists & active
-    s = Symptom.query.get(symptom_id)
-    if not s or not s.is_active:
-        return {"message": "invalid symptom_id"}, 400
+    batch = "answers" in data
+    entries = data.get("answers") if batch else [data]
+    if not isinstance(entries, list) or not entries:
+        return {"message": "answers must be a non-empty list"}, 400
+
+    answers = []
+    for index, entry in enumerate(entries):
+        where = {"index": index} if batch else {}
+        if not isinstance(entry, dict) or entry.get("symptom_id") is None or entry.get("answer") is None:
+            return {"message": "symptom_id and answer are required", **where}, 400
+        try:
+            symptom_id = int(entry["symptom_id"])
+        except Exception:
+            return {"message": "symptom_id must be int", **where}, 400
+        answers.append((symptom_id, bool(entry["answer"])))
+
+    # validate symptoms exist & are active in the KB version this assessment runs on
+    kb = kb_for_assessment(a)
+    for index, (symptom_id, _) in enumerate(answers):
+        s = kb.symptoms.get(symptom_id)
+        if not s or not s.is_active:
+            return {"message": "invalid symptom_id", **({"index": index} if batch else {})}, 400
+    ids = {symptom_id for symptom_id, _ in answers}
+    live = {sid for (sid,) in db.session.query(Symptom.id).filter(Symptom.id.in_(ids))}
+    if live != ids:
+        extra = {"symptom_ids": sorted(ids - live)} if batch else {}
+        return {"message": "symptom was removed from the knowledge base", **extra}, 409
 
     # Prevent answering same question twice
-    existing = AssessmentAnswer.query.filter_by(assessment_id=a.id, symptom_id=symptom_id).first()
-    if existing:
-        return {"message": "this symptom is already answered"}, 409
-
-    # Save fact
-    ans = AssessmentAnswer(assessment_id=a.id, symptom_id=symptom_id, answer_bool=answer_bool)
-    db.session.add(ans)
-    db.session.commit()
+    if len(ids) != len(answers):
+        return {"message": "duplicate symptom_id in answers"}, 409
+    known = current_facts(a)
+    if ids & known.keys():
+        extra = {"symptom_ids": sorted(ids & known.keys())} if batch else {}
+        return {"message": "this symptom is already answered", **extra}, 409
+
+    # Stop where sequential submission would have finalized
+    accepted = answers
+    if batch:
+        facts = dict(known)
+        for n, (symptom_id, answer_bool) in enumerate(answers, start=1):
+            facts[symptom_id] = answer_bool
+            if decide(kb, facts) is not None or select_question(kb, facts) is None:
+                accepted = answers[:n]
+                break
+    skipped = answers[len(accepted):]
+
+    # Save facts
+    if session_store.enabled:
+        # write-behind: the rows are inserted by the next flush (at the latest when the result is written)
+        if not session_store.record_answers(a.id, accepted):
+            return {"message": "this symptom is already answered"}, 409
+    else:
+        db.session.add_all([
+            AssessmentAnswer(assessment_id=a.id, symptom_id=symptom_id, answer_bool=answer_bool)
+            for symptom_id, answer_bool in accepted
+        ])
+        a.fact_known, a.fact_values = fact_masks(kb, {**known, **dict(accepted)})
+        db.session.commit()
+    record_answers(kb, known, accepted)
+
+    extra = {}
+    if batch:
+        extra["accepted"] = [{"symptom_id": sid, "answer": value} for sid, value in accepted]
+        if skipped:
+            extra["skipped"] = [{"symptom_id": sid, "answer": value} for sid, value in skipped]
 
     # Run inference (may complete assessment)
     result = infer_if_complete(a)
 
     if result:
         # Locked by inference engine -> return final report
-        return build_report(a.id), 200
+        return {**build_report(a.id), **extra}, 200
 
     # Still in progress -> ask next question
-    nxt = next_question(a)
+    facts = {**known, **dict(accepted)}
+    nxt = choose_question(kb, facts)
     if not nxt:
         ensure_fallback_result(a)
-        return build_report(a.id), 200
+        return {**build_report(a.id), **extra}, 200
 
+    last_id, last_answer = accepted[-1]
     return {
         "assessment_id": a.id,
         "status": a.status,
-        "answered": {"symptom_id": s.id, "answer": answer_bool},
-        "next_question": _symptom_payload(nxt),
+        "answered": {"symptom_id": last_id, "answer": last_answer},
+        **_question_payload(kb, facts, nxt),
+        **extra,
     }, 200
 
 
@@ -171,15 +268,23 @@ def answer_question(assessment_id: int):
 # 4) Get report/result (always works)
 # -------------------------------------------------------
 @diagnosis_bp.get("/assessments/<int:assessment_id>/report")
+@read_only
 @jwt_required()
 @require_permission("DIAGNOSIS_VIEW")
 def report(assessment_id: int):
-    a = Assessment.query.get_or_404(assessment_id)
-
-    forbid = _ensure_owner_or_perm(a, "CASE_VIEW_ALL")
+    if shard_router.enabled and use_assessment_shard(assessment_id) is None:
+        abort(404)
+    a = db.session.get(Assessment, assessment_id)
+    archived = load_archived(assessment_id) if a is None else None
+    if a is None and archived is None:
+        abort(404)
+
+    forbid = _ensure_owner_or_perm(a or archived, "CASE_VIEW_ALL")
     if forbid:
         return forbid
 
+    if archived is not None:
+        return build_archived_report(archived), 200
     return build_report(a.id), 200
 
 
@@ -187,32 +292,31 @@ def report(assessment_id: int):
 # 5) View user history
 # -------------------------------------------------------
 @diagnosis_bp.get("/history")
+@read_only
 @jwt_required()
 @require_permission("DIAGNOSIS_HISTORY")
 def my_history():
     uid = _current_user_id()
-    rows = (
-        Assessment.query
-        .filter_by(user_id=uid)
+    stmt = (
+        db.select(Assessment.id, Assessment.status, AssessmentResult.diagnosis_code, AssessmentResult.risk_level)
+        .outerjoin(AssessmentResult, AssessmentResult.assessment_id == Assessment.id)
+        .where(Assessment.user_id == uid)
         .order_by(Assessment.id.desc())
         .limit(50)
-        .all()
     )
-
-    items = []
-    for a in rows:
-        res = (
-            AssessmentResult.query
-            .filter_by(assessment_id=a.id)
-            .order_by(AssessmentResult.id.desc())
-            .first()
-        )
-        items.append({
-            "assessment_id": a.id,
-            "status": a.status,
-            "diagnosis_code": res.diagnosis_code if res else None,
-            "risk_level": res.risk_level if res else None,
-        })
+    keys = assessment_shards_for_user(uid) if shard_router.enabled else None
+    rows = [r for part in fan_out(lambda s: s.execute(stmt).all(), keys).values() for r in part]
+    rows.sort(key=lambda r: r.id, reverse=True)
+
+    items = [
+        {
+            "assessment_id": r.id,
+            "status": r.status,
+            "diagnosis_code": r.diagnosis_code,
+            "risk_level": r.risk_level,
+        }
+        for r in rows[:50]
+    ]
 
     return {"items": items}, 200
 
@@ -1,8 +1,10 @@
 from flask import Blueprint, request
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from app.extensions import db
 from app.models import Symptom
+from app.services.kb_version_service import bump_kb_version
+from app.utils.db_routing import read_only
 from app.utils.decorators import require_permission
 
 kb_bp = Blueprint("kb", __name__)
@@ -10,6 +12,7 @@ kb_bp = Blueprint("kb", __name__)
 # -------- Symptoms --------
 
 @kb_bp.get("/symptoms")
+@read_only
 @jwt_required()
 @require_permission("KB_VIEW")
 def list_symptoms():
@@ -55,6 +58,7 @@ def create_symptom():
         is_active=is_active,
     )
     db.session.add(s)
+    bump_kb_version(int(get_jwt_identity()), "CREATE_SYMPTOM")
     db.session.commit()
 
     return {"message": "created", "id": s.id}, 201
@@ -92,6 +96,7 @@ def update_symptom(symptom_id: int):
     if "is_active" in data:
         s.is_active = bool(data.get("is_active"))
 
+    bump_kb_version(int(get_jwt_identity()), "UPDATE_SYMPTOM")
     db.session.commit()
     return {"message": "updated"}
 
@@ -102,5 +107,6 @@ def update_symptom(symptom_id: int):
 def delete_symptom(symptom_id: int):
     s = Symptom.query.get_or_404(symptom_id)
     db.session.delete(s)
+    bump_kb_version(int(get_jwt_identity()), "DELETE_SYMPTOM")
     db.session.commit()
     return {"message": "deleted"}
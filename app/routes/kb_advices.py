@@ -1,14 +1,17 @@
 from flask import Blueprint, request
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from app.extensions import db
 from app.models import Advice
+from app.services.kb_version_service import bump_kb_version
+from app.utils.db_routing import read_only
 from app.utils.decorators import require_permission
 
 kb_advices_bp = Blueprint("kb_advices", __name__)
 
 
 @kb_advices_bp.get("/advices")
+@read_only
 @jwt_required()
 @require_permission("KB_VIEW")
 def list_advices():
@@ -33,6 +36,7 @@ def list_advices():
 
 
 @kb_advices_bp.get("/advices/<int:advice_id>")
+@read_only
 @jwt_required()
 @require_permission("KB_VIEW")
 def get_advice(advice_id: int):
@@ -96,6 +100,7 @@ def create_advice():
         is_active=is_active,
     )
     db.session.add(a)
+    bump_kb_version(int(get_jwt_identity()), "CREATE_ADVICE")
     db.session.commit()
     return {"message": "created", "advice_id": a.id}, 201
 
@@ -145,6 +150,7 @@ def update_advice(advice_id: int):
                 "existing_advice_id": dup.id
             }, 409
 
+    bump_kb_version(int(get_jwt_identity()), "UPDATE_ADVICE")
     db.session.commit()
     return {"message": "updated"}
 
@@ -155,5 +161,6 @@ def update_advice(advice_id: int):
 def delete_advice(advice_id: int):
     a = Advice.query.get_or_404(advice_id)
     db.session.delete(a)
+    bump_kb_version(int(get_jwt_identity()), "DELETE_ADVICE")
     db.session.commit()
     return {"message": "deleted"}
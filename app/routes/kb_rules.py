@@ -1,15 +1,26 @@
-from flask import Blueprint, request
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, current_app, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from app.extensions import db
 from app.models import Rule, RuleCondition, Symptom
+from app.services.impact_preview import preview, proposed_kb
+from app.services.kb_cache import compile_live_kb
+from app.services.kb_editor import KbEditError, apply_bulk_edit, apply_rule_conditions, required_permissions
+from app.services.kb_version_service import bump_kb_version
+from app.services.rbac_service import get_user_permission_codes
+from app.utils.db_routing import read_only
 from app.utils.decorators import require_permission
 
 kb_rules_bp = Blueprint("kb_rules", __name__)
 
 
+def _actor_id() -> int:
+    return int(get_jwt_identity())
+
+
 # ---------- Rules list ----------
 @kb_rules_bp.get("/rules")
+@read_only
 @jwt_required()
 @require_permission("KB_VIEW")
 def list_rules():
@@ -33,6 +44,7 @@ def list_rules():
 
 # ---------- Get one rule (for edit screen) ----------
 @kb_rules_bp.get("/rules/<int:rule_id>")
+@read_only
 @jwt_required()
 @require_permission("KB_VIEW")
 def get_rule(rule_id: int):
@@ -56,7 +68,7 @@ def get_rule(rule_id: int):
                 "symptom_id": c.symptom_id,
                 "symptom_code": (smap.get(c.symptom_id).code if smap.get(c.symptom_id) else None),
                 "expected_value": bool(c.expected_value),
-                "reason_text": getattr(c, "reason_text", None),
+                "explanation_text": c.explanation_text,
             }
             for c in r.conditions
         ],
@@ -91,6 +103,7 @@ def create_rule():
         r.explanation_text = explanation_text
 
     db.session.add(r)
+    bump_kb_version(_actor_id(), "CREATE_RULE")
     db.session.commit()
 
     return {"message": "created", "rule_id": r.id}, 201
@@ -122,6 +135,7 @@ def update_rule(rule_id: int):
     if "explanation_text" in data and hasattr(r, "explanation_text"):
         r.explanation_text = (data.get("explanation_text") or "").strip() or None
 
+    bump_kb_version(_actor_id(), "UPDATE_RULE")
     db.session.commit()
     return {"message": "updated"}
 
@@ -136,6 +150,7 @@ def delete_rule(rule_id: int):
     # delete conditions first (avoid FK errors)
     RuleCondition.query.filter_by(rule_id=r.id).delete()
     db.session.delete(r)
+    bump_kb_version(_actor_id(), "DELETE_RULE")
     db.session.commit()
     return {"message": "deleted"}
 
@@ -149,45 +164,93 @@ def replace_conditions(rule_id: int):
     Body:
     {
       "conditions": [
-        {"symptom_id": 1, "expected_value": true, "reason_text": "optional"},
+        {"symptom_id": 1, "expected_value": true, "explanation_text": "optional"},
         {"symptom_id": 2, "expected_value": true}
       ]
     }
     """
     r = Rule.query.get_or_404(rule_id)
     data = request.get_json() or {}
-    conditions = data.get("conditions") or []
-
-    if not isinstance(conditions, list) or len(conditions) == 0:
-        return {"message": "conditions must be a non-empty list"}, 400
-
-    # validate symptom ids exist
-    symptom_ids = [c.get("symptom_id") for c in conditions]
-    if any(sid is None for sid in symptom_ids):
-        return {"message": "each condition requires symptom_id"}, 400
-
-    exists = Symptom.query.filter(Symptom.id.in_(symptom_ids), Symptom.is_active == True).all()
-    if len(exists) != len(set(symptom_ids)):
-        return {"message": "one or more symptom_id invalid/inactive"}, 400
 
-    # delete old
-    RuleCondition.query.filter_by(rule_id=r.id).delete()
-    db.session.commit()
+    try:
+        counts = apply_rule_conditions(r, data.get("conditions") or [], actor_user_id=_actor_id())
+    except KbEditError as e:
+        db.session.rollback()
+        return e.to_response()
 
-    # insert new
-    for c in conditions:
-        expected = c.get("expected_value", True)
-        reason_text = (c.get("reason_text") or "").strip() or None
+    if counts["kb_version"] is not None:
+        db.session.commit()
+    return {"message": "conditions replaced", **counts}
 
-        rc = RuleCondition(
-            rule_id=r.id,
-            symptom_id=int(c["symptom_id"]),
-            expected_value=bool(expected),
-        )
-        if hasattr(rc, "reason_text"):
-            rc.reason_text = reason_text
 
-        db.session.add(rc)
+# ---------- Impact of an edit on past assessments (dry run) ----------
+@kb_rules_bp.post("/rules/<int:rule_id>/preview")
+@read_only
+@jwt_required()
+@require_permission("KB_UPDATE")
+def preview_rule_edit(rule_id: int):
+    """
+    What PUT /rules/<id> and/or PUT /rules/<id>/conditions with this body would
+    do to completed assessments; nothing is saved.
+    Body: the update_rule fields to change, optional "conditions" (as for
+    replace_conditions), optional "sample" (rows) and "examples" (ids per transition).
+    """
+    r = Rule.query.get_or_404(rule_id)
+    data = request.get_json() or {}
+    cfg = current_app.config
+    try:
+        sample = int(data["sample"]) if data.get("sample") is not None else cfg["IMPACT_PREVIEW_SAMPLE"]
+        examples = int(data.get("examples", 5))
+    except (TypeError, ValueError):
+        return {"message": "sample and examples must be int"}, 400
+    if sample < 0:
+        return {"message": "sample must be >= 0 (0 = every completed assessment)"}, 400
+    if examples < 1:
+        return {"message": "examples must be >= 1"}, 400
+    examples = min(examples, cfg["IMPACT_PREVIEW_MAX_EXAMPLES"])
+
+    before = compile_live_kb()
+    try:
+        after = proposed_kb(before, r, data)
+    except KbEditError as e:
+        return e.to_response()
+    except (TypeError, ValueError):
+        return {"message": "priority must be int"}, 400
+    return {"rule_id": r.id, **preview(before, after, sample, examples, cfg["IMPACT_PREVIEW_BUDGET_MS"])}
+
+
+# ---------- Bulk edit (symptoms + rules/conditions + advices, one transaction) ----------
+@kb_rules_bp.post("/bulk")
+@jwt_required()
+def bulk_edit():
+    """
+    Body (every section and operation optional):
+    {
+      "symptoms": {"create": [{...}], "update": [{"id": 1, ...}], "delete": [3]},
+      "rules":    {"create": [{..., "conditions": [{"symptom_code": "polyuria", "expected_value": true}]}],
+                   "update": [{"id": 2, "priority": 9, "conditions": [...]}],
+                   "delete": [5]},
+      "advices":  {"create": [...], "update": [...], "delete": [...]}
+    }
+    All-or-nothing: any validation error rolls back the whole request.
+    """
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return {"message": "body must be an object"}, 400
+
+    needed = required_permissions(data)
+    missing = sorted(needed - get_user_permission_codes(_actor_id()))
+    if missing:
+        return {"message": "Forbidden", "missing_permission": missing[0]}, 403
+
+    try:
+        summary = apply_bulk_edit(data, actor_user_id=_actor_id())
+    except KbEditError as e:
+        db.session.rollback()
+        return e.to_response()
+    except (TypeError, ValueError) as e:
+        db.session.rollback()
+        return {"message": f"invalid value: {e}"}, 400
 
     db.session.commit()
-    return {"message": "conditions replaced"}
+    return {"message": "bulk edit applied", **summary}
@@ -0,0 +1,211 @@
+from datetime import datetime
+
+from flask import Blueprint, request
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import Assessment, AssessmentAnswer, AssessmentResult, StatelessSave, Symptom
+from app.routes.diagnosis import _question_payload
+from app.services.fact_tokens import InvalidFactToken, decode_token, encode_token, new_nonce
+from app.services.idempotency import idempotent
+from app.services.inference_engine import conclude, fact_masks
+from app.services.question_selection import choose_question, record_answers
+from app.services.kb_cache import advice_for, kb_cache, pin_current_kb_version
+from app.services.report_builder import build_report
+from app.services.rollups import record_completed, record_started
+from app.utils.decorators import require_permission
+from app.utils.sharding import use_user_shard
+
+stateless_bp = Blueprint("stateless", __name__)
+
+
+def _read_token(data):
+    token = data.get("token")
+    if not isinstance(token, str) or not token:
+        return None, ({"message": "token is required"}, 400)
+    try:
+        return decode_token(token), None
+    except InvalidFactToken:
+        return None, ({"message": "invalid or expired token"}, 400)
+
+
+def _step(kb, started_at, facts, nonce, code=200, extra=None):
+    """Response for ``facts``: the next question, or the result once the engine concludes."""
+    token = encode_token(kb, started_at, facts, nonce)
+    result = conclude(kb, facts)
+    if result is None:
+        return {
+            "token": token,
+            "status": "IN_PROGRESS",
+            **_question_payload(kb, facts, choose_question(kb, facts)),
+            **(extra or {}),
+        }, code
+
+    return {
+        "token": token,
+        "status": "COMPLETED",
+        "risk_assessment": {"diagnosis_code": result["diagnosis_code"], "risk_level": result["risk_level"]},
+        "advice": advice_for(kb, result["diagnosis_code"], result["risk_level"]),
+        **(extra or {}),
+    }, code
+
+
+def _saved(nonce, uid):
+    """Response for a self-check that was already saved, None if it was not."""
+    row = db.session.get(StatelessSave, nonce)
+    if row is None:
+        return None
+    if row.user_id != uid:
+        return {"message": "assessment was already saved"}, 409
+    return build_report(row.assessment_id), 200
+
+
+# -------------------------------------------------------
+# Anonymous self-check: no rows are written until /save
+# -------------------------------------------------------
+@stateless_bp.post("/start")
+def start():
+    version_id = pin_current_kb_version(create=False)
+    if version_id is None:
+        # the first version is created by the first stored assessment or KB edit
+        return {"message": "knowledge base is not versioned yet"}, 503
+    return _step(kb_cache.get(version_id), datetime.utcnow().replace(microsecond=0), {}, new_nonce(), code=201)
+
+
+@stateless_bp.post("/answer")
+def answer():
+    """
+    Body: {"token": "...", "symptom_id": 1, "answer": true}
+      or: {"token": "...", "answers": [{"symptom_id": 1, "answer": true}, ...]}
+
+    Same validation and batch semantics as /assessments/<id>/answer, evaluated
+    in memory against the KB version in the token; returns the next token.
+    """
+    data = request.get_json() or {}
+    decoded, error = _read_token(data)
+    if error:
+        return error
+    kb, state = decoded
+    facts = dict(state.facts)
+
+    if conclude(kb, facts) is not None:
+        return {"message": "assessment is locked/completed"}, 409
+
+    batch = "answers" in data
+    entries = data.get("answers") if batch else [data]
+    if not isinstance(entries, list) or not entries:
+        return {"message": "answers must be a non-empty list"}, 400
+
+    answers = []
+    for index, entry in enumerate(entries):
+        where = {"index": index} if batch else {}
+        if not isinstance(entry, dict) or entry.get("symptom_id") is None or entry.get("answer") is None:
+            return {"message": "symptom_id and answer are required", **where}, 400
+        try:
+            symptom_id = int(entry["symptom_id"])
+        except Exception:
+            return {"message": "symptom_id must be int", **where}, 400
+        s = kb.symptoms.get(symptom_id)
+        if not s or not s.is_active or symptom_id not in kb.bit_of:
+            return {"message": "invalid symptom_id", **where}, 400
+        answers.append((symptom_id, bool(entry["answer"])))
+
+    ids = {symptom_id for symptom_id, _ in answers}
+    if len(ids) != len(answers):
+        return {"message": "duplicate symptom_id in answers"}, 409
+    if ids & facts.keys():
+        extra = {"symptom_ids": sorted(ids & facts.keys())} if batch else {}
+        return {"message": "this symptom is already answered", **extra}, 409
+
+    accepted = []
+    for symptom_id, answer_bool in answers:
+        facts[symptom_id] = answer_bool
+        accepted.append((symptom_id, answer_bool))
+        if conclude(kb, facts) is not None:
+            break
+
+    extra = {}
+    if batch:
+        extra["accepted"] = [{"symptom_id": sid, "answer": value} for sid, value in accepted]
+        if len(accepted) < len(answers):
+            extra["skipped"] = [{"symptom_id": sid, "answer": value} for sid, value in answers[len(accepted):]]
+    else:
+        extra["answered"] = {"symptom_id": accepted[0][0], "answer": accepted[0][1]}
+    return _step(kb, state.started_at, facts, state.nonce, extra=extra)
+
+
+@stateless_bp.post("/save")
+@jwt_required()
+@require_permission("DIAGNOSIS_START")
+@idempotent(lambda: f"user:{get_jwt_identity()}")
+def save():
+    """
+    Body: {"token": "...", "include_answers": true}
+
+    Persists a finished stateless assessment for the current user in one
+    transaction: the assessment (with its fact masks), its result and, unless
+    include_answers is false, one answer row per fact. The result is
+    recomputed from the token, never taken from the client.
+
+    Every token of one self-check carries the nonce issued at /start, and a
+    nonce is saved once: saving it again returns the stored report (200) to
+    the user who saved it and 409 to anyone else.
+    """
+    data = request.get_json() or {}
+    decoded, error = _read_token(data)
+    if error:
+        return error
+    kb, state = decoded
+    uid = int(get_jwt_identity())
+
+    saved = _saved(state.nonce, uid)
+    if saved is not None:
+        return saved
+
+    result = conclude(kb, state.facts)
+    if result is None:
+        return {"message": "assessment is not finished"}, 409
+
+    include_answers = bool(data.get("include_answers", True))
+    if include_answers and state.facts:
+        live = {sid for (sid,) in db.session.query(Symptom.id).filter(Symptom.id.in_(list(state.facts)))}
+        if live != state.facts.keys():
+            return {
+                "message": "symptom was removed from the knowledge base",
+                "symptom_ids": sorted(state.facts.keys() - live),
+            }, 409
+
+    use_user_shard(uid)
+
+    now = datetime.utcnow()
+    a = Assessment(
+        user_id=uid,
+        status="COMPLETED",
+        kb_version_id=kb.version_id,
+        started_at=state.started_at,
+        completed_at=now,
+    )
+    a.fact_known, a.fact_values = fact_masks(kb, state.facts)
+    if include_answers:
+        a.answers = [
+            AssessmentAnswer(symptom_id=sid, answer_bool=answer_bool, answered_at=now)
+            for sid, answer_bool in state.facts.items()
+        ]
+    a.result = AssessmentResult(**result, created_at=now)
+    db.session.add(a)
+    record_started(db.session, state.started_at)
+    record_completed(db.session, now, len(state.facts), result["diagnosis_code"], result["risk_level"])
+    try:
+        db.session.flush()  # assigns a.id
+        db.session.add(StatelessSave(nonce=state.nonce, user_id=uid, assessment_id=a.id, created_at=now))
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent save of the same self-check won
+        db.session.rollback()
+        return _saved(state.nonce, uid) or ({"message": "assessment was already saved"}, 409)
+    # priors count a self-check when it is saved: /answer steps can be
+    # replayed from any earlier token, a nonce is saved only once
+    record_answers(kb, {}, state.facts.items())
+
+    return build_report(a.id), 201
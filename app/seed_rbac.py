@@ -1,5 +1,6 @@
 from app.extensions import db
 from app.models import Role, Permission, RolePermission
+from app.services.rbac_service import bump_rbac_version
 
 
 def seed_roles_permissions():
@@ -52,4 +53,8 @@ def seed_roles_permissions():
         if p.code != "KB_MANAGE":
             link(user_role.id, p.id)
 
+    # let every worker drop its cached permissions
+    bump_rbac_version()
+    db.session.commit()
+
     print("✅ RBAC seed done.")
@@ -1,56 +1,50 @@
 from app.extensions import db
 from app.models import User, Role, UserRole
+from app.services.rbac_service import bump_rbac_version
 from app.utils.security import hash_password
 
+DEFAULT_USERS = (
+    # (email, name, password, role)
+    ("admin@example.com", "System Admin", "Admin123!", "ADMIN"),
+    ("user@example.com", "Test User", "User123!", "USER"),
+)
+
 
 def seed_default_users():
     print("🌱 Seeding default users (safe/idempotent)...")
 
-    admin_role = Role.query.filter_by(name="ADMIN").first()
-    user_role = Role.query.filter_by(name="USER").first()
-    if not admin_role or not user_role:
+    roles = {r.name: r for r in Role.query.filter(Role.name.in_(["ADMIN", "USER"])).all()}
+    if "ADMIN" not in roles or "USER" not in roles:
         raise RuntimeError("Roles not found. Run seed_roles_permissions() first.")
 
-    def assign_role(user_id: int, role_id: int):
-        exists = UserRole.query.filter_by(user_id=user_id, role_id=role_id).first()
-        if not exists:
-            db.session.add(UserRole(user_id=user_id, role_id=role_id))
-            db.session.commit()
-
-    # Admin user
-    admin_email = "admin@example.com"
-    admin = User.query.filter_by(email=admin_email).first()
-    if not admin:
-        admin = User(
-            name="System Admin",
-            email=admin_email,
-            password_hash=hash_password("Admin123!"),
-            status="ACTIVE",
-        )
-        db.session.add(admin)
-        db.session.commit()
-        print("✅ Created admin: admin@example.com / Admin123!")
-    else:
-        print("ℹ️ Admin already exists:", admin_email)
-
-    assign_role(admin.id, admin_role.id)
-
-    # Normal user
-    user_email = "user@example.com"
-    user = User.query.filter_by(email=user_email).first()
-    if not user:
-        user = User(
-            name="Test User",
-            email=user_email,
-            password_hash=hash_password("User123!"),
-            status="ACTIVE",
-        )
-        db.session.add(user)
-        db.session.commit()
-        print("✅ Created user: user@example.com / User123!")
-    else:
-        print("ℹ️ User already exists:", user_email)
-
-    assign_role(user.id, user_role.id)
-
+    emails = [email for email, _, _, _ in DEFAULT_USERS]
+    users = {u.email: u for u in User.query.filter(User.email.in_(emails)).all()}
+
+    created = []
+    for email, name, password, _ in DEFAULT_USERS:
+        if email in users:
+            print("ℹ️ User already exists:", email)
+            continue
+        users[email] = User(name=name, email=email, password_hash=hash_password(password), status="ACTIVE")
+        db.session.add(users[email])
+        created.append((email, password))
+    db.session.flush()
+
+    linked = set(
+        db.session.query(UserRole.user_id, UserRole.role_id)
+        .filter(UserRole.user_id.in_([u.id for u in users.values()]))
+        .all()
+    )
+    missing = [
+        UserRole(user_id=users[email].id, role_id=roles[role].id)
+        for email, _, _, role in DEFAULT_USERS
+        if (users[email].id, roles[role].id) not in linked
+    ]
+    db.session.add_all(missing)
+    if missing:
+        bump_rbac_version()
+    db.session.commit()
+
+    for email, password in created:
+        print(f"✅ Created user: {email} / {password}")
     print("✅ User seed done.")
@@ -0,0 +1,262 @@
+"""
+Lifecycle of old assessments: the abandoned-session sweeper and archival.
+
+``sweep_abandoned`` closes IN_PROGRESS assessments with no activity (last
+answer, or start) for ASSESSMENT_IDLE_TTL seconds. One the engine can already
+conclude - it has a decision, or nothing left to ask - gets its result written
+as if the last answer had just come in; every other one becomes EXPIRED (no
+result: the engine never reached one). Either way ``completed_at`` is set and
+``start_assessment`` stops finding it.
+
+``archive_closed`` moves COMPLETED/EXPIRED assessments closed more than
+ASSESSMENT_ARCHIVE_AFTER_DAYS ago out of the live tables: each becomes one
+tbl_assessment_archive row (same id, same shard) holding its answers, result
+and fact masks as compressed JSON, and its live rows are deleted in the same
+transaction. ``build_archived_report`` renders the usual report from it, so
+``/report`` keeps working for archived ids.
+
+Both run shard by shard in batches and are meant to be scheduled
+(``flask assessments sweep`` / ``flask assessments archive``, e.g. from cron).
+"""
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.models import Assessment, AssessmentAnswer, AssessmentArchive, AssessmentResult, Symptom
+from app.services.change_feed import allocate_completion_seqs
+from app.services.inference_engine import conclude
+from app.services.kb_cache import kb_cache
+from app.services.report_builder import render_report
+from app.services.rollups import RollupDelta
+from app.services.session_store import session_store
+from app.utils.sharding import shard_router, use_shard
+
+PAYLOAD_FORMAT = 1
+
+log = logging.getLogger(__name__)
+
+
+def _shards():
+    return list(shard_router.keys) if shard_router.enabled else [None]
+
+
+def _answers_by_assessment(ids):
+    rows = db.session.execute(
+        sa.select(AssessmentAnswer.assessment_id, AssessmentAnswer.symptom_id,
+                  AssessmentAnswer.answer_bool, AssessmentAnswer.answered_at)
+        .where(AssessmentAnswer.assessment_id.in_(ids))
+        .order_by(AssessmentAnswer.id.asc())
+    ).all()
+    out = {aid: [] for aid in ids}
+    for aid, sid, answer, answered_at in rows:
+        out[aid].append((sid, bool(answer), answered_at))
+    return out
+
+
+# ---------- sweeper ----------
+
+def sweep_abandoned(idle_seconds: float, batch_size: int = 500) -> dict:
+    """Close IN_PROGRESS assessments idle for ``idle_seconds``; returns {"completed": n, "expired": n}."""
+    session_store.flush()  # pending answers count as activity
+    cutoff = datetime.utcnow() - timedelta(seconds=idle_seconds)
+    recent = (
+        sa.select(AssessmentAnswer.id)
+        .where(AssessmentAnswer.assessment_id == Assessment.id, AssessmentAnswer.answered_at >= cutoff)
+        .exists()
+    )
+    done = {"completed": 0, "expired": 0}
+
+    for key in _shards():
+        use_shard(key)
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                sa.select(Assessment.id, Assessment.kb_version_id)
+                .where(Assessment.status == "IN_PROGRESS", Assessment.started_at < cutoff,
+                       Assessment.id > last_id, ~recent)
+                .order_by(Assessment.id.asc()).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            answers = _answers_by_assessment([r.id for r in rows])
+            now = datetime.utcnow()  # per batch: a long sweep must not backdate its later closes
+
+            results, finished, expired = [], [], []
+            for aid, version_id in rows:
+                facts = {sid: answer for sid, answer, _ in answers[aid]}
+                try:
+                    result = conclude(kb_cache.get(version_id), facts) if version_id is not None else None
+                except LookupError:  # snapshot gone: nothing to evaluate against
+                    result = None
+                if result is None:
+                    expired.append(aid)
+                else:
+                    finished.append(aid)
+                    results.append({"assessment_id": aid, **result, "created_at": now})
+
+            # the status guard skips anything answered/finalized since the select
+            table = Assessment.__table__
+            delta = RollupDelta()
+            if finished:
+                claimed = set(db.session.execute(
+                    sa.select(table.c.id).where(table.c.id.in_(finished), table.c.status == "IN_PROGRESS")
+                ).scalars())
+                results = [r for r in results if r["assessment_id"] in claimed]
+                if results:
+                    db.session.execute(sa.insert(AssessmentResult.__table__), results)
+                    ids = [r["assessment_id"] for r in results]
+                    db.session.execute(
+                        sa.update(table)
+                        .where(table.c.id == sa.bindparam("b_id"), table.c.status == "IN_PROGRESS")
+                        .values(status="COMPLETED", completed_at=now, completion_seq=sa.bindparam("b_seq")),
+                        [{"b_id": aid, "b_seq": seq}
+                         for aid, seq in zip(ids, allocate_completion_seqs(db.session, len(ids)))],
+                    )
+                    for r in results:
+                        delta.completed(now, len(answers[r["assessment_id"]]), r["diagnosis_code"], r["risk_level"])
+                done["completed"] += len(results)
+            if expired:
+                n = db.session.execute(
+                    sa.update(table).where(table.c.id.in_(expired), table.c.status == "IN_PROGRESS")
+                    .values(status="EXPIRED", completed_at=now)
+                ).rowcount
+                delta.expired(now, n)
+                done["expired"] += n
+            delta.apply(db.session)
+            db.session.commit()
+            for aid in finished + expired:
+                session_store.forget(aid)
+    return done
+
+
+# ---------- archival ----------
+
+def _encode_payload(answers, labels, result, known, values) -> bytes:
+    payload = {
+        "format": PAYLOAD_FORMAT,
+        "answers": [
+            [sid, answer, answered_at.isoformat() if answered_at else None, labels.get(sid)]
+            for sid, answer, answered_at in answers
+        ],
+        "result": result,
+        "fact_known": known.hex() if known is not None else None,
+        "fact_values": values.hex() if values is not None else None,
+    }
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_payload(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob))
+
+
+def payload_masks(payload: dict) -> Optional[Tuple[int, int]]:
+    """(known, values) fact masks as ints, or None if the assessment had none."""
+    if payload.get("fact_known") is None:
+        return None
+    return (int.from_bytes(bytes.fromhex(payload["fact_known"]), "little"),
+            int.from_bytes(bytes.fromhex(payload["fact_values"] or ""), "little"))
+
+
+def archive_closed(older_than_days: float, batch_size: int = 500) -> int:
+    """
+    Move assessments closed before the retention window into
+    tbl_assessment_archive; returns how many. An assessment whose id is
+    already archived (ids reused by a database created before
+    AUTOINCREMENT) is left live and logged.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    table, archive = Assessment.__table__, AssessmentArchive.__table__
+    moved = 0
+
+    for key in _shards():
+        use_shard(key)
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                sa.select(table)
+                .where(table.c.status.in_(("COMPLETED", "EXPIRED")), table.c.completed_at < cutoff,
+                       table.c.id > last_id)
+                .order_by(table.c.id.asc()).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            taken = set(db.session.execute(
+                sa.select(archive.c.id).where(archive.c.id.in_([r.id for r in rows]))
+            ).scalars())
+            if taken:
+                log.warning("assessment ids %s are already archived; left live", sorted(taken))
+                rows = [r for r in rows if r.id not in taken]
+                if not rows:
+                    db.session.rollback()
+                    continue
+            ids = [r.id for r in rows]
+            now = datetime.utcnow()
+            answers = _answers_by_assessment(ids)
+            results = {
+                r.assessment_id: r for r in db.session.execute(
+                    sa.select(AssessmentResult.assessment_id, AssessmentResult.diagnosis_code,
+                              AssessmentResult.risk_level, AssessmentResult.explanation_json,
+                              AssessmentResult.created_at)
+                    .where(AssessmentResult.assessment_id.in_(ids))
+                )
+            }
+            symptom_ids = {sid for items in answers.values() for sid, _, _ in items}
+            labels = dict(
+                db.session.query(Symptom.id, Symptom.question_text).filter(Symptom.id.in_(symptom_ids)).all()
+            ) if symptom_ids else {}
+
+            archived = []
+            for r in rows:
+                res = results.get(r.id)
+                result = None
+                if res is not None:
+                    result = {
+                        "diagnosis_code": res.diagnosis_code,
+                        "risk_level": res.risk_level,
+                        "explanation_json": res.explanation_json,
+                        "created_at": res.created_at.isoformat() if res.created_at else None,
+                    }
+                archived.append({
+                    "id": r.id,
+                    "user_id": r.user_id,
+                    "kb_version_id": r.kb_version_id,
+                    "status": r.status,
+                    "started_at": r.started_at,
+                    "completed_at": r.completed_at,
+                    "archived_at": now,
+                    "diagnosis_code": res.diagnosis_code if res is not None else None,
+                    "risk_level": res.risk_level if res is not None else None,
+                    "payload": _encode_payload(answers[r.id], labels, result, r.fact_known, r.fact_values),
+                })
+
+            db.session.execute(sa.insert(archive), archived)
+            db.session.execute(sa.delete(AssessmentAnswer.__table__).where(AssessmentAnswer.assessment_id.in_(ids)))
+            db.session.execute(sa.delete(AssessmentResult.__table__).where(AssessmentResult.assessment_id.in_(ids)))
+            db.session.execute(sa.delete(table).where(table.c.id.in_(ids)))
+            db.session.commit()
+            moved += len(ids)
+    return moved
+
+
+def load_archived(assessment_id: int) -> Optional[AssessmentArchive]:
+    """Archived assessment by id (the caller selects its shard, as for live rows)."""
+    return db.session.get(AssessmentArchive, assessment_id)
+
+
+def build_archived_report(archived: AssessmentArchive) -> dict:
+    payload = decode_payload(archived.payload)
+    result = payload.get("result")
+    if result is None:
+        return {"assessment_id": archived.id, "status": archived.status, "next_question": None, "archived": True}
+    answers = [(label or f"symptom#{sid}", answer) for sid, answer, _, label in payload["answers"]]
+    report = render_report(
+        archived.id, answers, result["diagnosis_code"], result["risk_level"], result["explanation_json"],
+    )
+    return {**report, "archived": True}
@@ -0,0 +1,124 @@
+"""
+Change feed of completed assessments.
+
+Every assessment gets a ``completion_seq`` when it becomes COMPLETED, taken
+from one global allocator (tbl_completion_sequence on the default bind), so
+the sequence is monotonic across shards. Consumers tail the feed with the last
+sequence they processed as cursor; each page is an index range scan on
+ix_assessments_completion_seq per shard, merged in sequence order.
+
+Delivery is at-least-once: the cursor only moves when the consumer sends the
+new one, so a page is re-served until then. A sequence number is allocated
+before its transaction commits, so a lower number can become visible after a
+higher one. ``low_watermark`` bounds every read: it walks the allocator rows
+above the cursor and stops at the first hole (an allocation not committed
+yet) or the first allocation younger than CHANGE_FEED_SETTLE_SECONDS (its
+shard may commit after the default bind). A hole followed by an allocation
+older than that was rolled back and is stepped over, so the cursor also moves
+past sequences that will never appear. ``trim_sequence`` deletes old
+allocator rows; cursors below the oldest row left count as settled.
+
+ORM writes get their sequence from a before_flush hook; Core bulk updates
+(the sweeper) call ``allocate_completion_seqs`` themselves.
+"""
+import heapq
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.models import Assessment, AssessmentResult, CompletionSequence
+from app.utils.sharding import fan_out
+
+
+def allocate_completion_seqs(session, count: int) -> List[int]:
+    table = CompletionSequence.__table__
+    now = datetime.utcnow()
+    return [session.execute(table.insert().values(created_at=now)).inserted_primary_key[0] for _ in range(count)]
+
+
+def _assign_completion_seqs(session, flush_context, instances):
+    completed = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, Assessment) and obj.status == "COMPLETED" and obj.completion_seq is None
+    ]
+    for obj, seq in zip(completed, allocate_completion_seqs(session, len(completed))):
+        obj.completion_seq = seq
+
+
+def low_watermark(after: int, settle_seconds: float, span: Optional[int] = None) -> int:
+    """
+    First sequence above ``after`` that may still be committing: every
+    completion in (after, watermark) is visible for good. Looks at most
+    ``span`` allocator rows ahead.
+    """
+    table = CompletionSequence.__table__
+    horizon = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    floor = db.session.execute(sa.select(sa.func.min(table.c.id))).scalar()
+    if floor is None:
+        return after + 1
+    expected = max(after, floor - 1) + 1  # below the oldest row: trimmed, settled long ago
+    rows = db.session.execute(
+        sa.select(table.c.id, table.c.created_at).where(table.c.id >= expected).order_by(table.c.id.asc()).limit(span)
+    ).all()
+    for seq, created_at in rows:
+        if created_at > horizon:
+            return expected  # this one, or the hole before it, may still commit
+        expected = seq + 1
+    return expected
+
+
+def trim_sequence(older_than_seconds: float) -> int:
+    """Delete allocator rows older than ``older_than_seconds`` (always keeping the newest); returns how many."""
+    table = CompletionSequence.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=older_than_seconds)
+    newest = db.session.execute(sa.select(sa.func.max(table.c.id))).scalar()
+    if newest is None:
+        return 0
+    n = db.session.execute(sa.delete(table).where(table.c.created_at < cutoff, table.c.id < newest)).rowcount
+    db.session.commit()
+    return n
+
+
+def read_feed(after: int, limit: int, settle_seconds: float) -> dict:
+    """Completions with completion_seq > ``after``, oldest first, at most ``limit``."""
+    watermark = low_watermark(after, settle_seconds, limit)
+    stmt = (
+        sa.select(
+            Assessment.completion_seq, Assessment.id, Assessment.user_id, Assessment.kb_version_id,
+            Assessment.started_at, Assessment.completed_at,
+            AssessmentResult.diagnosis_code, AssessmentResult.risk_level,
+        )
+        .outerjoin(AssessmentResult, AssessmentResult.assessment_id == Assessment.id)
+        .where(Assessment.completion_seq > after, Assessment.completion_seq < watermark)
+        .order_by(Assessment.completion_seq.asc())
+        .limit(limit)
+    )
+    parts = fan_out(lambda s: s.execute(stmt).all())
+    rows = list(heapq.merge(*parts.values(), key=lambda r: r.completion_seq))[:limit]
+    full = len(rows) == limit
+    return {
+        "items": [
+            {
+                "seq": r.completion_seq,
+                "assessment_id": r.id,
+                "user_id": r.user_id,
+                "kb_version_id": r.kb_version_id,
+                "started_at": r.started_at.isoformat() if r.started_at else None,
+                "completed_at": r.completed_at.isoformat() if r.completed_at else None,
+                "diagnosis_code": r.diagnosis_code,
+                "risk_level": r.risk_level,
+            }
+            for r in rows
+        ],
+        # a short page holds everything below the watermark, so the cursor may skip
+        # what is not there (rolled back, archived)
+        "cursor": rows[-1].completion_seq if full else max(after, watermark - 1),
+        "has_more": full or watermark > after + limit,
+    }
+
+
+def init_change_feed(app):
+    if not sa.event.contains(db.session, "before_flush", _assign_completion_seqs):
+        sa.event.listen(db.session, "before_flush", _assign_completion_seqs)
@@ -0,0 +1,254 @@
+"""
+In-memory cohort cube over completed assessments.
+
+Answers questions like "HIGH-risk results with polyuria=YES and weight_loss=NO
+completed last month" without touching tbl_assessment_answers. Every completed
+assessment is one row; the cube keeps, as bitsets over those rows (Python
+ints, bit r = row r):
+
+    known[bit] / yes[bit]   per symptom bit (Symptom.bit_index), from the fact masks
+    labels[diagnosis_code] / labels[risk_level]
+    days[date]              by completion date (UTC)
+
+A query is AND / OR / AND-NOT over the bitsets it names, then a popcount.
+
+The cube is built on first use from the fact masks of live and archived
+assessments, then follows the completion sequence (app/services/change_feed.py):
+a query folds in completions newer than its cursor, at most every
+COHORT_REFRESH_INTERVAL seconds, up to the feed's low watermark so a
+completion still committing is not skipped. Rows are never updated in place,
+so changes to already-completed assessments (a re-inference) show up at the
+next full rebuild, every COHORT_REBUILD_INTERVAL seconds or on ``invalidate()``.
+
+The cube is per process. Completed assessments without fact masks (older
+than the masks, before ``flask facts backfill-masks``) are not counted.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.models import Assessment, AssessmentArchive, AssessmentResult
+from app.services.archive import decode_payload, payload_masks
+from app.services.change_feed import low_watermark
+from app.utils.fact_masks import decode_mask, iter_bits
+from app.utils.sharding import fan_out, shard_router
+
+GROUPS = ("day", "month", "diagnosis_code", "risk_level")
+CHUNK = 4096
+
+# a clause is a list of (bit, answer) alternatives, ORed; clauses are ANDed
+Clause = List[Tuple[int, bool]]
+
+
+def _fold(rows: Iterable[tuple], base: int):
+    """Bitsets for rows (id, completed_at, diagnosis, risk, known, values), numbered from ``base``."""
+    known, yes = defaultdict(int), defaultdict(int)
+    labels = {"diagnosis_code": defaultdict(int), "risk_level": defaultdict(int)}
+    days = defaultdict(int)
+    for r, (_, completed_at, diagnosis_code, risk_level, k, v) in enumerate(rows):
+        flag = 1 << r
+        for bit in iter_bits(k):
+            known[bit] |= flag
+            if v >> bit & 1:
+                yes[bit] |= flag
+        labels["diagnosis_code"][diagnosis_code or ""] |= flag
+        labels["risk_level"][risk_level or ""] |= flag
+        days[completed_at.date() if completed_at else None] |= flag
+
+    def shift(sets):
+        return {key: value << base for key, value in sets.items()}
+
+    return shift(known), shift(yes), {k: shift(v) for k, v in labels.items()}, shift(days)
+
+
+class CohortCube:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.refresh_interval = 5.0
+        self.rebuild_interval = 3600.0
+        self.settle_seconds = 2.0
+        self.batch_size = 1000
+        self._reset()
+
+    def configure(self, app):
+        cfg = app.config
+        self.refresh_interval = cfg.get("COHORT_REFRESH_INTERVAL", 5.0)
+        self.rebuild_interval = cfg.get("COHORT_REBUILD_INTERVAL", 3600.0)
+        self.settle_seconds = cfg.get("CHANGE_FEED_SETTLE_SECONDS", 2.0)
+        self.batch_size = cfg.get("EXPORT_BATCH_SIZE", 1000)
+
+    def _reset(self):
+        self.rows = 0
+        self.ids: List[int] = []  # assessment id of each row
+        self.cursor = 0  # highest completion_seq folded in
+        self.known: Dict[int, int] = {}
+        self.yes: Dict[int, int] = {}
+        self.labels: Dict[str, Dict[str, int]] = {"diagnosis_code": {}, "risk_level": {}}
+        self.days: Dict[Optional[date], int] = {}
+        self.built_at = None
+        self.refreshed_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._reset()
+
+    # ---- loading ----
+
+    def _append(self, rows: List[tuple]):
+        known, yes, labels, days = _fold(rows, self.rows)
+        for mine, theirs in ((self.known, known), (self.yes, yes), (self.days, days),
+                             (self.labels["diagnosis_code"], labels["diagnosis_code"]),
+                             (self.labels["risk_level"], labels["risk_level"])):
+            for key, value in theirs.items():
+                mine[key] = mine.get(key, 0) | value
+        self.rows += len(rows)
+        self.ids.extend(row[0] for row in rows)
+
+    def _append_all(self, rows: Iterable[tuple]):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == CHUNK:
+                self._append(chunk)
+                chunk = []
+        if chunk:
+            self._append(chunk)
+
+    def _build(self):
+        self._reset()
+        a, r, t = Assessment.__table__, AssessmentResult.__table__, AssessmentArchive.__table__
+        self.cursor = low_watermark(0, self.settle_seconds) - 1
+
+        live = (
+            sa.select(a.c.id, a.c.completed_at, r.c.diagnosis_code, r.c.risk_level, a.c.fact_known, a.c.fact_values)
+            .select_from(a.outerjoin(r, r.c.assessment_id == a.c.id))
+            .where(a.c.status == "COMPLETED", a.c.fact_known.isnot(None), a.c.completion_seq <= self.cursor)
+            .order_by(a.c.id.asc())
+        )
+        archived = (
+            sa.select(t.c.id, t.c.completed_at, t.c.diagnosis_code, t.c.risk_level, t.c.payload)
+            .where(t.c.status == "COMPLETED")
+            .order_by(t.c.id.asc())
+        )
+        engines = [db.engines[key] for key in shard_router.keys] if shard_router.enabled else [db.engine]
+        for engine in engines:
+            with engine.connect() as conn:
+                seen = set()
+
+                def live_rows():
+                    for row in conn.execution_options(stream_results=True, yield_per=self.batch_size).execute(live):
+                        seen.add(row.id)
+                        yield (row.id, row.completed_at, row.diagnosis_code, row.risk_level,
+                               decode_mask(row.fact_known), decode_mask(row.fact_values))
+
+                def archived_rows():
+                    for row in conn.execution_options(stream_results=True, yield_per=self.batch_size).execute(archived):
+                        masks = payload_masks(decode_payload(row.payload))
+                        # archived while the live rows streamed: already counted
+                        if masks is not None and row.id not in seen:
+                            yield (row.id, row.completed_at, row.diagnosis_code, row.risk_level, *masks)
+
+                self._append_all(live_rows())
+                self._append_all(archived_rows())
+        self.built_at = time.monotonic()
+        self.refreshed_at = self.built_at
+
+    def _catch_up(self):
+        watermark = low_watermark(self.cursor, self.settle_seconds)
+        a, r = Assessment.__table__, AssessmentResult.__table__
+        stmt = (
+            sa.select(a.c.completion_seq, a.c.id, a.c.completed_at, r.c.diagnosis_code, r.c.risk_level,
+                      a.c.fact_known, a.c.fact_values)
+            .select_from(a.outerjoin(r, r.c.assessment_id == a.c.id))
+            .where(a.c.completion_seq > self.cursor, a.c.completion_seq < watermark)
+            .order_by(a.c.completion_seq.asc())
+        )
+        rows = sorted((row for part in fan_out(lambda s: s.execute(stmt).all()).values() for row in part),
+                      key=lambda row: row.completion_seq)
+        if rows:
+            self._append_all(
+                (row.id, row.completed_at, row.diagnosis_code, row.risk_level,
+                 decode_mask(row.fact_known), decode_mask(row.fact_values))
+                for row in rows if row.fact_known is not None
+            )
+        self.cursor = max(self.cursor, watermark - 1)
+        self.refreshed_at = time.monotonic()
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            now = time.monotonic()
+            if self.built_at is None or now - self.built_at >= self.rebuild_interval:
+                self._build()
+            elif force or now - self.refreshed_at >= self.refresh_interval:
+                self._catch_up()
+
+    def view(self) -> Tuple[int, List[int], Dict[int, int], Dict[int, int], int]:
+        """(rows, ids, known, yes, as_of_seq) as of now, safe to read without the lock."""
+        self.refresh()
+        with self._lock:
+            return self.rows, list(self.ids), dict(self.known), dict(self.yes), self.cursor
+
+    # ---- queries ----
+
+    def _union(self, sets: Iterable[int]) -> int:
+        out = 0
+        for value in sets:
+            out |= value
+        return out
+
+    def select(self, clauses: Iterable[Clause] = (), diagnosis_code: Optional[str] = None,
+               risk_level: Optional[str] = None, completed_from: Optional[date] = None,
+               completed_to: Optional[date] = None) -> int:
+        """Row bitset; ``completed_to`` is exclusive."""
+        rows = (1 << self.rows) - 1
+        for clause in clauses:
+            any_of = 0
+            for bit, answer in clause:
+                known, yes = self.known.get(bit, 0), self.yes.get(bit, 0)
+                any_of |= yes if answer else known & ~yes
+            rows &= any_of
+        if diagnosis_code is not None:
+            rows &= self.labels["diagnosis_code"].get(diagnosis_code, 0)
+        if risk_level is not None:
+            rows &= self.labels["risk_level"].get(risk_level, 0)
+        if completed_from is not None or completed_to is not None:
+            rows &= self._union(
+                value for day, value in self.days.items()
+                if day is not None
+                and (completed_from is None or day >= completed_from)
+                and (completed_to is None or day < completed_to)
+            )
+        return rows
+
+    def group_counts(self, rows: int, group_by: str) -> Dict[str, int]:
+        if group_by in ("diagnosis_code", "risk_level"):
+            sets = self.labels[group_by].items()
+        else:
+            buckets = defaultdict(int)
+            for day, value in self.days.items():
+                key = None if day is None else day.isoformat() if group_by == "day" else day.strftime("%Y-%m")
+                buckets[key] |= value
+            sets = buckets.items()
+        counts = {key: (rows & value).bit_count() for key, value in sets}
+        return {key or "": n for key, n in sorted(counts.items(), key=lambda kv: kv[0] or "") if n}
+
+    def query(self, clauses: Iterable[Clause] = (), group_by: Optional[str] = None, **filters) -> dict:
+        self.refresh()
+        with self._lock:
+            rows = self.select(clauses, **filters)
+            out = {"count": rows.bit_count(), "population": self.rows, "as_of_seq": self.cursor}
+            if group_by:
+                out["groups"] = self.group_counts(rows, group_by)
+            return out
+
+
+cohort_cube = CohortCube()
+
+
+def init_cohort_cube(app):
+    cohort_cube.configure(app)
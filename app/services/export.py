@@ -0,0 +1,275 @@
+"""
+Streaming export of assessments with their answers and results.
+
+Memory stays flat regardless of row count: rows come from server-side
+cursors (``stream_results`` + ``yield_per``) as plain Core tuples. Answers are
+read by a second cursor ordered the same way and merge-joined on the
+assessment id. Shards are exported one after the other, then the archive
+(app/services/archive.py) of each shard, so every assessment appears once.
+
+``iter_records`` yields one dict per assessment. ``iter_ndjson`` / ``iter_csv``
+turn them into byte chunks for a streamed response or a file. CSV is wide,
+with one column per symptom code (yes / no / empty).
+
+``export_fact_file`` writes the completed assessments' fact masks as a
+bit-packed columnar file (app/utils/fact_columns.py) for cohort statistics.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.models import Assessment, AssessmentAnswer, AssessmentArchive, AssessmentResult, Symptom
+from app.services.archive import decode_payload, payload_masks
+from app.utils.fact_columns import FactFileWriter
+from app.utils.fact_masks import decode_mask
+from app.utils.sharding import fan_out, shard_router
+
+CHUNK_SIZE = 64 * 1024
+
+BASE_COLUMNS = (
+    "assessment_id", "user_id", "status", "kb_version_id", "started_at", "completed_at",
+    "diagnosis_code", "risk_level", "fired_rule_id", "archived",
+)
+
+
+class ExportFilters:
+    __slots__ = ("started_from", "started_to", "diagnosis_code", "risk_level", "status")
+
+    def __init__(self, started_from: Optional[datetime] = None, started_to: Optional[datetime] = None,
+                 diagnosis_code: Optional[str] = None, risk_level: Optional[str] = None,
+                 status: Optional[str] = None):
+        self.started_from = started_from
+        self.started_to = started_to
+        self.diagnosis_code = diagnosis_code
+        self.risk_level = risk_level
+        self.status = status
+
+    def apply(self, stmt, started_at, diagnosis_code, risk_level, status):
+        if self.started_from is not None:
+            stmt = stmt.where(started_at >= self.started_from)
+        if self.started_to is not None:
+            stmt = stmt.where(started_at < self.started_to)
+        if self.diagnosis_code:
+            stmt = stmt.where(diagnosis_code == self.diagnosis_code)
+        if self.risk_level:
+            stmt = stmt.where(risk_level == self.risk_level)
+        if self.status:
+            stmt = stmt.where(status == self.status)
+        return stmt
+
+
+def _engines():
+    if shard_router.enabled:
+        return [db.engines[key] for key in shard_router.keys]
+    return [db.engine]
+
+
+def _engine(key):
+    return db.engines[key] if key is not None else db.engine
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _fired_rule_id(explanation_json):
+    if not explanation_json:
+        return None
+    try:
+        return json.loads(explanation_json).get("fired_rule_id")
+    except ValueError:
+        return None
+
+
+def _live_records(engine, filters: ExportFilters, codes: Dict[int, str], batch_size: int) -> Iterator[dict]:
+    a, r, ans = Assessment.__table__, AssessmentResult.__table__, AssessmentAnswer.__table__
+    base = a.outerjoin(r, r.c.assessment_id == a.c.id)
+    assessments = filters.apply(
+        sa.select(a.c.id, a.c.user_id, a.c.status, a.c.kb_version_id, a.c.started_at, a.c.completed_at,
+                  r.c.diagnosis_code, r.c.risk_level, r.c.explanation_json).select_from(base),
+        a.c.started_at, r.c.diagnosis_code, r.c.risk_level, a.c.status,
+    ).order_by(a.c.id.asc())
+    answers = filters.apply(
+        sa.select(ans.c.assessment_id, ans.c.symptom_id, ans.c.answer_bool, ans.c.answered_at)
+        .select_from(ans.join(base, ans.c.assessment_id == a.c.id)),
+        a.c.started_at, r.c.diagnosis_code, r.c.risk_level, a.c.status,
+    ).order_by(ans.c.assessment_id.asc(), ans.c.id.asc())
+
+    # two connections: a server-side cursor may not share its connection
+    with engine.connect() as conn, engine.connect() as answer_conn:
+        rows = conn.execution_options(stream_results=True, yield_per=batch_size).execute(assessments)
+        answer_rows = answer_conn.execution_options(stream_results=True, yield_per=batch_size).execute(answers)
+        pending = next(answer_rows, None)
+        for row in rows:
+            items = []
+            while pending is not None and pending.assessment_id <= row.id:
+                if pending.assessment_id == row.id:
+                    items.append({
+                        "symptom_id": pending.symptom_id,
+                        "code": codes.get(pending.symptom_id),
+                        "answer": bool(pending.answer_bool),
+                        "answered_at": _iso(pending.answered_at),
+                    })
+                pending = next(answer_rows, None)
+            yield {
+                "assessment_id": row.id,
+                "user_id": row.user_id,
+                "status": row.status,
+                "kb_version_id": row.kb_version_id,
+                "started_at": _iso(row.started_at),
+                "completed_at": _iso(row.completed_at),
+                "diagnosis_code": row.diagnosis_code,
+                "risk_level": row.risk_level,
+                "fired_rule_id": _fired_rule_id(row.explanation_json),
+                "archived": False,
+                "answers": items,
+            }
+
+
+def _archived_records(engine, filters: ExportFilters, codes: Dict[int, str], batch_size: int) -> Iterator[dict]:
+    t = AssessmentArchive.__table__
+    stmt = filters.apply(
+        sa.select(t.c.id, t.c.user_id, t.c.status, t.c.kb_version_id, t.c.started_at, t.c.completed_at,
+                  t.c.diagnosis_code, t.c.risk_level, t.c.payload),
+        t.c.started_at, t.c.diagnosis_code, t.c.risk_level, t.c.status,
+    ).order_by(t.c.id.asc())
+    with engine.connect() as conn:
+        for row in conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt):
+            payload = decode_payload(row.payload)
+            result = payload.get("result") or {}
+            yield {
+                "assessment_id": row.id,
+                "user_id": row.user_id,
+                "status": row.status,
+                "kb_version_id": row.kb_version_id,
+                "started_at": _iso(row.started_at),
+                "completed_at": _iso(row.completed_at),
+                "diagnosis_code": row.diagnosis_code,
+                "risk_level": row.risk_level,
+                "fired_rule_id": _fired_rule_id(result.get("explanation_json")),
+                "archived": True,
+                "answers": [
+                    {"symptom_id": sid, "code": codes.get(sid), "answer": answer, "answered_at": answered_at}
+                    for sid, answer, answered_at, _ in payload["answers"]
+                ],
+            }
+
+
+def symptom_codes() -> Dict[int, str]:
+    return dict(db.session.query(Symptom.id, Symptom.code).order_by(Symptom.id.asc()).all())
+
+
+def iter_records(filters: ExportFilters, codes: Dict[int, str], batch_size: int = 1000) -> Iterator[dict]:
+    for engine in _engines():
+        yield from _live_records(engine, filters, codes, batch_size)
+        yield from _archived_records(engine, filters, codes, batch_size)
+
+
+def _chunked(pieces: Iterable[str]) -> Iterator[bytes]:
+    buf, size = [], 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield "".join(buf).encode("utf-8")
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def iter_ndjson(records: Iterable[dict]) -> Iterator[bytes]:
+    return _chunked(json.dumps(rec, separators=(",", ":")) + "\n" for rec in records)
+
+
+def iter_csv(records: Iterable[dict], codes: Dict[int, str]) -> Iterator[bytes]:
+    symptom_codes = list(codes.values())
+
+    def lines():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(BASE_COLUMNS + tuple(symptom_codes))
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+        for rec in records:
+            answers = {a["code"]: "yes" if a["answer"] else "no" for a in rec["answers"]}
+            writer.writerow(
+                [rec[c] for c in BASE_COLUMNS] + [answers.get(code, "") for code in symptom_codes]
+            )
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+
+    return _chunked(lines())
+
+
+# ---------- columnar fact file ----------
+
+def export_fact_file(path: str, batch_size: int = 1000) -> dict:
+    """
+    Write every COMPLETED assessment (live and archived) that has fact masks
+    to ``path``. Rows are bounded by the highest id and the time seen when the
+    export starts, so assessments completing meanwhile are left out; returns
+    {"rows": written, "skipped": completed rows without masks, plus any that
+    no longer fit the file sized at the start (masks backfilled meanwhile)}.
+    Do not run it concurrently with ``flask assessments archive``.
+    """
+    bits = dict(db.session.query(Symptom.code, Symptom.bit_index).filter(Symptom.bit_index.isnot(None)).all())
+    a, r, t = Assessment.__table__, AssessmentResult.__table__, AssessmentArchive.__table__
+
+    as_of = datetime.utcnow()
+    # completed by the time the export started (rows from before completed_at existed have none)
+    completed = sa.and_(a.c.status == "COMPLETED", sa.or_(a.c.completed_at.is_(None), a.c.completed_at <= as_of))
+
+    def plan(session):
+        live_max = session.execute(sa.select(sa.func.max(a.c.id))).scalar() or 0
+        archive_max = session.execute(sa.select(sa.func.max(t.c.id))).scalar() or 0
+        counts = session.execute(
+            sa.select(
+                sa.func.count().filter(a.c.fact_known.isnot(None)),
+                sa.func.count().filter(a.c.fact_known.is_(None)),
+            ).where(completed, a.c.id <= live_max)
+        ).one()
+        archived = session.execute(
+            sa.select(sa.func.count()).where(t.c.status == "COMPLETED", t.c.id <= archive_max)
+        ).scalar()
+        return live_max, archive_max, counts[0] + archived, counts[1]
+
+    plans = fan_out(plan)
+    writer = FactFileWriter(path, sum(p[2] for p in plans.values()), max(bits.values(), default=-1) + 1)
+    skipped = sum(p[3] for p in plans.values())
+    try:
+        for key, (live_max, archive_max, _, _) in plans.items():
+            live = (
+                sa.select(a.c.id, a.c.completed_at, r.c.diagnosis_code, r.c.risk_level, a.c.fact_known, a.c.fact_values)
+                .select_from(a.outerjoin(r, r.c.assessment_id == a.c.id))
+                .where(completed, a.c.fact_known.isnot(None), a.c.id <= live_max)
+                .order_by(a.c.id.asc())
+            )
+            archived = (
+                sa.select(t.c.id, t.c.completed_at, t.c.diagnosis_code, t.c.risk_level, t.c.payload)
+                .where(t.c.status == "COMPLETED", t.c.id <= archive_max)
+                .order_by(t.c.id.asc())
+            )
+            with _engine(key).connect() as conn:
+                for row in conn.execution_options(stream_results=True, yield_per=batch_size).execute(live):
+                    if not writer.append(row.id, row.completed_at, row.diagnosis_code, row.risk_level,
+                                         decode_mask(row.fact_known), decode_mask(row.fact_values)):
+                        skipped += 1
+                for row in conn.execution_options(stream_results=True, yield_per=batch_size).execute(archived):
+                    masks = payload_masks(decode_payload(row.payload))
+                    if masks is None:
+                        skipped += 1
+                        continue
+                    if not writer.append(row.id, row.completed_at, row.diagnosis_code, row.risk_level, *masks):
+                        skipped += 1
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close(bits)
+    return {"rows": writer.rows, "skipped": skipped}
@@ -0,0 +1,102 @@
+"""
+Signed fact tokens for stateless assessments.
+
+A stateless (anonymous) assessment keeps no server-side rows until the user
+saves it: the client carries a token holding the KB version it runs on, when
+it started and the facts so far, as the same bitmasks the assessment row uses
+(app/utils/fact_masks.py). Layout before signing:
+
+    !BII16sH  format, kb_version_id, started_at (epoch seconds), nonce, mask length n
+    n bytes fact_known, n bytes fact_values (both zero-padded to n)
+
+The nonce is drawn once, at /start, and carried through every answer; /save
+records it so one self-check is saved at most once however often its tokens
+are replayed.
+
+base64url-encoded and signed with an itsdangerous TimestampSigner keyed by
+SECRET_KEY, so a token cannot be forged or edited, and expires after
+STATELESS_TOKEN_MAX_AGE seconds.
+"""
+import base64
+import hashlib
+import os
+import struct
+from datetime import datetime, timezone
+from typing import Dict, NamedTuple, Tuple
+
+from flask import current_app
+from itsdangerous import BadSignature, TimestampSigner
+
+from app.services.kb_cache import CompiledKB, kb_cache
+from app.utils.fact_masks import decode_mask, encode_mask, facts_from
+
+_FORMAT = 2
+_HEADER = struct.Struct("!BII16sH")
+_SALT = "stateless-assessment"
+
+
+class InvalidFactToken(ValueError):
+    """Token is malformed, tampered with or expired."""
+
+
+class FactToken(NamedTuple):
+    kb_version_id: int
+    started_at: datetime  # naive UTC, like the model columns
+    facts: Dict[int, bool]
+    nonce: str  # hex, shared by every token of one self-check
+
+
+def _signer() -> TimestampSigner:
+    return TimestampSigner(current_app.config["SECRET_KEY"], salt=_SALT, digest_method=hashlib.sha256)
+
+
+def new_nonce() -> str:
+    return os.urandom(16).hex()
+
+
+def encode_token(kb: CompiledKB, started_at: datetime, facts: Dict[int, bool], nonce: str) -> str:
+    """Token for ``facts`` on compiled KB ``kb``; every symptom must have a fact-mask bit."""
+    known = values = 0
+    for sid, answer in facts.items():
+        bit = 1 << kb.bit_of[sid]
+        known |= bit
+        if answer:
+            values |= bit
+    width = len(encode_mask(known))
+    started = int(started_at.replace(tzinfo=timezone.utc).timestamp())
+    raw = (
+        _HEADER.pack(_FORMAT, kb.version_id, started, bytes.fromhex(nonce), width)
+        + known.to_bytes(width, "little")
+        + values.to_bytes(width, "little")
+    )
+    payload = base64.urlsafe_b64encode(raw).rstrip(b"=")
+    return _signer().sign(payload).decode("ascii")
+
+
+def _unpack(token: str):
+    try:
+        payload = _signer().unsign(token, max_age=current_app.config.get("STATELESS_TOKEN_MAX_AGE"))
+        raw = base64.urlsafe_b64decode(payload + b"=" * (-len(payload) % 4))
+        fmt, version_id, started, nonce, width = _HEADER.unpack_from(raw)
+    except (BadSignature, ValueError, struct.error) as e:
+        raise InvalidFactToken(str(e)) from e
+    body = raw[_HEADER.size:]
+    if fmt != _FORMAT or len(body) != 2 * width:
+        raise InvalidFactToken("unsupported token format")
+    started_at = datetime.fromtimestamp(started, timezone.utc).replace(tzinfo=None)
+    return version_id, started_at, nonce.hex(), body[:width], body[width:]
+
+
+def decode_token(token: str) -> Tuple[CompiledKB, FactToken]:
+    """Verify ``token``; returns the compiled KB it runs on and its facts."""
+    version_id, started_at, nonce, known, values = _unpack(token)
+    try:
+        kb = kb_cache.get(version_id)
+    except LookupError as e:
+        raise InvalidFactToken("unknown KB version") from e
+    if decode_mask(values) & ~decode_mask(known):
+        raise InvalidFactToken("answer bit without a known bit")
+    facts = facts_from(known, values, kb.symptom_at)
+    if facts is None:
+        raise InvalidFactToken("token refers to unknown symptoms")
+    return kb, FactToken(version_id, started_at, facts, nonce)
@@ -0,0 +1,254 @@
+"""
+Idempotency-Key support for diagnosis write endpoints.
+
+A client that retries a write (timeout, flaky network) sends the same
+``Idempotency-Key`` header again. The first response for a key is stored;
+a retry gets it replayed byte-for-byte (with ``Idempotent-Replayed: true``)
+without the view - and so the ORM load and inference - running again.
+
+Keys are scoped by user and endpoint and expire after IDEMPOTENCY_TTL
+seconds. Reusing a key for a different request (other path or body) is a
+422. Responses with status >= 500 are not stored, so those can be retried.
+
+While a keyed request runs it holds a lock on what it writes to (the
+assessment for /answer, the user for /start and /save): a concurrent
+duplicate waits, then replays the stored response instead of racing into
+the "already answered" path or a unique-constraint error.
+
+Backends (IDEMPOTENCY_STORE):
+  ""           disabled: the header is ignored
+  "local"      bounded in-process LRU with TTL, shared by every app instance
+               in the process (default). Locks and replays only cover one
+               worker, so several workers need sticky routing or Redis.
+  "redis://.." shared store and locks (needs the optional ``redis`` package)
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, NamedTuple, Optional
+
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity
+
+from app.utils.json_provider import json_bytes_response
+from app.utils.metrics import metrics
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status: int
+    mimetype: str
+    body: bytes
+
+    def encode(self) -> bytes:
+        head = json.dumps([self.fingerprint, self.status, self.mimetype]).encode()
+        return head + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, blob: Optional[bytes]) -> Optional["StoredResponse"]:
+        if blob is None:
+            return None
+        head, _, body = blob.partition(b"\n")
+        fingerprint, status, mimetype = json.loads(head)
+        return cls(fingerprint, status, mimetype, body)
+
+
+class LockTimeout(Exception):
+    pass
+
+
+# ---------- backends ----------
+
+class LocalIdempotencyStore:
+    def __init__(self, max_items: int = 10000, ttl: float = 86400):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._locks: Dict[str, list] = {}  # name -> [lock, holders + waiters]
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key: str, response: StoredResponse):
+        with self._lock:
+            self._items[key] = (time.time() + self.ttl, response)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    @contextmanager
+    def lock(self, name: str, timeout: float):
+        with self._lock:
+            entry = self._locks.setdefault(name, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(timeout=timeout):
+                raise LockTimeout(name)
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[name]
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class RedisIdempotencyStore:
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str, ttl: float = 86400, prefix: str = "idempotency:"):
+        import redis  # optional dependency
+
+        self._client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        return StoredResponse.decode(self._client.get(self.prefix + key))
+
+    def put(self, key: str, response: StoredResponse):
+        self._client.set(self.prefix + key, response.encode(), ex=self.ttl)
+
+    @contextmanager
+    def lock(self, name: str, timeout: float):
+        key = f"{self.prefix}lock:{name}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        # the lock expires on its own if the holder dies
+        while not self._client.set(key, token, nx=True, px=int(timeout * 1000) * 3):
+            if time.monotonic() > deadline:
+                raise LockTimeout(name)
+            time.sleep(0.02)
+        try:
+            yield
+        finally:
+            self._client.eval(self._RELEASE, 1, key, token)
+
+    def __len__(self):
+        return sum(1 for _ in self._client.scan_iter(self.prefix + "*"))
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(key)
+
+
+_shared_local = None
+
+
+def make_idempotency_store(spec: Optional[str], max_items: int = 10000, ttl: float = 86400):
+    global _shared_local
+    if not spec:
+        return None
+    if spec == "local":
+        if _shared_local is None:
+            _shared_local = LocalIdempotencyStore(max_items, ttl)
+        _shared_local.max_items, _shared_local.ttl = max_items, ttl
+        return _shared_local
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisIdempotencyStore(spec, ttl)
+    raise ValueError(f"unknown IDEMPOTENCY_STORE {spec!r}")
+
+
+class Idempotency:
+    def __init__(self):
+        self.backend = None
+        self.lock_timeout = 10.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def configure(self, app):
+        cfg = app.config
+        self.backend = make_idempotency_store(
+            cfg.get("IDEMPOTENCY_STORE"), cfg.get("IDEMPOTENCY_MAX_KEYS", 10000), cfg.get("IDEMPOTENCY_TTL", 86400)
+        )
+        self.lock_timeout = cfg.get("IDEMPOTENCY_LOCK_TIMEOUT", 10.0)
+
+
+idempotency = Idempotency()
+
+
+def init_idempotency(app):
+    idempotency.configure(app)
+
+
+def _fingerprint() -> str:
+    digest = hashlib.sha256(request.path.encode())
+    digest.update(b"\0")
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _replay(stored: StoredResponse):
+    if stored.mimetype == current_app.json.mimetype:
+        response = json_bytes_response(stored.body, stored.status)
+    else:
+        response = current_app.response_class(stored.body, status=stored.status, mimetype=stored.mimetype)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(lock_on: Callable[..., str]):
+    """
+    Honour the Idempotency-Key header on a view (after authentication).
+    ``lock_on(**view_args)`` names what the request writes to; keyed requests
+    for the same name run one at a time.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key or not idempotency.enabled:
+                return fn(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return {"message": f"{HEADER} is too long"}, 400
+
+            backend = idempotency.backend
+            scope = f"{get_jwt_identity()}:{request.endpoint}:{key}"
+            fingerprint = _fingerprint()
+            try:
+                with backend.lock(lock_on(**kwargs), idempotency.lock_timeout):
+                    stored = backend.get(scope)
+                    if stored is not None:
+                        if stored.fingerprint != fingerprint:
+                            return {"message": f"{HEADER} was already used for a different request"}, 422
+                        metrics.inc("idempotency_replays", endpoint=request.endpoint)
+                        return _replay(stored)
+
+                    response = current_app.make_response(fn(*args, **kwargs))
+                    if response.status_code < 500 and not response.is_streamed:
+                        backend.put(scope, StoredResponse(
+                            fingerprint, response.status_code, response.mimetype, response.get_data(),
+                        ))
+                    return response
+            except LockTimeout:
+                return {"message": "a request with this key is still in progress"}, 409
+        return wrapper
+    return decorator
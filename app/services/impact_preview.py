@@ -0,0 +1,184 @@
+"""
+Dry-run impact of a rule edit on past assessments.
+
+``preview`` runs the inference engine's decision for every completed
+assessment in the cohort cube (app/services/cohort.py) twice - with the KB as
+it is and with the proposed edit - and counts how many move from one
+(diagnosis_code, risk_level) to another. Nothing is written.
+
+The engine is evaluated on all rows at once, as bitsets over the cube's rows:
+per rule, MATCHED is the AND of its conditions' answer bitsets and IMPOSSIBLE
+the OR of their contradictions; ``decide`` then becomes a walk over the rules
+in engine order (first matched rule fires unless a higher-priority rule, or a
+more specific one of the same priority, is still possible). Assessments the
+engine would keep asking about are reported as ``undecided`` (None). This
+gives exactly what ``conclude`` returns for the same facts. Moves into or out
+of undecided are counted as ``undecided_changed``, apart from
+``diagnosis_changed`` and ``risk_changed``.
+
+Rows are processed newest first in slices of SLICE; once IMPACT_PREVIEW_BUDGET_MS
+is spent (the first slice always runs) the counts so far are returned with
+``complete: false``. With
+``sample`` only that many randomly chosen rows (fixed seed, so repeated
+previews are comparable) are evaluated.
+"""
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.models import Rule
+from app.services.cohort import cohort_cube
+from app.services.inference_engine import FALLBACK_OUTCOME
+from app.services.kb_cache import CompiledCondition, CompiledKB, CompiledRule
+from app.services.kb_editor import _rule_fields, normalize_conditions
+
+SLICE = 1 << 16
+SAMPLE_SEED = 0
+
+Outcome = Optional[Tuple[str, str]]  # None: the engine would ask another question
+
+
+def proposed_kb(kb: CompiledKB, rule: Rule, data: dict) -> CompiledKB:
+    """``kb`` with ``rule`` changed by ``data`` (update_rule fields and/or replace_conditions' "conditions")."""
+    fields = {
+        "name": rule.name, "diagnosis_code": rule.diagnosis_code, "risk_level": rule.risk_level,
+        "priority": rule.priority, "is_active": bool(rule.is_active),
+        **_rule_fields(data, partial=True),
+    }
+    if "conditions" in data:
+        conditions = tuple(
+            CompiledCondition(sid, c["expected_value"]) for sid, c in normalize_conditions(data["conditions"]).items()
+        )
+    else:
+        conditions = tuple(CompiledCondition(c.symptom_id, bool(c.expected_value)) for c in rule.conditions)
+
+    rules = [r for r in kb.rules if r.id != rule.id]
+    if fields["is_active"]:
+        rules.append(CompiledRule(rule.id, fields["name"], fields["diagnosis_code"], fields["risk_level"],
+                                  fields["priority"], conditions))
+    return CompiledKB(kb.version_id, rules, kb.symptoms, kb.advice_ids)
+
+
+def outcome_sets(kb: CompiledKB, known: Dict[int, int], yes: Dict[int, int], rows: int) -> Dict[Outcome, int]:
+    """Bitset of the rows ending in each outcome; ``rows`` is the bitset of rows to evaluate."""
+    matched, possible = {}, {}
+    for r in kb.rules:
+        m, contradicted = rows, 0
+        for c in r.conditions:
+            bit = kb.bit_of.get(c.symptom_id)
+            k, y = (known.get(bit, 0), yes.get(bit, 0)) if bit is not None else (0, 0)
+            hit = y if c.expected_value else k & ~y
+            m &= hit
+            contradicted |= k & ~hit
+        matched[r.id] = m
+        possible[r.id] = rows & ~m & ~contradicted
+
+    out: Dict[Outcome, int] = defaultdict(int)
+    undecided = rows  # rows whose first matched rule has not been seen yet
+    fired = blocked = any_possible = 0
+    by_priority = defaultdict(list)
+    for r in kb.rules:  # engine order: priority desc, id asc
+        by_priority[r.priority].append(r)
+    for priority in sorted(by_priority, reverse=True):
+        group = by_priority[priority]
+        for r in group:
+            first = matched[r.id] & undecided
+            undecided &= ~first
+            waiting = 0
+            for q in group:
+                if len(q.conditions) > len(r.conditions):
+                    waiting |= possible[q.id]
+            fire = first & ~blocked & ~waiting
+            if fire:
+                out[(r.diagnosis_code, r.risk_level)] |= fire
+                fired |= fire
+        for r in group:
+            blocked |= possible[r.id]
+    for r in kb.rules:
+        any_possible |= possible[r.id]
+
+    rest = rows & ~fired
+    if rest & any_possible:
+        out[None] |= rest & any_possible
+    if rest & ~any_possible:
+        out[FALLBACK_OUTCOME] |= rest & ~any_possible
+    return out
+
+
+def _sample(rows: int, size: int) -> int:
+    flags = bytearray((rows + 7) // 8)
+    for r in random.Random(SAMPLE_SEED).sample(range(rows), size):
+        flags[r >> 3] |= 1 << (r & 7)
+    return int.from_bytes(flags, "little")
+
+
+def _outcome_json(outcome: Outcome) -> Optional[dict]:
+    return None if outcome is None else {"diagnosis_code": outcome[0], "risk_level": outcome[1]}
+
+
+def _bits_used(kbs: Iterable[CompiledKB]) -> set:
+    return {kb.bit_of[c.symptom_id] for kb in kbs for r in kb.rules for c in r.conditions if c.symptom_id in kb.bit_of}
+
+
+def preview(before: CompiledKB, after: CompiledKB, sample: Optional[int] = None, examples: int = 5,
+            budget_ms: float = 500.0) -> dict:
+    """Confusion counts between ``before`` and ``after`` over the cube's completed assessments."""
+    started = time.monotonic()
+    population, ids, known, yes, as_of_seq = cohort_cube.view()
+    universe = (1 << population) - 1
+    if sample and sample < population:
+        universe = _sample(population, sample)
+    bits = _bits_used((before, after))
+    known = {bit: known[bit] for bit in bits if bit in known}
+    yes = {bit: yes[bit] for bit in bits if bit in yes}
+
+    counts: Counter = Counter()
+    found: Dict[Tuple[Outcome, Outcome], List[int]] = defaultdict(list)
+    evaluated = 0
+    complete = True
+    hi = population
+    while hi > 0:
+        lo = max(0, hi - SLICE)
+        window = (1 << (hi - lo)) - 1
+        rows = universe >> lo & window
+        if rows:
+            part = ({bit: v >> lo & window for bit, v in known.items()},
+                    {bit: v >> lo & window for bit, v in yes.items()})
+            old, new = outcome_sets(before, *part, rows), outcome_sets(after, *part, rows)
+            for a, a_rows in old.items():
+                for b, b_rows in new.items():
+                    both = a_rows & b_rows
+                    if not both:
+                        continue
+                    counts[(a, b)] += both.bit_count()
+                    while a != b and both and len(found[(a, b)]) < examples:
+                        r = both.bit_length() - 1  # newest first: highest row numbers
+                        found[(a, b)].append(ids[lo + r])
+                        both ^= 1 << r
+            evaluated += rows.bit_count()
+        hi = lo
+        if hi > 0 and (time.monotonic() - started) * 1000 >= budget_ms:
+            complete = False
+            break
+
+    changed = sum(n for (a, b), n in counts.items() if a != b)
+    return {
+        "population": population,
+        "evaluated": evaluated,
+        "sampled": universe != (1 << population) - 1,
+        "complete": complete,
+        "as_of_seq": as_of_seq,
+        "changed": changed,
+        "unchanged": evaluated - changed,
+        "diagnosis_changed": sum(n for (a, b), n in counts.items()
+                                 if a is not None and b is not None and a[0] != b[0]),
+        "risk_changed": sum(n for (a, b), n in counts.items()
+                            if a is not None and b is not None and a[0] == b[0] and a[1] != b[1]),
+        "undecided_changed": sum(n for (a, b), n in counts.items() if a != b and (a is None or b is None)),
+        "transitions": [
+            {"before": _outcome_json(a), "after": _outcome_json(b), "count": n, "examples": found.get((a, b), [])}
+            for (a, b), n in sorted(counts.items(), key=lambda kv: (kv[0][0] == kv[0][1], -kv[1]))
+        ],
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
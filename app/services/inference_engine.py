@@ -1,25 +1,92 @@
 import json
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, deque
 from datetime import datetime
-from typing import Dict, Optional, Tuple, List
+from typing import Callable, Dict, Optional, Tuple, List, Union
+
+import sqlalchemy as sa
 
 from app.extensions import db
 from app.models import (
     Rule,
-    Advice,
     Assessment,
     AssessmentAnswer,
     AssessmentResult,
     Symptom,
 )
+from app.services.kb_cache import CompiledKB, CompiledRule, CompiledSymptom, compile_live_kb, kb_for_assessment
+from app.services.rollups import record_completed
+from app.services.session_store import session_store
+from app.utils.fact_masks import facts_from, masks_for
+from app.utils.sharding import fan_out
+
+# (diagnosis_code, risk_level) when no rule matches and nothing is left to ask
+FALLBACK_OUTCOME = ("DIABETES_RISK", "LOW")
+
+
+def fact_masks(kb: CompiledKB, facts: Dict[int, bool]) -> Tuple[Optional[bytes], Optional[bytes]]:
+    """(fact_known, fact_values) for ``facts``; (None, None) if ``kb`` has no bit for some symptom."""
+    if not facts.keys() <= kb.bit_of.keys():
+        return None, None
+    return masks_for(facts, kb.bit_of)
+
+
+def backfill_fact_masks(batch_size: int = 1000) -> int:
+    """Compute missing fact masks from the answer rows (every shard); returns assessments updated."""
+    bits = dict(db.session.query(Symptom.id, Symptom.bit_index).filter(Symptom.bit_index.isnot(None)).all())
+    table = Assessment.__table__
+    set_masks = (
+        sa.update(table).where(table.c.id == sa.bindparam("b_id"))
+        .values(fact_known=sa.bindparam("b_known"), fact_values=sa.bindparam("b_values"))
+    )
+
+    def run(session):
+        done, last_id = 0, 0
+        while True:
+            ids = session.execute(
+                sa.select(table.c.id).where(table.c.fact_known.is_(None), table.c.id > last_id)
+                .order_by(table.c.id.asc()).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                return done
+            facts = defaultdict(dict)
+            for aid, sid, answer in session.execute(
+                sa.select(AssessmentAnswer.assessment_id, AssessmentAnswer.symptom_id, AssessmentAnswer.answer_bool)
+                .where(AssessmentAnswer.assessment_id.in_(ids))
+            ):
+                facts[aid][sid] = bool(answer)
+            rows = []
+            for aid in ids:
+                if facts[aid].keys() <= bits.keys():
+                    known, values = masks_for(facts[aid], bits)
+                    rows.append({"b_id": aid, "b_known": known, "b_values": values})
+            if rows:
+                session.execute(set_masks, rows)
+            session.commit()
+            done += len(rows)
+            last_id = ids[-1]
+
+    return sum(fan_out(run).values())
 
 
 def _facts_for_assessment(assessment_id: int) -> Dict[int, bool]:
+    facts = session_store.facts(assessment_id)
+    if facts is not None:
+        return facts
+    assessment = db.session.get(Assessment, assessment_id)
+    if assessment is not None and assessment.fact_known is not None:
+        facts = facts_from(assessment.fact_known, assessment.fact_values, kb_for_assessment(assessment).symptom_at)
+        if facts is not None:
+            return facts
     rows = AssessmentAnswer.query.filter_by(assessment_id=assessment_id).all()
     return {r.symptom_id: bool(r.answer_bool) for r in rows}
 
 
-def _rule_status(rule: Rule, facts: Dict[int, bool]) -> Tuple[str, list, list]:
+def current_facts(assessment: Assessment) -> Dict[int, bool]:
+    """A private copy of the assessment's facts so far."""
+    return dict(_facts_for_assessment(assessment.id))
+
+
+def _rule_status(rule: Union[Rule, CompiledRule], facts: Dict[int, bool]) -> Tuple[str, list, list]:
     """
     Returns (status, matched_conditions, missing_conditions)
 
@@ -49,21 +116,13 @@ def _rule_status(rule: Rule, facts: Dict[int, bool]) -> Tuple[str, list, list]:
     return "MATCHED", matched, []
 
 
-def infer_if_complete(assessment: Assessment) -> Optional[AssessmentResult]:
+def decide(kb: CompiledKB, facts: Dict[int, bool]) -> Optional[Tuple[CompiledRule, list]]:
     """
-    Improved: do NOT finalize a lower-priority MATCHED rule if a higher-priority
-    rule is still POSSIBLE, or if a more specific rule at the same priority is still POSSIBLE.
+    Pure decision step of ``infer_if_complete``: (rule to fire, its matched
+    conditions), or None while the engine still has to wait for more facts.
     """
-    facts = _facts_for_assessment(assessment.id)
-
-    rules: List[Rule] = (
-        Rule.query.filter_by(is_active=True)
-        .order_by(Rule.priority.desc(), Rule.id.asc())
-        .all()
-    )
-
     statuses = []
-    for r in rules:
+    for r in kb.rules:
         status, matched, missing = _rule_status(r, facts)
         statuses.append((r, status, matched, missing))
 
@@ -86,48 +145,91 @@ def infer_if_complete(assessment: Assessment) -> Optional[AssessmentResult]:
             if len(r.conditions) > best_conditions:
                 return None
 
-    # Finalize best_rule
+    return best_rule, best_matched
+
+
+def _fired_result(kb: CompiledKB, rule: CompiledRule, matched: list, facts: Dict[int, bool]) -> dict:
     explanation = {
-        "fired_rule_id": best_rule.id,
-        "fired_rule_name": best_rule.name,
-        "matched_conditions": best_matched,
+        "fired_rule_id": rule.id,
+        "fired_rule_name": rule.name,
+        "matched_conditions": matched,
         "facts": {str(k): v for k, v in facts.items()},
+        "advice_id": kb.advice_id_for(rule.diagnosis_code, rule.risk_level),
+    }
+    return {
+        "diagnosis_code": rule.diagnosis_code,
+        "risk_level": rule.risk_level,
+        "explanation_json": json.dumps(explanation),
     }
 
-    advice = Advice.query.filter_by(
-        is_active=True,
-        diagnosis_code=best_rule.diagnosis_code,
-        risk_level=best_rule.risk_level
-    ).first()
 
-    advice_id = advice.id if advice else None
+def _fallback_result(kb: CompiledKB, facts: Dict[int, bool]) -> dict:
+    fallback = infer_diagnosis(facts, kb)
+    explanation = {
+        "fired_rule_id": None,
+        "fired_rule_name": None,
+        "matched_conditions": [],
+        "facts": {str(k): v for k, v in facts.items()},
+    }
+    return {
+        "diagnosis_code": fallback["diagnosis_code"],
+        "risk_level": fallback["risk_level"],
+        "explanation_json": json.dumps(explanation),
+    }
+
+
+def conclude(kb: CompiledKB, facts: Dict[int, bool]) -> Optional[dict]:
+    """
+    Pure counterpart of ``infer_if_complete`` + ``ensure_fallback_result``:
+    the AssessmentResult fields (diagnosis_code, risk_level, explanation_json)
+    the engine would store for ``facts``, or None while it would still ask
+    another question.
+    """
+    decision = decide(kb, facts)
+    if decision is not None:
+        return _fired_result(kb, *decision, facts)
+    if select_question(kb, facts) is None:
+        return _fallback_result(kb, facts)
+    return None
+
 
+def infer_if_complete(assessment: Assessment) -> Optional[AssessmentResult]:
+    """
+    Improved: do NOT finalize a lower-priority MATCHED rule if a higher-priority
+    rule is still POSSIBLE, or if a more specific rule at the same priority is still POSSIBLE.
+    """
+    facts = _facts_for_assessment(assessment.id)
+    kb = kb_for_assessment(assessment)
+
+    decision = decide(kb, facts)
+    if decision is None:
+        return None
+    best_rule, best_matched = decision
+
+    # Finalize best_rule
     result = AssessmentResult(
         assessment_id=assessment.id,
-        diagnosis_code=best_rule.diagnosis_code,
-        risk_level=best_rule.risk_level,
-        explanation_json=json.dumps({**explanation, "advice_id": advice_id}),
+        **_fired_result(kb, best_rule, best_matched, facts),
         created_at=datetime.utcnow(),
     )
+    session_store.flush([assessment.id])  # answer rows before the result
     db.session.add(result)
 
     assessment.status = "COMPLETED"
     assessment.completed_at = datetime.utcnow()
+    record_completed(db.session, assessment.completed_at, len(facts), result.diagnosis_code, result.risk_level)
     db.session.commit()
+    session_store.forget(assessment.id)
 
     return result
 
 
-def infer_diagnosis(facts: Dict[int, bool]):
+def infer_diagnosis(facts: Dict[int, bool], kb: Optional[CompiledKB] = None):
+    if kb is None:
+        kb = compile_live_kb()
     matched_rules = []
 
-    active_rules: List[Rule] = (
-        Rule.query.filter_by(is_active=True)
-        .order_by(Rule.priority.desc(), Rule.id.asc())
-        .all()
-    )
-
-    for rule in active_rules:
+    for rule in kb.rules:
         status, _, _ = _rule_status(rule, facts)
         if status == "MATCHED":
             matched_rules.append(rule)
@@ -143,8 +245,8 @@ def infer_diagnosis(facts: Dict[int, bool]):
 
     # FALLBACK
     return {
-        "diagnosis_code": "DIABETES_RISK",
-        "risk_level": "LOW",
+        "diagnosis_code": FALLBACK_OUTCOME[0],
+        "risk_level": FALLBACK_OUTCOME[1],
         "fired_rule": None,
     }
 
@@ -159,55 +261,27 @@ def ensure_fallback_result(assessment: Assessment) -> AssessmentResult:
         return existing
 
     facts = _facts_for_assessment(assessment.id)
-    fallback = infer_diagnosis(facts)
-
-    explanation = {
-        "fired_rule_id": None,
-        "fired_rule_name": None,
-        "matched_conditions": [],
-        "facts": {str(k): v for k, v in facts.items()},
-    }
-
     result = AssessmentResult(
         assessment_id=assessment.id,
-        diagnosis_code=fallback["diagnosis_code"],
-        risk_level=fallback["risk_level"],
-        explanation_json=json.dumps(explanation),
+        **_fallback_result(kb_for_assessment(assessment), facts),
         created_at=datetime.utcnow(),
     )
+    session_store.flush([assessment.id])  # answer rows before the result
     db.session.add(result)
 
     assessment.status = "COMPLETED"
     assessment.completed_at = datetime.utcnow()
+    record_completed(db.session, assessment.completed_at, len(facts), result.diagnosis_code, result.risk_level)
     db.session.commit()
+    session_store.forget(assessment.id)
 
     return result
 
 
-def next_question(assessment: Assessment) -> Optional[Symptom]:
-    """
-    Smart question selection:
-    - Keep only rules that are still POSSIBLE given current facts.
-    - Choose an unanswered symptom that best distinguishes remaining rules.
-    Scoring:
-      score = (coverage_weight * how many remaining rules include this symptom)
-            + (balance_weight * how balanced expected True vs False is among remaining rules)
-      Tie-breaker: Symptom.priority_order (lower number = earlier)
-    """
-    facts = _facts_for_assessment(assessment.id)
-    answered_ids = set(facts.keys())
-
-    rules = (
-        Rule.query
-        .filter_by(is_active=True)
-        .order_by(Rule.priority.desc(), Rule.id.asc())
-        .all()
-    )
-    if not rules:
-        return None
-
-    possible_rules: List[Rule] = []
-    for r in rules:
+def possible_rules(kb: CompiledKB, facts: Dict[int, bool]) -> List[CompiledRule]:
+    """Rules no answer in ``facts`` contradicts (engine order)."""
+    remaining = []
+    for r in kb.rules:
         possible = True
         for c in r.conditions:
             sid = c.symptom_id
@@ -216,15 +290,24 @@ def next_question(assessment: Assessment) -> Optional[Symptom]:
                 possible = False
                 break
         if possible:
-            possible_rules.append(r)
+            remaining.append(r)
+    return remaining
 
-    if not possible_rules:
-        return None
+
+def ranked_questions(kb: CompiledKB, facts: Dict[int, bool],
+                     rules: Optional[List[CompiledRule]] = None) -> List[int]:
+    """
+    Unanswered symptoms of the still-possible rules, best first by the
+    ``select_question`` score (ties: active before inactive, then
+    Symptom.priority_order, then id). Empty when there is nothing left to ask.
+    """
+    answered_ids = set(facts.keys())
+    remaining = possible_rules(kb, facts) if rules is None else rules
 
     coverage = Counter()                 # symptom_id -> number of rules containing it
     expected_tf = defaultdict(Counter)   # symptom_id -> Counter({True: n, False: n})
 
-    for r in possible_rules:
+    for r in remaining:
         seen_in_rule = set()
         for c in r.conditions:
             sid = c.symptom_id
@@ -235,34 +318,80 @@ def next_question(assessment: Assessment) -> Optional[Symptom]:
             coverage[sid] += 1
             expected_tf[sid][bool(c.expected_value)] += 1
 
-    if not coverage:
-        return None
-
-    candidates: List[Tuple[float, int]] = []  # (score, symptom_id)
-
     coverage_weight = 10.0
     balance_weight = 4.0
 
-    for sid, cov in coverage.items():
+    def rank(sid):
         t = expected_tf[sid][True]
         f = expected_tf[sid][False]
         balance_score = min(t, f)
-        score = (coverage_weight * cov) + (balance_weight * balance_score)
-        candidates.append((score, sid))
-
-    candidates.sort(key=lambda x: (-x[0], x[1]))
-    top_score = candidates[0][0]
-    top_ids = [sid for (sc, sid) in candidates if sc == top_score]
-
-    symptom = (
-        Symptom.query
-        .filter(Symptom.id.in_(top_ids), Symptom.is_active.is_(True))
-        .order_by(Symptom.priority_order.asc(), Symptom.id.asc())
-        .first()
-    )
+        score = (coverage_weight * coverage[sid]) + (balance_weight * balance_score)
+        s = kb.symptoms.get(sid)
+        if s is not None and s.is_active:
+            return (-score, 0, s.priority_order, sid)
+        return (-score, 1, sid, sid)
+
+    return sorted(coverage, key=rank)
+
+
+def select_question(kb: CompiledKB, facts: Dict[int, bool]) -> Optional[CompiledSymptom]:
+    """
+    Smart question selection:
+    - Keep only rules that are still POSSIBLE given current facts.
+    - Choose an unanswered symptom that best distinguishes remaining rules.
+    Scoring:
+      score = (coverage_weight * how many remaining rules include this symptom)
+            + (balance_weight * how balanced expected True vs False is among remaining rules)
+      Tie-breaker: Symptom.priority_order (lower number = earlier)
+    """
+    ranked = ranked_questions(kb, facts)
+    if not ranked:
+        return None
+    return kb.symptoms.get(ranked[0])
+
+
+def lookahead(kb: CompiledKB, facts: Dict[int, bool], question: CompiledSymptom, depth: int,
+              max_nodes: int, payload: Callable[[CompiledSymptom], dict],
+              choose: Optional[Callable[[CompiledKB, Dict[int, bool]], Optional[CompiledSymptom]]] = None) -> dict:
+    """
+    What follows each answer to ``question``, ``depth`` answers deep:
+    {"yes": node, "no": node}, where a node is either the next question
+    (``payload(symptom)``, with its own "yes"/"no" while depth remains) or
+    {"result": {"diagnosis_code", "risk_level"}} where that branch finalizes.
+    Built breadth-first; once ``max_nodes`` nodes exist, remaining branches
+    are None. Pure: evaluated on ``facts`` in memory. ``choose`` picks the
+    next question (default ``select_question``).
+    """
+    choose = choose or select_question
+
+    def result(diagnosis_code, risk_level):
+        return {"result": {"diagnosis_code": diagnosis_code, "risk_level": risk_level}}
+
+    root = {}
+    budget = max_nodes
+    frontier = deque([(root, question.id, facts, depth)])
+    while frontier:
+        node, sid, node_facts, remaining = frontier.popleft()
+        for key, answer in (("yes", True), ("no", False)):
+            if budget <= 0:
+                node[key] = None
+                continue
+            budget -= 1
+            branch = {**node_facts, sid: answer}
+            decision = decide(kb, branch)
+            if decision is not None:
+                node[key] = result(decision[0].diagnosis_code, decision[0].risk_level)
+                continue
+            nxt = choose(kb, branch)
+            if nxt is None:
+                fallback = infer_diagnosis(branch, kb)
+                node[key] = result(fallback["diagnosis_code"], fallback["risk_level"])
+                continue
+            node[key] = payload(nxt)
+            if remaining > 1:
+                frontier.append((node[key], nxt.id, branch, remaining - 1))
+    return root
 
-    if not symptom:
-        best_id = candidates[0][1]
-        symptom = Symptom.query.get(best_id)
 
-    return symptom
+def next_question(assessment: Assessment) -> Optional[CompiledSymptom]:
+    return select_question(kb_for_assessment(assessment), _facts_for_assessment(assessment.id))
@@ -0,0 +1,211 @@
+"""
+Cross-worker cache invalidation.
+
+Writers call ``bump_cache_version(scope)`` inside their transaction. Once it
+commits, the change is applied locally right away and published on the
+optional push transport. Every worker also polls ``tbl_cache_versions`` at
+most once per CACHE_POLL_INTERVAL seconds (from ``before_request``), which is
+the durable path: a worker that misses a push message still notices the
+change within one interval, and no request pays for more than that one
+small query.
+
+    channel.on_change("rbac", permission_cache.clear)
+
+Transports (CACHE_INVALIDATION_TRANSPORT):
+  ""           polling only (default)
+  "local"      in-process broker - stands in for a real bus in tests/benchmarks
+  "redis://.." Redis pub/sub (needs the optional ``redis`` package)
+"""
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event, insert, update
+
+from app.extensions import db
+from app.models import CacheVersion
+
+KB_SCOPE = "kb"
+RBAC_SCOPE = "rbac"
+
+
+# ---------- transports ----------
+
+class LocalTransport:
+    """
+    In-process pub/sub. Several channels subscribed to the same instance behave
+    like workers sharing a message bus, which is all tests need.
+    """
+
+    def __init__(self):
+        self._subscribers: List[Callable[[str, int], None]] = []
+        self._lock = threading.Lock()
+        self.published = []
+
+    def publish(self, scope: str, version: int):
+        self.published.append((scope, version))
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(scope, version)
+
+    def subscribe(self, callback: Callable[[str, int], None]):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def close(self):
+        with self._lock:
+            self._subscribers.clear()
+
+
+class RedisTransport:
+    def __init__(self, url: str, channel_name: str = "cache-invalidation"):
+        import redis  # optional dependency
+
+        self.channel_name = channel_name
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = None
+        self._thread = None
+
+    def publish(self, scope: str, version: int):
+        self._client.publish(self.channel_name, json.dumps({"scope": scope, "version": version}))
+
+    def subscribe(self, callback: Callable[[str, int], None]):
+        def handler(message):
+            try:
+                data = json.loads(message["data"])
+                callback(data["scope"], int(data["version"]))
+            except (ValueError, KeyError, TypeError):
+                pass
+
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel_name: handler})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def close(self):
+        if self._thread is not None:
+            self._thread.stop()
+        if self._pubsub is not None:
+            self._pubsub.close()
+
+
+def make_transport(spec: Optional[str]):
+    if not spec:
+        return None
+    if spec == "local":
+        return LocalTransport()
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisTransport(spec)
+    raise ValueError(f"unknown CACHE_INVALIDATION_TRANSPORT {spec!r}")
+
+
+# ---------- channel ----------
+
+class InvalidationChannel:
+    def __init__(self, poll_interval: float = 2.0):
+        self.poll_interval = poll_interval
+        self.transport = None
+        self._versions: Dict[str, int] = {}
+        self._listeners: Dict[str, List[Callable[[], None]]] = defaultdict(list)
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+    def configure(self, poll_interval: float, transport=None):
+        if self.transport is not None:
+            self.transport.close()
+        self.poll_interval = poll_interval
+        self.transport = transport
+        self._next_poll = 0.0
+        if transport is not None:
+            transport.subscribe(self.apply)
+
+    def on_change(self, scope: str, callback: Callable[[], None]):
+        if callback not in self._listeners[scope]:
+            self._listeners[scope].append(callback)
+
+    def current(self, scope: str) -> Optional[int]:
+        """Last version seen for ``scope`` (None until the first poll/push)."""
+        return self._versions.get(scope)
+
+    def apply(self, scope: str, version: int):
+        """Record ``version`` for ``scope`` and fire its listeners if it is newer."""
+        with self._lock:
+            known = self._versions.get(scope)
+            if known is not None and version <= known:
+                return
+            self._versions[scope] = version
+        for callback in list(self._listeners.get(scope, ())):
+            callback()
+
+    def poll(self):
+        """One query for all scopes."""
+        self._next_poll = time.monotonic() + self.poll_interval
+        for scope, version in db.session.query(CacheVersion.scope, CacheVersion.version).all():
+            self.apply(scope, int(version))
+
+    def maybe_poll(self):
+        if time.monotonic() >= self._next_poll:
+            self.poll()
+
+    def reset(self):
+        with self._lock:
+            self._versions.clear()
+        self._next_poll = 0.0
+
+
+channel = InvalidationChannel()
+
+
+# ---------- writers ----------
+
+def bump_cache_version(scope: str, to_version: Optional[int] = None) -> int:
+    """
+    Advance ``scope`` inside the caller's transaction (by one, or to
+    ``to_version``). Local listeners and the push transport are notified
+    after the transaction commits; a rollback discards the bump.
+    """
+    if to_version is None:
+        values = {"version": CacheVersion.version + 1}
+    else:
+        values = {"version": to_version}
+    res = db.session.execute(
+        update(CacheVersion).where(CacheVersion.scope == scope).values(updated_at=db.func.now(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount == 0:
+        db.session.execute(insert(CacheVersion).values(scope=scope, version=to_version or 1))
+
+    version = int(db.session.query(CacheVersion.version).filter(CacheVersion.scope == scope).scalar())
+    db.session.info.setdefault("pending_invalidations", {})[scope] = version
+    return version
+
+
+def _after_commit(session):
+    pending = session.info.pop("pending_invalidations", None)
+    if not pending:
+        return
+    for scope, version in pending.items():
+        channel.apply(scope, version)
+        if channel.transport is not None:
+            channel.transport.publish(scope, version)
+
+
+def _after_rollback(session):
+    session.info.pop("pending_invalidations", None)
+
+
+event.listen(db.session, "after_commit", _after_commit)
+event.listen(db.session, "after_rollback", _after_rollback)
+
+
+def init_invalidation(app):
+    channel.configure(
+        poll_interval=app.config.get("CACHE_POLL_INTERVAL", 2.0),
+        transport=make_transport(app.config.get("CACHE_INVALIDATION_TRANSPORT")),
+    )
+
+    @app.before_request
+    def _poll_cache_versions():
+        channel.maybe_poll()
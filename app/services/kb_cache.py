@@ -0,0 +1,278 @@
+"""
+Compiled, immutable KB versions for the inference engine.
+
+Every KB version row carries a snapshot of what the engine needs (active rules
+with their conditions, symptoms, advice ids), written in the same transaction
+as the edit that created the version. An assessment records the version it
+started on and is evaluated against that snapshot until it completes, so KB
+edits never change a running session and never require flushing caches:
+versions are immutable, and the cache below is keyed by version id.
+"""
+import json
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from typing import Dict, Iterable, Optional, Tuple
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app.extensions import db
+from app.models import Advice, Assessment, KbVersion, Rule, RuleCondition, Symptom
+from app.services.invalidation import KB_SCOPE, channel
+from app.utils.sharding import scalars_all_shards
+
+CompiledCondition = namedtuple("CompiledCondition", "symptom_id expected_value")
+CompiledRule = namedtuple("CompiledRule", "id name diagnosis_code risk_level priority conditions")
+CompiledSymptom = namedtuple(
+    "CompiledSymptom", "id code question_text category is_active priority_order bit", defaults=(None,)
+)
+
+
+class CompiledKB:
+    """
+    Read-only view of one KB version. Rules/conditions/symptoms expose the same
+    attribute names as the ORM models so engine helpers accept either.
+    """
+
+    __slots__ = ("version_id", "rules", "symptoms", "advice_ids", "bit_of", "symptom_at", "advice_texts")
+
+    def __init__(self, version_id: Optional[int], rules: Iterable[CompiledRule],
+                 symptoms: Dict[int, CompiledSymptom], advice_ids: Dict[Tuple[str, str], int]):
+        self.version_id = version_id
+        # engine order: priority desc, id asc
+        self.rules = tuple(sorted(rules, key=lambda r: (-r.priority, r.id)))
+        self.symptoms = symptoms
+        self.advice_ids = advice_ids
+        # fact mask positions (snapshots taken before bit indexes existed have none)
+        self.bit_of = {sid: s.bit for sid, s in symptoms.items() if s.bit is not None}
+        self.symptom_at = {bit: sid for sid, bit in self.bit_of.items()}
+        # advice id -> {"title", "content", "severity"}, filled by advice_for
+        self.advice_texts: Dict[int, Optional[dict]] = {}
+
+    def advice_id_for(self, diagnosis_code: str, risk_level: str) -> Optional[int]:
+        return self.advice_ids.get((diagnosis_code, risk_level))
+
+    # ---- (de)serialization of the snapshot column ----
+
+    def to_payload(self) -> dict:
+        return {
+            "symptoms": [list(s) for s in self.symptoms.values()],
+            "rules": [
+                [r.id, r.name, r.diagnosis_code, r.risk_level, r.priority,
+                 [[c.symptom_id, c.expected_value] for c in r.conditions]]
+                for r in self.rules
+            ],
+            "advices": [[d, r, aid] for (d, r), aid in self.advice_ids.items()],
+        }
+
+    @classmethod
+    def from_payload(cls, version_id: Optional[int], payload: dict) -> "CompiledKB":
+        symptoms = {s[0]: CompiledSymptom(*s) for s in payload["symptoms"]}
+        rules = [
+            CompiledRule(rid, name, diag, risk, prio, tuple(CompiledCondition(sid, bool(exp)) for sid, exp in conds))
+            for rid, name, diag, risk, prio, conds in payload["rules"]
+        ]
+        advice_ids = {(d, r): aid for d, r, aid in payload["advices"]}
+        return cls(version_id, rules, symptoms, advice_ids)
+
+    def encode(self) -> bytes:
+        return zlib.compress(json.dumps(self.to_payload(), separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def decode(cls, version_id: int, blob: bytes) -> "CompiledKB":
+        return cls.from_payload(version_id, json.loads(zlib.decompress(blob)))
+
+
+def compile_live_kb(version_id: Optional[int] = None) -> CompiledKB:
+    """Compile the KB as currently visible to this session (three queries)."""
+    conditions: Dict[int, list] = {}
+    for rule_id, sid, expected in (
+        db.session.query(RuleCondition.rule_id, RuleCondition.symptom_id, RuleCondition.expected_value)
+        .join(Rule, Rule.id == RuleCondition.rule_id)
+        .filter(Rule.is_active.is_(True))
+        .order_by(RuleCondition.rule_id.asc(), RuleCondition.id.asc())
+    ):
+        conditions.setdefault(rule_id, []).append(CompiledCondition(sid, bool(expected)))
+
+    rules = [
+        CompiledRule(r.id, r.name, r.diagnosis_code, r.risk_level, r.priority, tuple(conditions.get(r.id, ())))
+        for r in db.session.query(
+            Rule.id, Rule.name, Rule.diagnosis_code, Rule.risk_level, Rule.priority
+        ).filter(Rule.is_active.is_(True))
+    ]
+
+    symptoms = {
+        s.id: CompiledSymptom(
+            s.id, s.code, s.question_text, s.category, bool(s.is_active), s.priority_order, s.bit_index
+        )
+        for s in db.session.query(
+            Symptom.id, Symptom.code, Symptom.question_text, Symptom.category,
+            Symptom.is_active, Symptom.priority_order, Symptom.bit_index,
+        )
+    }
+
+    advice_ids = {}
+    for aid, diag, risk in (
+        db.session.query(Advice.id, Advice.diagnosis_code, Advice.risk_level)
+        .filter(Advice.is_active.is_(True))
+        .order_by(Advice.id.asc())
+    ):
+        advice_ids.setdefault((diag, risk), aid)
+
+    return CompiledKB(version_id, rules, symptoms, advice_ids)
+
+
+class KbVersionCache:
+    """
+    Bounded LRU of compiled KB versions.
+
+    When over capacity, versions that no IN_PROGRESS assessment references
+    (and that are not the newest loaded) are evicted first; if that is not
+    enough the least recently used go as well - they can always be reloaded
+    from their snapshot row.
+    """
+
+    def __init__(self, max_versions: int = 4):
+        self.max_versions = max_versions
+        self._items: "OrderedDict[int, CompiledKB]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, version_id: int) -> bool:
+        return version_id in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def resident_versions(self):
+        return list(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def get(self, version_id: int) -> CompiledKB:
+        with self._lock:
+            kb = self._items.get(version_id)
+            if kb is not None:
+                self._items.move_to_end(version_id)
+                return kb
+
+        kb = self._load(version_id)
+        with self._lock:
+            self._items[version_id] = kb
+            self._items.move_to_end(version_id)
+            if len(self._items) > self.max_versions:
+                self._evict()
+        return kb
+
+    def put(self, kb: CompiledKB):
+        with self._lock:
+            self._items[kb.version_id] = kb
+            if len(self._items) > self.max_versions:
+                self._evict()
+
+    def _load(self, version_id: int) -> CompiledKB:
+        blob = db.session.query(KbVersion.snapshot).filter(KbVersion.id == version_id).scalar()
+        if blob is None:
+            raise LookupError(f"KB version {version_id} has no snapshot")
+        return CompiledKB.decode(version_id, blob)
+
+    def _evict(self):
+        newest = max(self._items)
+        in_use = set(scalars_all_shards(
+            sa.select(Assessment.kb_version_id)
+            .where(Assessment.status == "IN_PROGRESS", Assessment.kb_version_id.in_(list(self._items)))
+            .distinct()
+        ))
+        for vid in list(self._items):
+            if len(self._items) <= self.max_versions:
+                return
+            if vid != newest and vid not in in_use:
+                del self._items[vid]
+        while len(self._items) > self.max_versions:
+            self._items.popitem(last=False)
+
+
+kb_cache = KbVersionCache()
+
+
+def init_kb_cache(app):
+    kb_cache.max_versions = app.config.get("KB_CACHE_MAX_VERSIONS", 4)
+
+
+def assign_bit_indexes() -> int:
+    """Give symptoms created since the last version the next free fact-mask positions."""
+    missing = db.session.query(Symptom.id).filter(Symptom.bit_index.is_(None)).order_by(Symptom.id.asc()).all()
+    if not missing:
+        return 0
+    start = (db.session.query(sa.func.max(Symptom.bit_index)).scalar() or -1) + 1
+    db.session.execute(
+        sa.update(Symptom),
+        [{"id": sid, "bit_index": start + i} for i, (sid,) in enumerate(missing)],
+    )
+    return len(missing)
+
+
+def snapshot_kb_version(version: KbVersion) -> CompiledKB:
+    """Freeze the KB as visible in the current transaction into ``version``."""
+    assign_bit_indexes()
+    kb = compile_live_kb(version.id)
+    version.snapshot = kb.encode()
+    return kb
+
+
+def pin_current_kb_version(create: bool = True) -> Optional[int]:
+    """
+    Id of the newest KB version, for a new assessment to record. Creates the
+    first version / its snapshot when the database predates KB versioning;
+    with ``create=False`` returns None instead, so read-only callers never
+    write.
+
+    No query when the invalidation channel already knows the newest version
+    and it is resident (a resident version always has a snapshot).
+    """
+    known = channel.current(KB_SCOPE)
+    if known is not None and known in kb_cache:
+        return known
+
+    v = KbVersion.query.order_by(KbVersion.id.desc()).first()
+    if not create and (v is None or v.snapshot is None):
+        return None
+    if v is None:
+        v = KbVersion(note="INITIAL")
+        db.session.add(v)
+        db.session.flush()
+    if v.snapshot is None:
+        snapshot_kb_version(v)
+    return v.id
+
+
+def advice_for(kb: CompiledKB, diagnosis_code: str, risk_level: str) -> Optional[dict]:
+    """
+    Title, content and severity of the advice ``kb`` maps an outcome to, read
+    once per KB version and kept on ``kb``; advice edits create a new version,
+    which reads the new text.
+    """
+    advice_id = kb.advice_id_for(diagnosis_code, risk_level)
+    if advice_id is None:
+        return None
+    if advice_id not in kb.advice_texts:
+        row = db.session.query(Advice.title, Advice.content, Advice.severity).filter(Advice.id == advice_id).first()
+        kb.advice_texts[advice_id] = (
+            {"title": row.title, "content": row.content, "severity": row.severity} if row else None
+        )
+    return kb.advice_texts[advice_id]
+
+
+def kb_for_assessment(assessment: Assessment) -> CompiledKB:
+    """The compiled KB an assessment runs against (its pinned version, else the newest)."""
+    if assessment.kb_version_id is None:
+        # started before KB versioning: pin it now so it stays stable from here on
+        assessment.kb_version_id = pin_current_kb_version()
+    version_id = assessment.kb_version_id
+    try:
+        return kb_cache.get(version_id)
+    except LookupError:
+        current_app.logger.warning("KB version %s has no snapshot; using newest", version_id)
+        return kb_cache.get(pin_current_kb_version())
@@ -0,0 +1,429 @@
+"""
+Transactional KB editing.
+
+Everything in here only stages changes on ``db.session`` (plus one KB version
+bump); the caller commits once or rolls back on ``KbEditError``. Writes are
+issued as executemany/IN statements instead of one ORM round trip per row.
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, select, update
+
+from app.extensions import db
+from app.models import Advice, AssessmentAnswer, Rule, RuleCondition, Symptom
+from app.services.kb_version_service import bump_kb_version
+from app.services.session_store import session_store
+from app.utils.sharding import scalars_all_shards
+
+
+class KbEditError(Exception):
+    def __init__(self, message: str, status: int = 400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+    def to_response(self):
+        return {"message": self.message, **self.extra}, self.status
+
+
+# ---------- field normalization (same rules as the single-item routes) ----------
+
+def _text(data: dict, key: str, upper: bool = False) -> str:
+    value = (data.get(key) or "").strip()
+    return value.upper() if upper else value
+
+
+def _symptom_fields(data: dict, partial: bool) -> dict:
+    out = {}
+    if not partial or "code" in data:
+        out["code"] = _text(data, "code")
+        if not out["code"]:
+            raise KbEditError("symptom code is required")
+    if not partial or "question_text" in data:
+        out["question_text"] = _text(data, "question_text")
+        if not out["question_text"]:
+            raise KbEditError("symptom question_text is required")
+    if not partial or "category" in data:
+        out["category"] = _text(data, "category") or None
+    if not partial or "priority_order" in data:
+        out["priority_order"] = int(data.get("priority_order") or 0)
+    if not partial or "is_active" in data:
+        out["is_active"] = bool(data.get("is_active", True))
+    for key in ("info_yes", "info_no"):
+        if key in data:
+            out[key] = _text(data, key) or None
+    return out
+
+
+def _rule_fields(data: dict, partial: bool) -> dict:
+    out = {}
+    for key, upper in (("name", False), ("diagnosis_code", True), ("risk_level", True)):
+        if not partial or key in data:
+            out[key] = _text(data, key, upper=upper)
+            if not out[key]:
+                raise KbEditError(f"rule {key} is required")
+    if not partial or "priority" in data:
+        out["priority"] = int(data.get("priority") or 0)
+    if not partial or "is_active" in data:
+        out["is_active"] = bool(data.get("is_active", True))
+    return out
+
+
+def _advice_fields(data: dict, partial: bool) -> dict:
+    out = {}
+    for key, upper in (("diagnosis_code", True), ("risk_level", True), ("title", False), ("content", False)):
+        if not partial or key in data:
+            out[key] = _text(data, key, upper=upper)
+            if not out[key]:
+                raise KbEditError(f"advice {key} is required")
+    if not partial or "severity" in data:
+        out["severity"] = (data.get("severity") or "INFO").strip().upper()
+    if not partial or "is_active" in data:
+        out["is_active"] = bool(data.get("is_active", True))
+    return out
+
+
+def _ids(items, label: str) -> List[int]:
+    try:
+        return [int(x) for x in (items or [])]
+    except (TypeError, ValueError):
+        raise KbEditError(f"{label} must be a list of ids")
+
+
+def _entries(section: dict, name: str, key: str) -> List[dict]:
+    items = section.get(key) or []
+    for i, d in enumerate(items):
+        if not isinstance(d, dict):
+            raise KbEditError(f"{name}.{key}[{i}] must be an object")
+    return items
+
+
+def bulk_update(model, rows: List[dict]):
+    """ORM bulk UPDATE by primary key; executemany needs a uniform key set per statement."""
+    by_keys = defaultdict(list)
+    for row in rows:
+        by_keys[tuple(sorted(row))].append(row)
+    for group in by_keys.values():
+        db.session.execute(update(model), group)
+
+
+# ---------- rule conditions ----------
+
+def normalize_conditions(conditions, symptom_ids_by_code: Optional[Dict[str, int]] = None) -> Dict[int, dict]:
+    """
+    Validate a desired condition list and key it by symptom_id.
+    A condition may name its symptom by ``symptom_code`` instead of id.
+    """
+    if not isinstance(conditions, list) or len(conditions) == 0:
+        raise KbEditError("conditions must be a non-empty list")
+
+    desired: Dict[int, dict] = {}
+    codes = symptom_ids_by_code or {}
+    for c in conditions:
+        if not isinstance(c, dict):
+            raise KbEditError("each condition must be an object")
+        sid = c.get("symptom_id")
+        if sid is None and c.get("symptom_code"):
+            sid = codes.get(c["symptom_code"])
+            if sid is None:
+                raise KbEditError(f"unknown symptom_code '{c['symptom_code']}'")
+        if sid is None:
+            raise KbEditError("each condition requires symptom_id")
+        try:
+            sid = int(sid)
+        except (TypeError, ValueError):
+            raise KbEditError("symptom_id must be int")
+        if sid in desired:
+            raise KbEditError(f"duplicate symptom_id {sid} in conditions")
+
+        text = c.get("explanation_text", c.get("reason_text"))  # reason_text: older clients
+        desired[sid] = {
+            "symptom_id": sid,
+            "expected_value": bool(c.get("expected_value", True)),
+            "explanation_text": (text or "").strip() or None,
+        }
+
+    exists = Symptom.query.with_entities(Symptom.id).filter(
+        Symptom.id.in_(list(desired)), Symptom.is_active.is_(True)
+    ).count()
+    if exists != len(desired):
+        raise KbEditError("one or more symptom_id invalid/inactive")
+    return desired
+
+
+def stage_condition_diff(rule_ids: List[int], desired_by_rule: Dict[int, Dict[int, dict]]) -> dict:
+    """
+    Diff desired conditions against the stored ones for several rules at once and
+    emit at most one INSERT (executemany), one UPDATE (executemany) and one DELETE.
+    """
+    existing = defaultdict(dict)
+    if rule_ids:
+        for rc in RuleCondition.query.filter(RuleCondition.rule_id.in_(rule_ids)).all():
+            existing[rc.rule_id][rc.symptom_id] = rc
+
+    to_insert, to_update, to_delete = [], [], []
+    for rule_id in rule_ids:
+        current = existing.get(rule_id, {})
+        desired = desired_by_rule[rule_id]
+
+        for sid, row in desired.items():
+            rc = current.get(sid)
+            if rc is None:
+                to_insert.append({"rule_id": rule_id, **row})
+                continue
+            changes = {k: v for k, v in row.items() if k != "symptom_id" and getattr(rc, k) != v}
+            if changes:
+                to_update.append({"id": rc.id, **changes})
+
+        to_delete.extend(rc.id for sid, rc in current.items() if sid not in desired)
+
+    if to_delete:
+        db.session.execute(delete(RuleCondition).where(RuleCondition.id.in_(to_delete)))
+    if to_update:
+        bulk_update(RuleCondition, to_update)
+    if to_insert:
+        db.session.execute(insert(RuleCondition), to_insert)
+
+    # relationship collections loaded earlier in this session are now stale
+    for rule_id in rule_ids:
+        rule = db.session.identity_map.get(db.session.identity_key(Rule, rule_id))
+        if rule is not None:
+            db.session.expire(rule, ["conditions"])
+
+    return {"inserted": len(to_insert), "updated": len(to_update), "deleted": len(to_delete)}
+
+
+def apply_rule_conditions(rule: Rule, conditions, actor_user_id: Optional[int] = None) -> dict:
+    """
+    Make ``rule``'s conditions equal to ``conditions`` touching only what changed.
+    Bumps the KB version once, and only if something changed. Does not commit.
+    """
+    desired = normalize_conditions(conditions)
+    counts = stage_condition_diff([rule.id], {rule.id: desired})
+    counts["kb_version"] = None
+    if any(counts[k] for k in ("inserted", "updated", "deleted")):
+        counts["kb_version"] = bump_kb_version(actor_user_id, "UPDATE_RULE_CONDITIONS").id
+    return counts
+
+
+# ---------- bulk edit ----------
+
+def _section(payload: dict, name: str) -> dict:
+    section = payload.get(name) or {}
+    if not isinstance(section, dict):
+        raise KbEditError(f"{name} must be an object with create/update/delete")
+    for key in ("create", "update", "delete"):
+        if not isinstance(section.get(key) or [], list):
+            raise KbEditError(f"{name}.{key} must be a list")
+    return section
+
+
+def required_permissions(payload: dict) -> set:
+    """KB_CREATE / KB_UPDATE / KB_DELETE, depending on which operations the payload contains."""
+    perms = set()
+    for name in ("symptoms", "rules", "advices"):
+        section = payload.get(name) or {}
+        if not isinstance(section, dict):
+            continue
+        if section.get("create"):
+            perms.add("KB_CREATE")
+        if section.get("update"):
+            perms.add("KB_UPDATE")
+        if section.get("delete"):
+            perms.add("KB_DELETE")
+    return perms
+
+
+def _check_ids_exist(model, ids: List[int], label: str):
+    if not ids:
+        return
+    found = {i for (i,) in db.session.query(model.id).filter(model.id.in_(ids)).all()}
+    missing = sorted(set(ids) - found)
+    if missing:
+        raise KbEditError(f"{label} not found", status=404, missing_ids=missing)
+
+
+def apply_bulk_edit(payload: dict, actor_user_id: Optional[int] = None) -> dict:
+    """
+    Apply create/update/delete operations for symptoms, rules (with conditions)
+    and advices in one transaction. Order: symptoms, rules, advices; deletes last
+    so references can be moved away first. Does not commit.
+
+    Rule conditions may reference a symptom created in the same payload via
+    ``symptom_code``.
+    """
+    if not isinstance(payload, dict):
+        raise KbEditError("body must be an object")
+
+    sym = _section(payload, "symptoms")
+    rul = _section(payload, "rules")
+    adv = _section(payload, "advices")
+    entries = {
+        (name, key): _entries(section, name, key)
+        for name, section in (("symptoms", sym), ("rules", rul), ("advices", adv))
+        for key in ("create", "update")
+    }
+    summary = {}
+
+    # ---- symptoms ----
+    sym_create = [_symptom_fields(d, partial=False) for d in entries["symptoms", "create"]]
+    sym_update = []
+    for d in entries["symptoms", "update"]:
+        if d.get("id") is None:
+            raise KbEditError("symptoms.update entries require id")
+        sym_update.append({"id": int(d["id"]), **_symptom_fields(d, partial=True)})
+    sym_delete = _ids(sym.get("delete"), "symptoms.delete")
+
+    new_codes = [s["code"] for s in sym_create]
+    renamed = {s["id"]: s["code"] for s in sym_update if "code" in s}
+    payload_codes = new_codes + list(renamed.values())
+    if len(set(payload_codes)) != len(payload_codes):
+        raise KbEditError("duplicate symptom code in symptoms.create/update")
+    if payload_codes:
+        # a row keeping its own code is not a clash
+        taken = sorted(
+            code for sid, code in db.session.query(Symptom.id, Symptom.code).filter(Symptom.code.in_(payload_codes))
+            if renamed.get(sid) != code
+        )
+        if taken:
+            raise KbEditError("symptom code already exists", status=409, codes=taken)
+    _check_ids_exist(Symptom, [s["id"] for s in sym_update] + sym_delete, "symptoms")
+
+    if sym_create:
+        db.session.execute(insert(Symptom), sym_create)
+    if sym_update:
+        bulk_update(Symptom, sym_update)
+
+    summary["symptoms"] = {"created": len(sym_create), "updated": len(sym_update), "deleted": len(sym_delete)}
+
+    code_to_id = {}
+    if new_codes:
+        code_to_id = dict(db.session.query(Symptom.code, Symptom.id).filter(Symptom.code.in_(new_codes)).all())
+    cond_codes = {
+        c.get("symptom_code")
+        for d in entries["rules", "create"] + entries["rules", "update"] if isinstance(d.get("conditions"), list)
+        for c in d["conditions"] if isinstance(c, dict) and c.get("symptom_code")
+    } - set(code_to_id)
+    if cond_codes:
+        code_to_id.update(db.session.query(Symptom.code, Symptom.id).filter(Symptom.code.in_(cond_codes)).all())
+
+    # ---- rules ----
+    new_rules = []
+    for i, d in enumerate(entries["rules", "create"]):
+        fields = _rule_fields(d, partial=False)
+        if "conditions" not in d and fields["is_active"]:
+            # an active rule without conditions would match every assessment
+            raise KbEditError(f"rules.create[{i}] is active and needs a non-empty conditions list")
+        desired = normalize_conditions(d.get("conditions"), code_to_id) if "conditions" in d else {}
+        new_rules.append((Rule(**fields), desired))
+    if new_rules:
+        db.session.add_all([r for r, _ in new_rules])
+        db.session.flush()  # one batched INSERT; ids are needed for conditions
+
+    rule_update, cond_targets = [], {}
+    for d in entries["rules", "update"]:
+        if d.get("id") is None:
+            raise KbEditError("rules.update entries require id")
+        rid = int(d["id"])
+        fields = _rule_fields(d, partial=True)
+        if fields:
+            rule_update.append({"id": rid, **fields})
+        if "conditions" in d:
+            cond_targets[rid] = normalize_conditions(d.get("conditions"), code_to_id)
+    rule_delete = _ids(rul.get("delete"), "rules.delete")
+    _check_ids_exist(Rule, [r["id"] for r in rule_update] + list(cond_targets) + rule_delete, "rules")
+
+    if rule_update:
+        bulk_update(Rule, rule_update)
+    for r, desired in new_rules:
+        cond_targets[r.id] = desired
+    cond_counts = stage_condition_diff(list(cond_targets), cond_targets) if cond_targets else {}
+
+    summary["rules"] = {
+        "created": len(new_rules),
+        "created_ids": [r.id for r, _ in new_rules],
+        "updated": len(rule_update),
+        "deleted": len(rule_delete),
+        "conditions": cond_counts,
+    }
+
+    # ---- advices ----
+    adv_create = [_advice_fields(d, partial=False) for d in entries["advices", "create"]]
+    adv_update = []
+    for d in entries["advices", "update"]:
+        if d.get("id") is None:
+            raise KbEditError("advices.update entries require id")
+        adv_update.append({"id": int(d["id"]), **_advice_fields(d, partial=True)})
+    adv_delete = _ids(adv.get("delete"), "advices.delete")
+    _check_ids_exist(Advice, [a["id"] for a in adv_update] + adv_delete, "advices")
+
+    if adv_create:
+        db.session.execute(insert(Advice), adv_create)
+    if adv_update:
+        bulk_update(Advice, adv_update)
+
+    summary["advices"] = {"created": len(adv_create), "updated": len(adv_update), "deleted": len(adv_delete)}
+
+    # ---- deletes (conditions first, FK cascades are not relied on) ----
+    if rule_delete:
+        db.session.execute(delete(RuleCondition).where(RuleCondition.rule_id.in_(rule_delete)))
+        db.session.execute(delete(Rule).where(Rule.id.in_(rule_delete)))
+    if sym_delete:
+        session_store.flush()
+        answered = set(scalars_all_shards(
+            select(AssessmentAnswer.symptom_id).where(AssessmentAnswer.symptom_id.in_(sym_delete)).distinct()
+        ))
+        if answered:
+            raise KbEditError(
+                "symptoms with recorded answers cannot be deleted; deactivate them instead",
+                status=409,
+                symptom_ids=sorted(answered),
+            )
+        # an active rule left with no conditions would match every assessment; condition
+        # replacements, deactivations and rule deletes of this payload are already applied
+        emptied = sorted(
+            rid for (rid,) in db.session.query(Rule.id)
+            .join(RuleCondition, RuleCondition.rule_id == Rule.id)
+            .filter(Rule.is_active.is_(True))
+            .group_by(Rule.id)
+            .having(db.func.count(RuleCondition.id) == db.func.count(
+                db.case((RuleCondition.symptom_id.in_(sym_delete), 1))
+            ))
+        )
+        if emptied:
+            raise KbEditError(
+                "deleting these symptoms would leave active rules without conditions; "
+                "edit, deactivate or delete those rules in the same request",
+                status=409,
+                rule_ids=emptied,
+            )
+        db.session.execute(delete(RuleCondition).where(RuleCondition.symptom_id.in_(sym_delete)))
+        db.session.execute(delete(Symptom).where(Symptom.id.in_(sym_delete)))
+    if adv_delete:
+        db.session.execute(delete(Advice).where(Advice.id.in_(adv_delete)))
+
+    # only the active (diagnosis_code, risk_level) uniqueness the advice routes enforce
+    if adv_create or adv_update:
+        dup = (
+            db.session.query(Advice.diagnosis_code, Advice.risk_level)
+            .filter(Advice.is_active.is_(True))
+            .group_by(Advice.diagnosis_code, Advice.risk_level)
+            .having(db.func.count(Advice.id) > 1)
+            .first()
+        )
+        if dup:
+            raise KbEditError(
+                "more than one active advice for this diagnosis_code + risk_level",
+                status=409,
+                diagnosis_code=dup[0],
+                risk_level=dup[1],
+            )
+
+    changed = any(
+        v for section in summary.values() for k, v in section.items()
+        if k in ("created", "updated", "deleted")
+    ) or any(cond_counts.values())
+    summary["kb_version"] = bump_kb_version(actor_user_id, "BULK_EDIT").id if changed else None
+    return summary
@@ -0,0 +1,321 @@
+"""
+Versioned KB snapshots: a compact JSON document holding every symptom, rule
+(with conditions) and advice, keyed by natural keys so it can be moved
+between databases whose ids differ.
+
+    {
+      "format": "kb-snapshot", "format_version": 1,
+      "kb_version": 12, "exported_at": "2026-01-05T10:00:00",
+      "symptoms": [{"code": "polyuria", "question_text": "...", ...}],
+      "rules":    [{"name": "...", ..., "conditions": [["polyuria", true], ["fatigue", false, "why"]]}],
+      "advices":  [{"diagnosis_code": "...", "risk_level": "...", "title": "...", ...}]
+    }
+
+Natural keys: symptom ``code``, rule ``name``, advice (diagnosis_code, risk_level, title).
+A ``.gz`` path is read/written gzip-compressed.
+"""
+import gzip
+import json
+import sys
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import delete, insert, select
+
+from app.extensions import db
+from app.models import Advice, AssessmentAnswer, Rule, RuleCondition, Symptom
+from app.services.kb_editor import KbEditError, bulk_update, stage_condition_diff
+from app.services.kb_version_service import bump_kb_version, current_kb_version_id
+from app.services.session_store import session_store
+from app.utils.sharding import scalars_all_shards
+
+FORMAT = "kb-snapshot"
+FORMAT_VERSION = 1
+
+SYMPTOM_FIELDS = ("question_text", "category", "is_active", "priority_order", "info_yes", "info_no")
+RULE_FIELDS = ("diagnosis_code", "risk_level", "priority", "is_active")
+ADVICE_FIELDS = ("content", "severity", "is_active")
+
+
+def _advice_key(d) -> tuple:
+    if isinstance(d, dict):
+        return d["diagnosis_code"], d["risk_level"], d["title"]
+    return d.diagnosis_code, d.risk_level, d.title
+
+
+# ---------- export ----------
+
+def export_snapshot() -> dict:
+    """Read the whole KB with four queries (no per-rule condition loads)."""
+    symptoms = Symptom.query.order_by(Symptom.id.asc()).all()
+    code_by_id = {s.id: s.code for s in symptoms}
+
+    conditions: Dict[int, list] = {}
+    for rule_id, sid, expected, text in (
+        db.session.query(
+            RuleCondition.rule_id, RuleCondition.symptom_id,
+            RuleCondition.expected_value, RuleCondition.explanation_text,
+        ).order_by(RuleCondition.rule_id.asc(), RuleCondition.id.asc())
+    ):
+        cond = [code_by_id[sid], bool(expected)]
+        if text:
+            cond.append(text)
+        conditions.setdefault(rule_id, []).append(cond)
+
+    rules = Rule.query.order_by(Rule.priority.desc(), Rule.id.asc()).all()
+    advices = Advice.query.order_by(Advice.diagnosis_code.asc(), Advice.risk_level.asc(), Advice.id.asc()).all()
+
+    return {
+        "format": FORMAT,
+        "format_version": FORMAT_VERSION,
+        "kb_version": current_kb_version_id(),
+        "exported_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "symptoms": [
+            {"code": s.code, **{f: getattr(s, f) for f in SYMPTOM_FIELDS}} for s in symptoms
+        ],
+        "rules": [
+            {"name": r.name, **{f: getattr(r, f) for f in RULE_FIELDS}, "conditions": conditions.get(r.id, [])}
+            for r in rules
+        ],
+        "advices": [
+            {"diagnosis_code": a.diagnosis_code, "risk_level": a.risk_level, "title": a.title,
+             **{f: getattr(a, f) for f in ADVICE_FIELDS}}
+            for a in advices
+        ],
+    }
+
+
+def dump_snapshot(snapshot: dict, path: str):
+    data = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if path == "-":
+        sys.stdout.write(data.decode("utf-8") + "\n")
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wb") as fh:
+        fh.write(data)
+
+
+def load_snapshot(path: str) -> dict:
+    if path == "-":
+        return json.load(sys.stdin)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as fh:
+        return json.loads(fh.read())
+
+
+# ---------- import ----------
+
+def _validate(snapshot: dict):
+    if not isinstance(snapshot, dict) or snapshot.get("format") != FORMAT:
+        raise KbEditError("not a kb-snapshot document")
+    if snapshot.get("format_version") != FORMAT_VERSION:
+        raise KbEditError(f"unsupported snapshot format_version {snapshot.get('format_version')!r}")
+
+    seen = set()
+    for s in snapshot.get("symptoms") or []:
+        if not s.get("code") or not s.get("question_text"):
+            raise KbEditError("each symptom needs code and question_text")
+        if s["code"] in seen:
+            raise KbEditError(f"duplicate symptom code '{s['code']}' in snapshot")
+        seen.add(s["code"])
+
+    names = set()
+    for r in snapshot.get("rules") or []:
+        if not r.get("name") or not r.get("diagnosis_code") or not r.get("risk_level"):
+            raise KbEditError("each rule needs name, diagnosis_code, risk_level")
+        if r["name"] in names:
+            raise KbEditError(f"duplicate rule name '{r['name']}' in snapshot")
+        names.add(r["name"])
+        conditions = r.get("conditions") or []
+        if not isinstance(conditions, list):
+            raise KbEditError(f"rule '{r['name']}': conditions must be a list")
+        for cond in conditions:
+            if (
+                not isinstance(cond, (list, tuple)) or len(cond) not in (2, 3)
+                or not isinstance(cond[0], str) or not cond[0]
+                or not isinstance(cond[1], bool)
+                or (len(cond) == 3 and cond[2] is not None and not isinstance(cond[2], str))
+            ):
+                raise KbEditError(
+                    f"rule '{r['name']}': each condition must be [symptom_code, true|false] or "
+                    f"[symptom_code, true|false, text], got {cond!r}"
+                )
+
+    keys = set()
+    for a in snapshot.get("advices") or []:
+        key = _advice_key(a)
+        if key in keys:
+            raise KbEditError(f"duplicate advice {key} in snapshot")
+        keys.add(key)
+
+
+def _changes(obj, row: dict, fields) -> dict:
+    return {f: row[f] for f in fields if f in row and getattr(obj, f) != row[f]}
+
+
+def import_snapshot(
+    snapshot: dict,
+    prune: bool = False,
+    update_existing: bool = True,
+    actor_user_id: Optional[int] = None,
+) -> dict:
+    """
+    Diff ``snapshot`` against the database by natural key and stage the
+    difference as bulk statements on the current session (caller commits).
+
+    - update_existing=False only inserts what is missing (seeding semantics).
+    - prune=True deletes rules/advices absent from the snapshot; absent symptoms
+      are deleted, or deactivated when answers still reference them.
+    One KB version bump if anything changed.
+    """
+    _validate(snapshot)
+    summary = {}
+
+    # ---- symptoms ----
+    existing_sym = {s.code: s for s in Symptom.query.all()}
+    sym_insert, sym_update = [], []
+    for row in snapshot.get("symptoms") or []:
+        s = existing_sym.get(row["code"])
+        if s is None:
+            sym_insert.append({"code": row["code"], **{f: row[f] for f in SYMPTOM_FIELDS if f in row}})
+        elif update_existing:
+            changes = _changes(s, row, SYMPTOM_FIELDS)
+            if changes:
+                sym_update.append({"id": s.id, **changes})
+    if sym_insert:
+        db.session.execute(insert(Symptom), sym_insert)
+    if sym_update:
+        bulk_update(Symptom, sym_update)
+    code_to_id = dict(db.session.query(Symptom.code, Symptom.id).all())
+
+    # ---- rules ----
+    existing_rules: Dict[str, Rule] = {}
+    for r in Rule.query.order_by(Rule.id.asc()).all():
+        existing_rules.setdefault(r.name, r)  # names are not unique in the schema: first one wins
+
+    rule_insert, rule_update = [], []
+    for row in snapshot.get("rules") or []:
+        r = existing_rules.get(row["name"])
+        if r is None:
+            rule_insert.append({"name": row["name"], **{f: row[f] for f in RULE_FIELDS if f in row}})
+        elif update_existing:
+            changes = _changes(r, row, RULE_FIELDS)
+            if changes:
+                rule_update.append({"id": r.id, **changes})
+    if rule_insert:
+        db.session.execute(insert(Rule), rule_insert)
+    if rule_update:
+        bulk_update(Rule, rule_update)
+
+    new_names = {r["name"] for r in rule_insert}
+    name_to_id = {name: r.id for name, r in existing_rules.items()}
+    if new_names:
+        name_to_id.update(
+            db.session.query(Rule.name, db.func.min(Rule.id))
+            .filter(Rule.name.in_(new_names))
+            .group_by(Rule.name)
+            .all()
+        )
+
+    desired_by_rule = {}
+    for row in snapshot.get("rules") or []:
+        if not update_existing and row["name"] not in new_names:
+            continue
+        desired = {}
+        for cond in row.get("conditions") or []:
+            sid = code_to_id.get(cond[0])
+            if sid is None:
+                raise KbEditError(f"rule '{row['name']}' references unknown symptom '{cond[0]}'")
+            desired[sid] = {
+                "symptom_id": sid,
+                "expected_value": bool(cond[1]),
+                "explanation_text": cond[2] if len(cond) > 2 else None,
+            }
+        desired_by_rule[name_to_id[row["name"]]] = desired
+    cond_counts = stage_condition_diff(list(desired_by_rule), desired_by_rule) if desired_by_rule else {}
+
+    # ---- advices ----
+    existing_adv = {}
+    for a in Advice.query.order_by(Advice.id.asc()).all():
+        existing_adv.setdefault(_advice_key(a), a)
+    adv_insert, adv_update = [], []
+    for row in snapshot.get("advices") or []:
+        a = existing_adv.get(_advice_key(row))
+        if a is None:
+            adv_insert.append({
+                "diagnosis_code": row["diagnosis_code"], "risk_level": row["risk_level"], "title": row["title"],
+                **{f: row[f] for f in ADVICE_FIELDS if f in row},
+            })
+        elif update_existing:
+            changes = _changes(a, row, ADVICE_FIELDS)
+            if changes:
+                adv_update.append({"id": a.id, **changes})
+    if adv_insert:
+        db.session.execute(insert(Advice), adv_insert)
+    if adv_update:
+        bulk_update(Advice, adv_update)
+
+    # ---- prune ----
+    pruned = {"symptoms_deleted": 0, "symptoms_deactivated": 0, "rules": 0, "advices": 0}
+    if prune:
+        # anything not addressed by the snapshot goes, including same-name duplicates
+        keep = {name_to_id[r["name"]] for r in snapshot.get("rules") or []}
+        drop_rules = [rid for (rid,) in db.session.query(Rule.id) if rid not in keep]
+        if drop_rules:
+            db.session.execute(delete(RuleCondition).where(RuleCondition.rule_id.in_(drop_rules)))
+            db.session.execute(delete(Rule).where(Rule.id.in_(drop_rules)))
+        pruned["rules"] = len(drop_rules)
+
+        wanted_adv = {_advice_key(a) for a in snapshot.get("advices") or []}
+        drop_adv = [a.id for key, a in existing_adv.items() if key not in wanted_adv]
+        if drop_adv:
+            db.session.execute(delete(Advice).where(Advice.id.in_(drop_adv)))
+        pruned["advices"] = len(drop_adv)
+
+        wanted_sym = {s["code"] for s in snapshot.get("symptoms") or []}
+        drop_sym = [s.id for code, s in existing_sym.items() if code not in wanted_sym]
+        if drop_sym:
+            session_store.flush()
+            answered = set(scalars_all_shards(
+                select(AssessmentAnswer.symptom_id).where(AssessmentAnswer.symptom_id.in_(drop_sym)).distinct()
+            ))
+            deletable = [sid for sid in drop_sym if sid not in answered]
+            # a kept rule whose conditions all go would match every assessment
+            emptied = sorted(
+                name for (name,) in db.session.query(Rule.name)
+                .join(RuleCondition, RuleCondition.rule_id == Rule.id)
+                .filter(Rule.id.in_(keep), Rule.is_active.is_(True))
+                .group_by(Rule.id, Rule.name)
+                .having(db.func.count(RuleCondition.id) == db.func.count(
+                    db.case((RuleCondition.symptom_id.in_(drop_sym), 1))
+                ))
+            )
+            if emptied:
+                raise KbEditError(
+                    "pruning would leave active rules without conditions; "
+                    "add their symptoms to the snapshot or deactivate the rules",
+                    status=409,
+                    rules=emptied,
+                )
+            db.session.execute(delete(RuleCondition).where(RuleCondition.symptom_id.in_(drop_sym)))
+            if deletable:
+                db.session.execute(delete(Symptom).where(Symptom.id.in_(deletable)))
+            active = {s.id for s in existing_sym.values() if s.is_active}
+            deactivate = [{"id": sid, "is_active": False} for sid in answered if sid in active]
+            if deactivate:
+                bulk_update(Symptom, deactivate)
+            pruned["symptoms_deleted"] = len(deletable)
+            pruned["symptoms_deactivated"] = len(deactivate)
+
+    summary["symptoms"] = {"inserted": len(sym_insert), "updated": len(sym_update)}
+    summary["rules"] = {"inserted": len(rule_insert), "updated": len(rule_update), "conditions": cond_counts}
+    summary["advices"] = {"inserted": len(adv_insert), "updated": len(adv_update)}
+    summary["pruned"] = pruned
+
+    changed = (
+        any(v for section in ("symptoms", "rules", "advices") for k, v in summary[section].items() if k != "conditions")
+        or any(cond_counts.values())
+        or any(pruned.values())
+    )
+    summary["kb_version"] = bump_kb_version(actor_user_id, "IMPORT_SNAPSHOT").id if changed else None
+    return summary
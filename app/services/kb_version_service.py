@@ -0,0 +1,27 @@
+from typing import Optional
+
+from app.extensions import db
+from app.models import KbVersion
+from app.services.invalidation import KB_SCOPE, bump_cache_version
+
+
+def bump_kb_version(actor_user_id: Optional[int] = None, note: Optional[str] = None) -> KbVersion:
+    """
+    Record a KB change inside the caller's transaction (flushed, not committed),
+    so the new version becomes visible together with the edit itself.
+    Call it after staging the edit: the version snapshot is taken from the
+    session state at this point.
+    """
+    from app.services.kb_cache import snapshot_kb_version
+
+    v = KbVersion(actor_user_id=actor_user_id, note=note)
+    db.session.add(v)
+    db.session.flush()
+    snapshot_kb_version(v)
+    # other workers learn the new current version from the invalidation channel
+    bump_cache_version(KB_SCOPE, to_version=v.id)
+    return v
+
+
+def current_kb_version_id() -> int:
+    return db.session.query(db.func.max(KbVersion.id)).scalar() or 0
@@ -0,0 +1,257 @@
+"""
+Question selection with learned answer priors.
+
+With QUESTION_SELECTION="priors", ``choose_question`` takes the PRIORS_BEAM
+best questions by the ``select_question`` score and asks the one with the
+fewest expected questions until the engine concludes. For question q asked
+while the rules R are still possible:
+
+    E(q) = 1 + p * E(facts + q=YES) + (1 - p) * E(facts + q=NO),   p = P(YES | q, R)
+
+E(facts) is 0 once the engine concludes, otherwise the best E over the next
+candidates, searched PRIORS_SEARCH_DEPTH questions deep (past that: 1, "at
+least one more"). p comes from app/services/symptom_priors.py. The set of
+questions that can be asked - and so when an assessment ends and with which
+result for given answers - is the same as with the default heuristic; only
+the order changes.
+
+``record_answers`` counts accepted answers with the context they were given
+in. ``rebuild_priors`` recomputes the counters from stored answers and
+``compare_strategies`` replays completed assessments with both strategies
+(``flask priors rebuild|compare``).
+"""
+from itertools import groupby
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.models import Assessment, AssessmentAnswer, AssessmentArchive, SymptomAnswerStat
+from app.services.archive import decode_payload
+from app.services.inference_engine import conclude, decide, possible_rules, ranked_questions, select_question
+from app.services.kb_cache import CompiledKB, CompiledSymptom, kb_cache
+from app.services.session_store import session_store
+from app.services.symptom_priors import OVERALL, rule_context, symptom_priors
+from app.utils.fact_masks import facts_from
+from app.utils.sharding import shard_router
+
+PYes = Callable[[str, int], float]
+
+
+def _pool(kb: CompiledKB, ranked: List[int], beam: int) -> List[int]:
+    active = [sid for sid in ranked if sid in kb.symptoms and kb.symptoms[sid].is_active]
+    return active[:beam] if active else ranked[:1]
+
+
+def _expected(kb: CompiledKB, facts: Dict[int, bool], p_yes: PYes, depth: int, beam: int, memo: dict) -> float:
+    key = (frozenset(facts.items()), depth)
+    if key in memo:
+        return memo[key]
+    if decide(kb, facts) is not None:
+        cost = 0.0
+    else:
+        rules = possible_rules(kb, facts)
+        ranked = ranked_questions(kb, facts, rules)
+        if not ranked:
+            cost = 0.0
+        elif depth <= 0:
+            cost = 1.0
+        else:
+            context = rule_context(r.id for r in rules)
+            cost = min(_cost(kb, facts, sid, context, p_yes, depth, beam, memo) for sid in _pool(kb, ranked, beam))
+    memo[key] = cost
+    return cost
+
+
+def _cost(kb, facts, sid, context, p_yes: PYes, depth: int, beam: int, memo: dict) -> float:
+    p = p_yes(context, sid)
+    return (1.0 + p * _expected(kb, {**facts, sid: True}, p_yes, depth - 1, beam, memo)
+            + (1 - p) * _expected(kb, {**facts, sid: False}, p_yes, depth - 1, beam, memo))
+
+
+def select_question_by_priors(kb: CompiledKB, facts: Dict[int, bool], p_yes: PYes,
+                              depth: int = 2, beam: int = 6) -> Optional[CompiledSymptom]:
+    rules = possible_rules(kb, facts)
+    ranked = ranked_questions(kb, facts, rules)
+    if not ranked:
+        return None
+    context = rule_context(r.id for r in rules)
+    memo = {}
+    # min() keeps the first of equal costs: the heuristic order breaks ties
+    best = min(_pool(kb, ranked, beam), key=lambda sid: _cost(kb, facts, sid, context, p_yes, depth, beam, memo))
+    return kb.symptoms.get(best)
+
+
+def choose_question(kb: CompiledKB, facts: Dict[int, bool]) -> Optional[CompiledSymptom]:
+    """The next question to ask, by QUESTION_SELECTION."""
+    if not symptom_priors.enabled:
+        return select_question(kb, facts)
+    return select_question_by_priors(kb, facts, symptom_priors.p_yes, symptom_priors.search_depth, symptom_priors.beam)
+
+
+def record_answers(kb: CompiledKB, facts: Dict[int, bool], answers: Iterable[Tuple[int, bool]]):
+    """Count accepted ``answers`` (in order) given on top of ``facts``."""
+    if not symptom_priors.recording:
+        return
+    facts = dict(facts)
+    for sid, answer in answers:
+        context = rule_context(r.id for r in possible_rules(kb, facts)) if symptom_priors.conditioned else OVERALL
+        symptom_priors.record(context, sid, answer)
+        facts[sid] = answer
+
+
+# ---------- batch jobs ----------
+
+def _engines():
+    return [db.engines[key] for key in shard_router.keys] if shard_router.enabled else [db.engine]
+
+
+def _kb(version_id: Optional[int]) -> Optional[CompiledKB]:
+    if version_id is None:
+        return None
+    try:
+        return kb_cache.get(version_id)
+    except LookupError:  # snapshot gone
+        return None
+
+
+def rebuild_priors(batch_size: int = 1000) -> int:
+    """Replace the answer counters with counts replayed from every stored answer; returns answers counted."""
+    session_store.flush()
+    symptom_priors.discard_pending()
+    a, ans, t = Assessment.__table__, AssessmentAnswer.__table__, AssessmentArchive.__table__
+    answers = (
+        sa.select(ans.c.assessment_id, a.c.kb_version_id, ans.c.symptom_id, ans.c.answer_bool)
+        .select_from(ans.join(a, a.c.id == ans.c.assessment_id))
+        .order_by(ans.c.assessment_id.asc(), ans.c.id.asc())
+    )
+    archived = sa.select(t.c.kb_version_id, t.c.payload)
+
+    counts = {}
+    conditioned = symptom_priors.conditioned
+
+    def replay(version_id, items):
+        kb = _kb(version_id)
+        if kb is None:
+            return 0
+        facts = {}
+        for sid, answer in items:
+            keys = [OVERALL]
+            if conditioned:
+                keys.append(rule_context(r.id for r in possible_rules(kb, facts)))
+            for context in keys:
+                row = counts.setdefault((context, sid), {"yes": 0, "no": 0})
+                row["yes" if answer else "no"] += 1
+            facts[sid] = answer
+        return len(items)
+
+    total = 0
+    for engine in _engines():
+        with engine.connect() as conn:
+            rows = conn.execution_options(stream_results=True, yield_per=batch_size).execute(answers)
+            for _, group in groupby(rows, key=lambda row: row.assessment_id):
+                group = list(group)
+                total += replay(group[0].kb_version_id, [(row.symptom_id, bool(row.answer_bool)) for row in group])
+            for row in conn.execution_options(stream_results=True, yield_per=batch_size).execute(archived):
+                total += replay(row.kb_version_id, [(item[0], item[1]) for item in decode_payload(row.payload)["answers"]])
+
+    table = SymptomAnswerStat.__table__
+    db.session.execute(sa.delete(table))
+    items = [{"context": c, "symptom_id": sid, "slot": 0, **n} for (c, sid), n in sorted(counts.items())]
+    for start in range(0, len(items), batch_size):
+        db.session.execute(sa.insert(table), items[start:start + batch_size])
+    db.session.commit()
+    symptom_priors.invalidate()
+    return total
+
+
+def _replay(kb: CompiledKB, recorded: Dict[int, bool], choose) -> Optional[Tuple[int, Tuple[str, str]]]:
+    """(questions asked, (diagnosis, risk)) answering from ``recorded``; None once it asks something not in it."""
+    facts = {}
+    while True:
+        result = conclude(kb, facts)
+        if result is not None:
+            return len(facts), (result["diagnosis_code"], result["risk_level"])
+        question = choose(kb, facts)
+        if question is None or question.id not in recorded:
+            return None
+        facts[question.id] = recorded[question.id]
+
+
+def _recorded_facts(batch_size: int):
+    """(kb_version_id, known blob, values blob) of completed assessments, newest first per shard."""
+    a, t = Assessment.__table__, AssessmentArchive.__table__
+    live = (
+        sa.select(a.c.kb_version_id, a.c.fact_known, a.c.fact_values)
+        .where(a.c.status == "COMPLETED", a.c.fact_known.isnot(None))
+        .order_by(a.c.id.desc())
+    )
+    archived = sa.select(t.c.kb_version_id, t.c.payload).where(t.c.status == "COMPLETED").order_by(t.c.id.desc())
+    for engine in _engines():
+        with engine.connect() as conn:
+            yield from conn.execution_options(stream_results=True, yield_per=batch_size).execute(live)
+            for row in conn.execution_options(stream_results=True, yield_per=batch_size).execute(archived):
+                payload = decode_payload(row.payload)
+                if payload.get("fact_known") is not None:
+                    yield (row.kb_version_id, bytes.fromhex(payload["fact_known"]),
+                           bytes.fromhex(payload["fact_values"] or ""))
+
+
+def compare_strategies(limit: Optional[int] = None, depth: Optional[int] = None, beam: Optional[int] = None,
+                       batch_size: int = 1000) -> dict:
+    """
+    Replay completed assessments with the heuristic and with the priors,
+    answering every question from what the user actually answered. An
+    assessment counts only if both strategies stay within its recorded
+    answers; since those were collected under the heuristic, the comparison
+    favours it. The priors include the replayed assessments themselves.
+    """
+    depth = symptom_priors.search_depth if depth is None else depth
+    beam = symptom_priors.beam if beam is None else beam
+    symptom_priors.invalidate()
+
+    def by_priors(kb, facts):
+        return select_question_by_priors(kb, facts, symptom_priors.p_yes, depth, beam)
+
+    seen = compared = no_kb = recorded_questions = 0
+    unresolved = {"heuristic": 0, "priors": 0}
+    asked = {"heuristic": [], "priors": []}
+    fewer = more = same_result = 0
+    for version_id, known, values in _recorded_facts(batch_size):
+        if limit is not None and seen >= limit:
+            break
+        seen += 1
+        kb = _kb(version_id)
+        recorded = facts_from(known, values, kb.symptom_at) if kb is not None else None
+        if recorded is None:
+            no_kb += 1
+            continue
+        heuristic = _replay(kb, recorded, select_question)
+        priors = _replay(kb, recorded, by_priors)
+        unresolved["heuristic"] += heuristic is None
+        unresolved["priors"] += priors is None
+        if heuristic is None or priors is None:
+            continue
+        compared += 1
+        recorded_questions += len(recorded)
+        asked["heuristic"].append(heuristic[0])
+        asked["priors"].append(priors[0])
+        fewer += priors[0] < heuristic[0]
+        more += priors[0] > heuristic[0]
+        same_result += priors[1] == heuristic[1]
+
+    def stats(values: List[int]) -> dict:
+        return {
+            "avg_questions": round(sum(values) / len(values), 3) if values else None,
+            "max_questions": max(values, default=None),
+        }
+
+    return {
+        "assessments": seen,
+        "compared": compared,
+        "skipped": {"no_kb_or_masks": no_kb, "unresolved": unresolved},
+        "recorded_avg_questions": round(recorded_questions / compared, 3) if compared else None,
+        "heuristic": stats(asked["heuristic"]),
+        "priors": {**stats(asked["priors"]), "fewer": fewer, "more": more, "same_result": same_result},
+        "settings": {"depth": depth, "beam": beam, "min_samples": symptom_priors.min_samples},
+    }
@@ -1,17 +1,87 @@
-from typing import Set
-from app.models import User
+import threading
+import time
+from collections import OrderedDict
+from typing import FrozenSet, Optional, Set
+
+from app.extensions import db
+from app.models import Permission, RolePermission, UserRole
+from app.services.invalidation import RBAC_SCOPE, bump_cache_version, channel
+
+
+class PermissionCache:
+    """
+    Per-worker user_id -> permission codes. Cleared whenever the "rbac" cache
+    scope changes on any worker; ``ttl`` is only a safety net for changes made
+    behind the app's back without a version bump.
+    """
+
+    def __init__(self, max_users: int = 10000, ttl: float = 300.0):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._items: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[FrozenSet[str]]:
+        with self._lock:
+            hit = self._items.get(user_id)
+            if hit is None:
+                return None
+            expires, codes = hit
+            if expires < time.monotonic():
+                del self._items[user_id]
+                return None
+            self._items.move_to_end(user_id)
+            return codes
+
+    def put(self, user_id: int, codes: FrozenSet[str]):
+        with self._lock:
+            self._items[user_id] = (time.monotonic() + self.ttl, codes)
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.max_users:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+permission_cache = PermissionCache()
+channel.on_change(RBAC_SCOPE, permission_cache.clear)
+
+
+def init_rbac_cache(app):
+    permission_cache.max_users = app.config.get("RBAC_CACHE_MAX_USERS", 10000)
+    permission_cache.ttl = app.config.get("RBAC_CACHE_TTL", 300.0)
+
+
+def _load_permission_codes(user_id: int) -> FrozenSet[str]:
+    rows = (
+        db.session.query(Permission.code)
+        .join(RolePermission, RolePermission.permission_id == Permission.id)
+        .join(UserRole, UserRole.role_id == RolePermission.role_id)
+        .filter(UserRole.user_id == user_id)
+        .distinct()
+        .all()
+    )
+    return frozenset(code for (code,) in rows)
+
 
 def get_user_permission_codes(user_id: int) -> Set[str]:
     """
     Load permissions from: user -> roles -> permissions
     Returns set of permission codes.
     """
-    user = User.query.get(user_id)
-    if not user:
-        return set()
-
-    codes = set()
-    for role in user.roles:
-        for perm in role.permissions:
-            codes.add(perm.code)
-    return codes
+    codes = permission_cache.get(user_id)
+    if codes is None:
+        codes = _load_permission_codes(user_id)
+        permission_cache.put(user_id, codes)
+    return set(codes)
+
+
+def user_has_permission(user_id: int, permission_code: str) -> bool:
+    return permission_code in get_user_permission_codes(user_id)
+
+
+def bump_rbac_version() -> int:
+    """Call in the same transaction as any role/permission/assignment change."""
+    return bump_cache_version(RBAC_SCOPE)
@@ -0,0 +1,234 @@
+"""
+Re-inference of completed assessments against the current KB.
+
+Results are written once, with the KB version the assessment was pinned to;
+after a rule fix they keep the old logic. ``reinfer`` walks COMPLETED
+assessments shard by shard in id order (``batch_size`` per round trip),
+rebuilds each one's facts from its fact masks and asks ``conclude`` what the
+newest KB version would store for them. Evaluation is pure, so it runs in a
+process pool: every worker gets the compiled KB once, at start, and never
+touches the database or ``kb_cache``.
+
+Each assessment ends up as one of
+
+    unchanged     same diagnosis, risk level and fired rule
+    rule_changed  same diagnosis and risk level, another rule fired
+    changed       different diagnosis or risk level (one report line each)
+    undecided     the new KB would ask more than was answered; left alone
+    unmapped      a fact bit no symptom of the new KB has; left alone
+
+Assessments already on the newest version are not read; ones without fact
+masks are counted as ``no_masks`` (run ``flask facts backfill-masks`` first).
+Archived assessments are not re-inferred.
+
+With ``apply`` each batch is one transaction per shard: changed and
+rule_changed results are rewritten, every concluded assessment is re-pinned
+to the new version (so a second run skips it) and the outcome rollups move
+the assessment from its old (diagnosis, risk) to the new one. Completion
+sequences are untouched: the change feed does not redeliver re-inferred
+assessments, and cohort cubes pick them up at their next full rebuild.
+
+A checkpoint file, rewritten after every batch, holds the last id done per
+shard and the running totals; a run given an existing checkpoint continues
+from it (and appends to the report) as long as KB version and mode match.
+"""
+import json
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import IO, List, Optional, Tuple
+
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.models import Assessment, AssessmentResult
+from app.services.inference_engine import conclude
+from app.services.kb_cache import CompiledKB, kb_cache, pin_current_kb_version
+from app.services.rollups import RollupDelta
+from app.utils.fact_masks import facts_from
+from app.utils.sharding import shard_router, use_shard
+
+OUTCOMES = ("unchanged", "rule_changed", "changed", "undecided", "unmapped", "no_masks")
+
+# ---------- evaluation (worker side) ----------
+
+_worker_kb: Optional[CompiledKB] = None
+
+
+def _init_worker(version_id: int, payload: dict):
+    global _worker_kb
+    _worker_kb = CompiledKB.from_payload(version_id, payload)
+
+
+def evaluate(kb: CompiledKB, rows: List[Tuple[int, bytes, bytes]]) -> List[Tuple[int, str, Optional[dict]]]:
+    """(assessment id, "ok" | "undecided" | "unmapped", result fields) for rows (id, fact_known, fact_values)."""
+    out = []
+    for aid, known, values in rows:
+        facts = facts_from(known, values, kb.symptom_at)
+        if facts is None:
+            out.append((aid, "unmapped", None))
+            continue
+        result = conclude(kb, facts)
+        out.append((aid, "ok" if result is not None else "undecided", result))
+    return out
+
+
+def _evaluate_in_worker(rows):
+    return evaluate(_worker_kb, rows)
+
+
+# ---------- checkpoints ----------
+
+def _shard_name(key: Optional[str]) -> str:
+    return key or "default"
+
+
+def load_checkpoint(path: Optional[str]) -> Optional[dict]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: Optional[str], state: dict):
+    if not path:
+        return
+    with open(path + ".part", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".part", path)
+
+
+# ---------- job ----------
+
+def _fired_rule_id(explanation_json: Optional[str]) -> Optional[int]:
+    try:
+        return json.loads(explanation_json).get("fired_rule_id") if explanation_json else None
+    except (ValueError, AttributeError):
+        return None
+
+
+def _shards():
+    return list(shard_router.keys) if shard_router.enabled else [None]
+
+
+def reinfer(report: IO[str], apply: bool = False, workers: int = 1, batch_size: int = 1000,
+            checkpoint: Optional[str] = None) -> dict:
+    """
+    Re-evaluate completed assessments against the newest KB version, writing
+    one NDJSON line per changed diagnosis to ``report``; returns the totals.
+    """
+    target = pin_current_kb_version()
+    db.session.commit()  # pinning may have created the first version
+    kb = kb_cache.get(target)
+
+    state = load_checkpoint(checkpoint)
+    if state is None:
+        state = {"kb_version_id": target, "apply": apply, "shards": {},
+                 "totals": dict.fromkeys(OUTCOMES, 0), "transitions": {}}
+    elif state["kb_version_id"] != target or state["apply"] != apply:
+        raise ValueError(
+            f"checkpoint {checkpoint} is for KB version {state['kb_version_id']} with apply={state['apply']}; "
+            f"this run is KB version {target} with apply={apply} (remove it to start over)"
+        )
+    totals, transitions = Counter(state["totals"]), Counter(state["transitions"])
+
+    a, r = Assessment.__table__, AssessmentResult.__table__
+    pool = None
+    if workers > 1:
+        # spawn: workers start clean instead of inheriting engines, pools and threads
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(target, kb.to_payload()))
+    try:
+        for key in _shards():
+            use_shard(key)
+            last_id = state["shards"].get(_shard_name(key), 0)
+            while True:
+                rows = db.session.execute(
+                    sa.select(a.c.id, a.c.kb_version_id, a.c.completed_at, a.c.fact_known, a.c.fact_values,
+                              r.c.diagnosis_code, r.c.risk_level, r.c.explanation_json)
+                    .select_from(a.join(r, r.c.assessment_id == a.c.id))
+                    .where(a.c.status == "COMPLETED", a.c.id > last_id,
+                           sa.or_(a.c.kb_version_id.is_(None), a.c.kb_version_id != target))
+                    .order_by(a.c.id.asc()).limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                by_id = {row.id: row for row in rows}
+
+                todo = [(row.id, row.fact_known, row.fact_values) for row in rows if row.fact_known is not None]
+                totals["no_masks"] += len(rows) - len(todo)
+                if pool is not None:
+                    step = max(1, -(-len(todo) // workers))
+                    chunks = [todo[i:i + step] for i in range(0, len(todo), step)]
+                    evaluated = [item for part in pool.map(_evaluate_in_worker, chunks) for item in part]
+                else:
+                    evaluated = evaluate(kb, todo)
+
+                updates, repin, lines = [], [], []
+                delta = RollupDelta()
+                for aid, status, result in evaluated:
+                    if status != "ok":
+                        totals[status] += 1
+                        continue
+                    row = by_id[aid]
+                    repin.append(aid)
+                    before = (row.diagnosis_code, row.risk_level)
+                    after = (result["diagnosis_code"], result["risk_level"])
+                    old_rule, new_rule = _fired_rule_id(row.explanation_json), _fired_rule_id(result["explanation_json"])
+                    if before == after and old_rule == new_rule:
+                        totals["unchanged"] += 1
+                        continue
+                    updates.append({"b_id": aid, **result})
+                    if before == after:
+                        totals["rule_changed"] += 1
+                        continue
+                    totals["changed"] += 1
+                    transitions[f"{'/'.join(before)} -> {'/'.join(after)}"] += 1
+                    if row.completed_at is not None:
+                        delta.reclassified(row.completed_at, before, after)
+                    lines.append({
+                        "assessment_id": aid,
+                        "shard": key,
+                        "completed_at": row.completed_at.isoformat() if row.completed_at else None,
+                        "kb_version_id": row.kb_version_id,
+                        "before": {"diagnosis_code": before[0], "risk_level": before[1], "fired_rule_id": old_rule},
+                        "after": {"diagnosis_code": after[0], "risk_level": after[1], "fired_rule_id": new_rule},
+                    })
+
+                if apply and repin:
+                    if updates:
+                        db.session.execute(
+                            sa.update(r).where(r.c.assessment_id == sa.bindparam("b_id"))
+                            .values(diagnosis_code=sa.bindparam("diagnosis_code"),
+                                    risk_level=sa.bindparam("risk_level"),
+                                    explanation_json=sa.bindparam("explanation_json")),
+                            updates,
+                        )
+                    db.session.execute(sa.update(a).where(a.c.id.in_(repin)).values(kb_version_id=target))
+                    delta.apply(db.session)
+                    db.session.commit()
+                    totals["applied"] += len(updates)
+                else:
+                    db.session.rollback()  # end the read transaction between batches
+
+                for line in lines:
+                    report.write(json.dumps(line) + "\n")
+                report.flush()
+                state["shards"][_shard_name(key)] = last_id
+                state["totals"], state["transitions"] = dict(totals), dict(transitions)
+                state["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
+                _save_checkpoint(checkpoint, state)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return {
+        "kb_version_id": target,
+        "apply": apply,
+        **{name: totals[name] for name in OUTCOMES},
+        "applied": totals["applied"],
+        "transitions": dict(transitions.most_common()),
+    }
@@ -1,36 +1,43 @@
 import json
+from app.extensions import db
 from app.models import (
-    AssessmentAnswer, Symptom,
+    Assessment, AssessmentAnswer, Symptom,
     AssessmentResult, Rule, Advice
 )
+from app.utils.sharding import use_assessment_shard
 
 def build_report(assessment_id: int):
+    use_assessment_shard(assessment_id)
+
     # facts (answers)
     answers = AssessmentAnswer.query.filter_by(assessment_id=assessment_id).all()
     symptom_ids = [a.symptom_id for a in answers]
     symptoms = {s.id: s for s in Symptom.query.filter(Symptom.id.in_(symptom_ids)).all()} if symptom_ids else {}
 
-    yes_list, no_list = [], []
-    facts = {}
-
+    labeled = []
     for a in answers:
-        facts[a.symptom_id] = bool(a.answer_bool)
         s = symptoms.get(a.symptom_id)
         label = getattr(s, "label", None) or (s.question_text if s else f"symptom#{a.symptom_id}")
-        if a.answer_bool:
-            yes_list.append(label)
-        else:
-            no_list.append(label)
+        labeled.append((label, bool(a.answer_bool)))
 
     # result
     result = AssessmentResult.query.filter_by(assessment_id=assessment_id).order_by(AssessmentResult.id.desc()).first()
     if not result:
-        return {"assessment_id": assessment_id, "status": "IN_PROGRESS", "next_question": None}
+        status = db.session.query(Assessment.status).filter(Assessment.id == assessment_id).scalar()
+        return {"assessment_id": assessment_id, "status": status or "IN_PROGRESS", "next_question": None}
+
+    return render_report(assessment_id, labeled, result.diagnosis_code, result.risk_level, result.explanation_json)
+
+
+def render_report(assessment_id: int, answers, diagnosis_code: str, risk_level: str, explanation_json):
+    """Report body from [(symptom label, answer)] and the stored result fields."""
+    yes_list = [label for label, answer in answers if answer]
+    no_list = [label for label, answer in answers if not answer]
 
     exp = {}
-    if result.explanation_json:
+    if explanation_json:
         try:
-            exp = json.loads(result.explanation_json)
+            exp = json.loads(explanation_json)
         except Exception:
             exp = {}
 
@@ -58,8 +65,8 @@ def build_report(assessment_id: int):
     # advice
     advice_obj = Advice.query.filter_by(
         is_active=True,
-        diagnosis_code=result.diagnosis_code,
-        risk_level=result.risk_level
+        diagnosis_code=diagnosis_code,
+        risk_level=risk_level
     ).first()
 
     advice = None
@@ -77,8 +84,8 @@ def build_report(assessment_id: int):
             "no": no_list,
         },
         "risk_assessment": {
-            "diagnosis_code": result.diagnosis_code,
-            "risk_level": result.risk_level,
+            "diagnosis_code": diagnosis_code,
+            "risk_level": risk_level,
         },
         "reasoning": reasoning,
         "advice": advice,
@@ -0,0 +1,195 @@
+"""
+Pre-aggregated dashboard numbers.
+
+tbl_rollup_daily / tbl_rollup_daily_outcome (app/models/analytics_rollup.py)
+hold per-day counters, incremented in the same transaction as the write they
+count:
+
+    started             start_assessment, stateless save
+    completed + outcome infer_if_complete, ensure_fallback_result, stateless save,
+                        the sweeper
+    expired             the sweeper
+    outcome moves       flask reinfer --apply
+
+so ``summary`` reads a few rows per day instead of grouping over
+tbl_assessments. The tables live on the default bind; in sharded mode a
+commit touches both it and the shard, as completion sequences do.
+
+``rebuild`` recomputes everything from live and archived assessments
+(``flask rollups rebuild``); run it once after deploying, or to repair drift.
+Writes that land while it runs may be counted twice or not at all, so run it
+when traffic is quiet.
+"""
+import random
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app.extensions import db
+from app.models import (
+    Assessment, AssessmentAnswer, AssessmentArchive, AssessmentResult, DailyOutcomeRollup, DailyRollup,
+)
+from app.services.session_store import session_store
+from app.utils.sharding import shard_router
+from app.utils.upsert import upsert_add
+
+COUNTERS = ("started", "completed", "expired", "completed_questions")
+
+
+class RollupDelta:
+    """Counter changes collected for one transaction; ``apply`` writes them."""
+
+    def __init__(self):
+        self.daily = defaultdict(Counter)
+        self.outcomes = Counter()
+
+    def started(self, when: datetime, n: int = 1):
+        self.daily[when.date()]["started"] += n
+
+    def completed(self, when: datetime, questions: int, diagnosis_code: str, risk_level: str):
+        day = when.date()
+        self.daily[day]["completed"] += 1
+        self.daily[day]["completed_questions"] += questions
+        self.outcomes[(day, diagnosis_code, risk_level)] += 1
+
+    def expired(self, when: datetime, n: int = 1):
+        self.daily[when.date()]["expired"] += n
+
+    def reclassified(self, when: datetime, before: Tuple[str, str], after: Tuple[str, str]):
+        """A completed assessment's (diagnosis_code, risk_level) changed from ``before`` to ``after``."""
+        day = when.date()
+        self.outcomes[(day, *before)] -= 1
+        self.outcomes[(day, *after)] += 1
+
+    def apply(self, session, slot: Optional[int] = None):
+        if slot is None:
+            slot = random.randrange(current_app.config.get("ROLLUP_SLOTS", 8))
+        # fixed key order, so concurrent writers lock rows in the same order
+        for day in sorted(self.daily):
+            counts = {c: n for c, n in self.daily[day].items() if n}
+            if counts:
+                upsert_add(session, DailyRollup.__table__, {"day": day, "slot": slot}, counts)
+        for (day, diagnosis_code, risk_level), n in sorted(self.outcomes.items()):
+            if not n:
+                continue
+            upsert_add(session, DailyOutcomeRollup.__table__, {
+                "day": day, "diagnosis_code": diagnosis_code, "risk_level": risk_level, "slot": slot,
+            }, {"completed": n})
+
+
+def record_started(session, when: datetime):
+    delta = RollupDelta()
+    delta.started(when)
+    delta.apply(session)
+
+
+def record_completed(session, when: datetime, questions: int, diagnosis_code: str, risk_level: str):
+    delta = RollupDelta()
+    delta.completed(when, questions, diagnosis_code, risk_level)
+    delta.apply(session)
+
+
+# ---------- rebuild ----------
+
+def rebuild(batch_size: int = 1000) -> dict:
+    """Replace every rollup row with counts recomputed from the assessments; returns the totals."""
+    from app.services.archive import decode_payload  # archive -> inference_engine -> rollups
+
+    session_store.flush()  # pending answers are part of completed_questions
+    a, r, ans, t = (Assessment.__table__, AssessmentResult.__table__,
+                    AssessmentAnswer.__table__, AssessmentArchive.__table__)
+    questions = sa.select(sa.func.count()).where(ans.c.assessment_id == a.c.id).scalar_subquery()
+    live = (
+        sa.select(a.c.status, a.c.started_at, a.c.completed_at, r.c.diagnosis_code, r.c.risk_level, questions)
+        .select_from(a.outerjoin(r, r.c.assessment_id == a.c.id))
+    )
+    archived = sa.select(t.c.status, t.c.started_at, t.c.completed_at, t.c.diagnosis_code, t.c.risk_level, t.c.payload)
+
+    delta = RollupDelta()
+
+    def count(status, started_at, completed_at, diagnosis_code, risk_level, n_questions):
+        delta.started(started_at)
+        if status == "COMPLETED" and completed_at is not None and diagnosis_code is not None:
+            delta.completed(completed_at, n_questions, diagnosis_code, risk_level)
+        elif status == "EXPIRED" and completed_at is not None:
+            delta.expired(completed_at)
+
+    engines = [db.engines[key] for key in shard_router.keys] if shard_router.enabled else [db.engine]
+    for engine in engines:
+        with engine.connect() as conn:
+            for row in conn.execution_options(stream_results=True, yield_per=batch_size).execute(live):
+                count(*row)
+            for row in conn.execution_options(stream_results=True, yield_per=batch_size).execute(archived):
+                count(*row[:5], len(decode_payload(row.payload)["answers"]))
+
+    db.session.execute(sa.delete(DailyOutcomeRollup.__table__))
+    db.session.execute(sa.delete(DailyRollup.__table__))
+    delta.apply(db.session, slot=0)
+    db.session.commit()
+    totals = Counter()
+    for counts in delta.daily.values():
+        totals.update(counts)
+    return {c: totals[c] for c in COUNTERS}
+
+
+# ---------- reads ----------
+
+def _ratio(part: int, whole: int) -> Optional[float]:
+    return round(part / whole, 4) if whole else None
+
+
+def summary(day_from: date, day_to: date) -> dict:
+    """Dashboard numbers for days in [day_from, day_to)."""
+    d, o = DailyRollup, DailyOutcomeRollup
+    days = db.session.execute(
+        sa.select(d.day, *(sa.func.sum(getattr(d, c)).label(c) for c in COUNTERS))
+        .where(d.day >= day_from, d.day < day_to)
+        .group_by(d.day).order_by(d.day.asc())
+    ).all()
+    outcomes = db.session.execute(
+        sa.select(o.diagnosis_code, o.risk_level, sa.func.sum(o.completed).label("completed"))
+        .where(o.day >= day_from, o.day < day_to)
+        .group_by(o.diagnosis_code, o.risk_level)
+        .having(sa.func.sum(o.completed) != 0)  # moved away entirely by a re-inference
+        .order_by(sa.func.sum(o.completed).desc(), o.diagnosis_code.asc(), o.risk_level.asc())
+    ).all()
+
+    totals = Counter()
+    for row in days:
+        totals.update({c: getattr(row, c) or 0 for c in COUNTERS})
+    risk = Counter()
+    for row in outcomes:
+        risk[row.risk_level] += row.completed
+    return {
+        "from": day_from.isoformat(),
+        "to": day_to.isoformat(),
+        "totals": {
+            **{c: totals[c] for c in ("started", "completed", "expired")},
+            # started and closed are counted on their own days, so this is per period, not per cohort
+            "completion_rate": _ratio(totals["completed"], totals["started"]),
+            "avg_questions": _ratio(totals["completed_questions"], totals["completed"]),
+        },
+        "days": [
+            {
+                "day": row.day.isoformat(),
+                "started": row.started or 0,
+                "completed": row.completed or 0,
+                "expired": row.expired or 0,
+                "avg_questions": _ratio(row.completed_questions or 0, row.completed or 0),
+            }
+            for row in days
+        ],
+        "outcomes": [
+            {
+                "diagnosis_code": row.diagnosis_code,
+                "risk_level": row.risk_level,
+                "completed": row.completed,
+                "share": _ratio(row.completed, totals["completed"]),
+            }
+            for row in outcomes
+        ],
+        "risk_levels": {level: n for level, n in sorted(risk.items())},
+    }
@@ -0,0 +1,437 @@
+"""
+Write-behind state for in-progress assessments.
+
+With SESSION_STORE set, the facts of an IN_PROGRESS assessment live in a
+bounded store instead of being re-read from tbl_assessment_answers on every
+engine call. ``/answer`` appends to the state's pending list (no INSERT, no
+commit); pending answers are written to the database in batches:
+
+- when SESSION_STORE_FLUSH_BATCH assessments have pending answers (checked
+  after each request),
+- every SESSION_STORE_FLUSH_INTERVAL seconds (background thread, or after
+  the next request when SESSION_STORE_FLUSH_THREAD is off),
+- synchronously for one assessment right before its result is written, so a
+  completed assessment always has all of its answer rows,
+- on ``flask sessions flush`` and at interpreter exit,
+- before KB edits that check whether a symptom has recorded answers.
+
+Backends:
+  ""           disabled: answers are written through, as before (default)
+  "memory"     per-process store. A worker that dies loses the answers it had
+               not flushed yet; the assessment then resumes from the rows that
+               were flushed and the lost questions are asked again. Needs
+               sticky routing when running several workers.
+  "local"      one process-wide store shared by every app instance - stands in
+               for a shared store in tests/benchmarks (several apps = workers)
+  "redis://.." shared store (needs the optional ``redis`` package). Pending
+               answers survive a worker crash: the dirty set lives in Redis and
+               any worker's flush picks them up.
+
+Flushing is idempotent: rows already present for (assessment_id, symptom_id)
+are skipped, and flushed entries are removed from the state only after the
+commit, so a crash between the two just repeats the flush.
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as PlainSession
+
+from app.extensions import db
+from app.models import Assessment, AssessmentAnswer, Symptom
+from app.utils.fact_masks import masks_for
+from app.utils.metrics import metrics
+from app.utils.sharding import lookup_shard
+
+log = logging.getLogger(__name__)
+
+
+class AssessmentState:
+    __slots__ = ("assessment_id", "facts", "pending")
+
+    def __init__(self, assessment_id: int, facts=None, pending=None):
+        self.assessment_id = assessment_id
+        self.facts: Dict[int, bool] = dict(facts or {})
+        self.pending: List[Tuple[int, bool, str]] = list(pending or [])  # (symptom_id, answer, answered_at)
+
+    def encode(self) -> bytes:
+        return json.dumps({
+            "id": self.assessment_id,
+            "facts": [[sid, value] for sid, value in self.facts.items()],
+            "pending": self.pending,
+        }, separators=(",", ":")).encode()
+
+    @classmethod
+    def decode(cls, blob: Optional[bytes]) -> Optional["AssessmentState"]:
+        if blob is None:
+            return None
+        data = json.loads(blob)
+        return cls(
+            data["id"],
+            {int(sid): bool(value) for sid, value in data["facts"]},
+            [(int(sid), bool(value), ts) for sid, value, ts in data["pending"]],
+        )
+
+
+# ---------- backends ----------
+
+class LocalStateStore:
+    """
+    Bounded in-process store. States are kept encoded, like a remote store
+    would, so callers never share mutable objects. Least recently used clean
+    states are evicted first; states with pending answers are never evicted
+    (the flusher makes them clean).
+    """
+
+    def __init__(self, max_items: int = 10000, ttl: float = 86400):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items: "OrderedDict[int, Tuple[float, bytes]]" = OrderedDict()
+        self._dirty = set()
+        self._lock = threading.RLock()
+
+    def get(self, assessment_id: int) -> Optional[AssessmentState]:
+        with self._lock:
+            item = self._items.get(assessment_id)
+            if item is None:
+                return None
+            if item[0] < time.time() and assessment_id not in self._dirty:
+                del self._items[assessment_id]
+                return None
+            self._items.move_to_end(assessment_id)
+            return AssessmentState.decode(item[1])
+
+    def update(self, assessment_id: int, fn: Callable) -> Optional[AssessmentState]:
+        """Atomically replace the state with ``fn(current)``; ``fn`` returning None keeps it."""
+        with self._lock:
+            current = self.get(assessment_id)
+            new = fn(current)
+            if new is None:
+                return current
+            self._items[assessment_id] = (time.time() + self.ttl, new.encode())
+            self._items.move_to_end(assessment_id)
+            if new.pending:
+                self._dirty.add(assessment_id)
+            else:
+                self._dirty.discard(assessment_id)
+            self._evict()
+            return new
+
+    def delete(self, assessment_id: int):
+        with self._lock:
+            self._items.pop(assessment_id, None)
+            self._dirty.discard(assessment_id)
+
+    def dirty_ids(self) -> List[int]:
+        with self._lock:
+            return list(self._dirty)
+
+    def __len__(self):
+        return len(self._items)
+
+    def _evict(self):
+        if len(self._items) <= self.max_items:
+            return
+        for key in list(self._items):
+            if len(self._items) <= self.max_items:
+                break
+            if key not in self._dirty:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._dirty.clear()
+
+
+class RedisStateStore:
+    def __init__(self, url: str, ttl: float = 86400, prefix: str = "assessment-state:"):
+        import redis  # optional dependency
+
+        self._redis = redis
+        self._client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.dirty_key = prefix + "dirty"
+
+    def _key(self, assessment_id: int) -> str:
+        return f"{self.prefix}{assessment_id}"
+
+    def get(self, assessment_id: int) -> Optional[AssessmentState]:
+        return AssessmentState.decode(self._client.get(self._key(assessment_id)))
+
+    def update(self, assessment_id: int, fn: Callable) -> Optional[AssessmentState]:
+        key = self._key(assessment_id)
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    current = AssessmentState.decode(pipe.get(key))
+                    new = fn(current)
+                    if new is None:
+                        pipe.unwatch()
+                        return current
+                    pipe.multi()
+                    pipe.set(key, new.encode(), ex=self.ttl)
+                    if new.pending:
+                        pipe.sadd(self.dirty_key, assessment_id)
+                    else:
+                        pipe.srem(self.dirty_key, assessment_id)
+                    pipe.execute()
+                    return new
+                except self._redis.WatchError:
+                    continue
+
+    def delete(self, assessment_id: int):
+        self._client.delete(self._key(assessment_id))
+        self._client.srem(self.dirty_key, assessment_id)
+
+    def dirty_ids(self) -> List[int]:
+        return [int(x) for x in self._client.smembers(self.dirty_key)]
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(key)
+
+
+_shared_local = None
+
+
+def make_state_store(spec: Optional[str], max_items: int = 10000, ttl: float = 86400):
+    global _shared_local
+    if not spec:
+        return None
+    if spec == "memory":
+        return LocalStateStore(max_items, ttl)
+    if spec == "local":
+        if _shared_local is None:
+            _shared_local = LocalStateStore(max_items, ttl)
+        return _shared_local
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateStore(spec, ttl)
+    raise ValueError(f"unknown SESSION_STORE {spec!r}")
+
+
+# ---------- write-behind ----------
+
+class SessionStore:
+    def __init__(self):
+        self.backend = None
+        self.flush_batch = 50
+        self.flush_interval = 2.0
+        self._next_flush = 0.0
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = None
+        self._app = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def configure(self, app):
+        self.stop()
+        cfg = app.config
+        self.backend = make_state_store(
+            cfg.get("SESSION_STORE"), cfg.get("SESSION_STORE_MAX_ITEMS", 10000), cfg.get("SESSION_STORE_TTL", 86400)
+        )
+        self.flush_batch = cfg.get("SESSION_STORE_FLUSH_BATCH", 50)
+        self.flush_interval = cfg.get("SESSION_STORE_FLUSH_INTERVAL", 2.0)
+        self._next_flush = time.monotonic() + self.flush_interval
+        self._app = app
+        if self.enabled and cfg.get("SESSION_STORE_FLUSH_THREAD", True) and self.flush_interval > 0:
+            self._start_thread(app)
+
+    # ---- state ----
+
+    def _load(self, assessment_id: int) -> AssessmentState:
+        rows = db.session.query(AssessmentAnswer.symptom_id, AssessmentAnswer.answer_bool).filter(
+            AssessmentAnswer.assessment_id == assessment_id
+        ).order_by(AssessmentAnswer.id.asc()).all()
+        return AssessmentState(assessment_id, {sid: bool(value) for sid, value in rows})
+
+    def start(self, assessment: Assessment):
+        """State for a freshly created assessment (no answers yet, nothing to read)."""
+        if self.enabled:
+            self.backend.update(assessment.id, lambda current: None if current else AssessmentState(assessment.id))
+
+    def facts(self, assessment_id: int) -> Optional[Dict[int, bool]]:
+        if not self.enabled:
+            return None
+        state = self.backend.get(assessment_id)
+        if state is None:
+            loaded = self._load(assessment_id)
+            state = self.backend.update(assessment_id, lambda current: None if current else loaded)
+        return state.facts
+
+    def record_answers(self, assessment_id: int, answers: List[Tuple[int, bool]]) -> bool:
+        """Append answers atomically; False (nothing recorded) if any symptom was already answered."""
+        self.facts(assessment_id)  # load outside the store's lock
+        added = []
+
+        def add(state):
+            if state is None:
+                state = self._load(assessment_id)
+            if any(symptom_id in state.facts for symptom_id, _ in answers):
+                return None
+            now = datetime.utcnow().isoformat()
+            for symptom_id, answer in answers:
+                state.facts[symptom_id] = answer
+                state.pending.append((symptom_id, answer, now))
+            added.append(True)
+            return state
+
+        self.backend.update(assessment_id, add)
+        return bool(added)
+
+    def record_answer(self, assessment_id: int, symptom_id: int, answer: bool) -> bool:
+        """Append an answer; False if the symptom was already answered."""
+        return self.record_answers(assessment_id, [(symptom_id, answer)])
+
+    def forget(self, assessment_id: int):
+        if self.enabled:
+            self.backend.delete(assessment_id)
+
+    # ---- flushing ----
+
+    def flush(self, assessment_ids: Optional[Iterable[int]] = None) -> int:
+        """Write pending answers (of ``assessment_ids``, default: all dirty states); returns rows written."""
+        if not self.enabled:
+            return 0
+        with self._flush_lock:
+            ids = list(assessment_ids) if assessment_ids is not None else self.backend.dirty_ids()
+            self._next_flush = time.monotonic() + self.flush_interval
+            states = [s for s in (self.backend.get(aid) for aid in ids) if s is not None and s.pending]
+            if not states:
+                return 0
+
+            by_bind = defaultdict(list)
+            for state in states:
+                by_bind[lookup_shard(state.assessment_id)].append(state)
+            symptom_ids = {sid for state in states for sid in state.facts}
+            bits = dict(db.session.query(Symptom.id, Symptom.bit_index).filter(
+                Symptom.id.in_(symptom_ids), Symptom.bit_index.isnot(None)
+            ).all())
+
+            written = 0
+            for bind_key, group in by_bind.items():
+                written += self._write(db.engines[bind_key], group, bits)
+                for state in group:
+                    flushed = {sid for sid, _, _ in state.pending}
+                    self.backend.update(state.assessment_id, lambda s: _drop_pending(s, flushed))
+            metrics.inc("session_store_flushed_answers", written)
+            metrics.inc("session_store_flushes")
+            return written
+
+    def _write(self, engine, states: List[AssessmentState], bits: Dict[int, int]) -> int:
+        ids = [s.assessment_id for s in states]
+        table = AssessmentAnswer.__table__
+        assessments = Assessment.__table__
+        set_masks = (
+            update(assessments).where(assessments.c.id == bindparam("b_id"))
+            .values(fact_known=bindparam("b_known"), fact_values=bindparam("b_values"))
+        )
+        masks = []
+        for s in states:
+            known, values = masks_for(s.facts, bits) if s.facts.keys() <= bits.keys() else (None, None)
+            masks.append({"b_id": s.assessment_id, "b_known": known, "b_values": values})
+        with PlainSession(bind=engine) as session:
+            existing = set(session.execute(
+                select(table.c.assessment_id, table.c.symptom_id).where(table.c.assessment_id.in_(ids))
+            ).all())
+            rows = [
+                {
+                    "assessment_id": s.assessment_id,
+                    "symptom_id": sid,
+                    "answer_bool": value,
+                    "answered_at": datetime.fromisoformat(ts),
+                }
+                for s in states
+                for sid, value, ts in s.pending
+                if (s.assessment_id, sid) not in existing
+            ]
+            if not rows:
+                return 0
+            try:
+                session.execute(insert(table), rows)
+                session.execute(set_masks, masks)
+                session.commit()
+                return len(rows)
+            except IntegrityError:
+                # another worker flushed some of these, or a symptom was deleted meanwhile
+                session.rollback()
+
+            written = 0
+            for row in rows:
+                try:
+                    session.execute(insert(table), [row])
+                    session.commit()
+                    written += 1
+                except IntegrityError:
+                    session.rollback()
+                    log.warning("dropping unflushable answer %s", row, exc_info=True)
+            # some facts may not have been stored: let readers fall back to the answer rows
+            session.execute(set_masks, [{**m, "b_known": None, "b_values": None} for m in masks])
+            session.commit()
+            return written
+
+    def maybe_flush(self):
+        if not self.enabled:
+            return
+        if time.monotonic() >= self._next_flush or len(self.backend.dirty_ids()) >= self.flush_batch:
+            self.flush()
+
+    def _start_thread(self, app):
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(self.flush_interval):
+                with app.app_context():
+                    try:
+                        self.flush()
+                    except Exception:
+                        log.warning("session store flush failed", exc_info=True)
+                    finally:
+                        db.session.remove()
+
+        self._stop = stop
+        self._thread = threading.Thread(target=run, name="session-store-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+        self._stop = self._thread = None
+
+    def flush_at_exit(self):
+        if self.enabled and self._app is not None:
+            with self._app.app_context():
+                self.flush()
+
+
+def _drop_pending(state: Optional[AssessmentState], flushed) -> Optional[AssessmentState]:
+    if state is None:
+        return None
+    state.pending = [p for p in state.pending if p[0] not in flushed]
+    return state
+
+
+session_store = SessionStore()
+atexit.register(session_store.flush_at_exit)
+
+
+def init_session_store(app):
+    session_store.configure(app)
+
+    @app.after_request
+    def _write_behind(response):
+        session_store.maybe_flush()
+        return response
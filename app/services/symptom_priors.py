@@ -0,0 +1,224 @@
+"""
+Answer priors: how often each symptom is answered YES.
+
+Every accepted answer is counted in tbl_symptom_answer_stats overall (context
+"") and, with PRIORS_CONDITIONED, also under the set of rules still possible
+when the question was asked (``rule_context``), so "blurred_vision is mostly
+NO" and "blurred_vision is mostly YES once only the high-risk rules remain"
+are both learned.
+
+Answers are counted in memory and written in batches by a background thread,
+every PRIORS_FLUSH_INTERVAL seconds or as soon as PRIORS_FLUSH_BATCH distinct
+counters are pending; also on ``flask priors flush`` and at interpreter exit.
+One upsert per counter, on its own connection to the default bind, so no
+request waits on them. With PRIORS_FLUSH_THREAD off the same checks run after
+each request instead, inside it. Counts still pending when a worker dies are
+lost; these are statistics, not records.
+
+``p_yes`` reads a per-process snapshot of the table, reloaded every
+PRIORS_REFRESH_INTERVAL seconds. Question selection that uses it lives in
+app/services/question_selection.py (QUESTION_SELECTION="priors").
+"""
+import atexit
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session as PlainSession
+
+from app.extensions import db
+from app.models import SymptomAnswerStat
+from app.utils.metrics import metrics
+from app.utils.upsert import upsert_add
+
+log = logging.getLogger(__name__)
+
+OVERALL = ""
+
+
+def rule_context(rule_ids: Iterable[int]) -> str:
+    """Context key for a set of still-possible rules."""
+    return hashlib.sha1(",".join(map(str, sorted(rule_ids))).encode()).hexdigest()[:16]
+
+
+class SymptomPriors:
+    def __init__(self):
+        self.mode = "heuristic"
+        self.recording = True
+        self.conditioned = True
+        self.min_samples = 20
+        self.search_depth = 2
+        self.beam = 6
+        self.slots = 8
+        self.flush_batch = 200
+        self.flush_interval = 30.0
+        self.refresh_interval = 300.0
+        self._pending: Counter = Counter()  # (context, symptom_id, answer) -> n
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict[Tuple[str, int], Tuple[int, int]]] = None
+        self._loaded_at = 0.0
+        self._next_flush = 0.0
+        self._app = None
+        self._thread = None
+        self._stop = None
+        self._wake = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether question selection uses the priors."""
+        return self.mode == "priors"
+
+    def configure(self, app):
+        self.stop()
+        cfg = app.config
+        self.mode = cfg.get("QUESTION_SELECTION", "heuristic")
+        if self.mode not in ("heuristic", "priors"):
+            raise ValueError(f"unknown QUESTION_SELECTION {self.mode!r}")
+        self.recording = cfg.get("PRIORS_RECORD", True)
+        self.conditioned = cfg.get("PRIORS_CONDITIONED", True)
+        self.min_samples = cfg.get("PRIORS_MIN_SAMPLES", 20)
+        self.search_depth = cfg.get("PRIORS_SEARCH_DEPTH", 2)
+        self.beam = cfg.get("PRIORS_BEAM", 6)
+        self.slots = cfg.get("ROLLUP_SLOTS", 8)
+        self.flush_batch = cfg.get("PRIORS_FLUSH_BATCH", 200)
+        self.flush_interval = cfg.get("PRIORS_FLUSH_INTERVAL", 30.0)
+        self.refresh_interval = cfg.get("PRIORS_REFRESH_INTERVAL", 300.0)
+        self._next_flush = time.monotonic() + self.flush_interval
+        self._snapshot = None
+        self._app = app
+        if self.recording and cfg.get("PRIORS_FLUSH_THREAD", True) and self.flush_interval > 0:
+            self._start_thread(app)
+
+    # ---- counting ----
+
+    def record(self, context: str, symptom_id: int, answer: bool):
+        if not self.recording:
+            return
+        with self._lock:
+            self._pending[(OVERALL, symptom_id, bool(answer))] += 1
+            if self.conditioned:
+                self._pending[(context, symptom_id, bool(answer))] += 1
+            if len(self._pending) >= self.flush_batch:
+                self._wake.set()
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def discard_pending(self):
+        with self._lock:
+            self._pending.clear()
+
+    def maybe_flush(self):
+        if self._pending and (time.monotonic() >= self._next_flush or len(self._pending) >= self.flush_batch):
+            self.flush()
+
+    def flush(self) -> int:
+        """Write pending counts; returns how many answers they covered."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._next_flush = time.monotonic() + self.flush_interval
+        if not pending:
+            return 0
+        rows = {}
+        for (context, symptom_id, answer), n in pending.items():
+            row = rows.setdefault((context, symptom_id), {"yes": 0, "no": 0})
+            row["yes" if answer else "no"] += n
+        slot = random.randrange(self.slots)
+        table = SymptomAnswerStat.__table__
+        try:
+            with PlainSession(bind=db.engine) as session:
+                for (context, symptom_id), counts in sorted(rows.items()):
+                    upsert_add(session, table, {"context": context, "symptom_id": symptom_id, "slot": slot},
+                               {k: n for k, n in counts.items() if n})
+                session.commit()
+        except Exception:
+            with self._lock:
+                self._pending.update(pending)  # retried with the next flush
+            raise
+        answered = sum(n for (context, _, _), n in pending.items() if context == OVERALL)
+        metrics.inc("priors_flushed_answers", answered)
+        return answered
+
+    def _start_thread(self, app):
+        stop = threading.Event()
+
+        def run():
+            while not stop.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                if stop.is_set() or not self._pending:
+                    continue
+                with app.app_context():
+                    try:
+                        self.flush()
+                    except Exception:
+                        log.warning("symptom priors flush failed", exc_info=True)
+
+        self._stop = stop
+        self._thread = threading.Thread(target=run, name="symptom-priors-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout=5)
+        self._stop = self._thread = None
+
+    def flush_at_exit(self):
+        if self._pending and self._app is not None:
+            with self._app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    log.warning("symptom priors flush failed", exc_info=True)
+
+    # ---- reading ----
+
+    def load(self) -> Dict[Tuple[str, int], Tuple[int, int]]:
+        s = SymptomAnswerStat
+        rows = db.session.execute(
+            sa.select(s.context, s.symptom_id, sa.func.sum(s.yes), sa.func.sum(s.no)).group_by(s.context, s.symptom_id)
+        ).all()
+        return {(context, sid): (int(yes or 0), int(no or 0)) for context, sid, yes, no in rows}
+
+    def snapshot(self) -> Dict[Tuple[str, int], Tuple[int, int]]:
+        now = time.monotonic()
+        if self._snapshot is None or now - self._loaded_at >= self.refresh_interval:
+            self._snapshot, self._loaded_at = self.load(), now
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def p_yes(self, context: str, symptom_id: int) -> float:
+        """P(answer is YES), from the context's counts once it has PRIORS_MIN_SAMPLES, else overall."""
+        counts = self.snapshot()
+        yes, no = counts.get((context, symptom_id), (0, 0)) if self.conditioned else (0, 0)
+        if yes + no < self.min_samples:
+            yes, no = counts.get((OVERALL, symptom_id), (0, 0))
+        return (yes + 1) / (yes + no + 2)
+
+
+symptom_priors = SymptomPriors()
+atexit.register(symptom_priors.flush_at_exit)
+
+
+def init_symptom_priors(app):
+    symptom_priors.configure(app)
+
+    if symptom_priors._thread is not None:
+        return
+
+    @app.after_request
+    def _flush_priors(response):
+        try:
+            symptom_priors.maybe_flush()
+        except Exception:
+            log.warning("symptom priors flush failed", exc_info=True)
+        return response
@@ -0,0 +1,93 @@
+import gzip
+import zlib
+
+from flask import current_app, request, stream_with_context
+
+_ENCODINGS = ("gzip", "deflate")
+
+
+def _compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "gzip":
+        # mtime=0 keeps the output deterministic (same body -> same bytes)
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return zlib.compress(data, level)
+
+
+def compress_response(response):
+    """
+    after_request hook: gzip/deflate the body when the client accepts it.
+
+    Only buffered responses with a compressible mimetype and at least
+    COMPRESS_MIN_SIZE bytes are touched; if compression does not make the
+    body smaller the original is sent.
+    """
+    cfg = current_app.config
+    if not cfg.get("COMPRESS_ENABLED", True):
+        return response
+
+    if response.mimetype not in cfg.get("COMPRESS_MIMETYPES", ()):
+        return response
+
+    # caches must key on Accept-Encoding even when this body goes out plain
+    response.vary.add("Accept-Encoding")
+
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 304)
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or request.method == "HEAD"
+    ):
+        return response
+
+    encoding = request.accept_encodings.best_match(_ENCODINGS)
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < cfg.get("COMPRESS_MIN_SIZE", 1024):
+        return response
+
+    compressed = _compress(data, encoding, cfg.get("COMPRESS_LEVEL", 6))
+    if len(compressed) >= len(data):
+        return response
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    if response.headers.get("ETag") and not response.headers["ETag"].startswith("W/"):
+        response.headers["ETag"] = "W/" + response.headers["ETag"]
+    return response
+
+
+def stream_response(chunks, mimetype: str, headers=None):
+    """
+    Streamed response for an iterable of byte chunks (kept inside the request
+    context). ``compress_response`` leaves streamed bodies alone, so the
+    chunks are gzip/deflate-compressed here, incrementally, when allowed.
+    """
+    cfg = current_app.config
+    headers = dict(headers or {})
+    encoding = None
+    if cfg.get("COMPRESS_ENABLED", True) and mimetype in cfg.get("COMPRESS_MIMETYPES", ()):
+        encoding = request.accept_encodings.best_match(_ENCODINGS)
+    if encoding:
+        level = cfg.get("COMPRESS_LEVEL", 6)
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+
+        def compressed(source):
+            for chunk in source:
+                out = compressor.compress(chunk)
+                if out:
+                    yield out
+            yield compressor.flush()
+
+        chunks = compressed(chunks)
+        headers["Content-Encoding"] = encoding
+    response = current_app.response_class(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
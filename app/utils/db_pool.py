@@ -0,0 +1,128 @@
+"""
+Connection pool configuration and instrumentation.
+
+``configure_engine_options`` fills SQLALCHEMY_ENGINE_OPTIONS (and the options of
+every URL-only bind) from per-dialect defaults overridden by DB_POOL_* config /
+environment values. Anything already present in SQLALCHEMY_ENGINE_OPTIONS wins.
+
+Pools for server databases and SQLite files use ``InstrumentedQueuePool``,
+which reports to the app metrics (label ``bind``):
+
+  db_pool_checkout_ms      histogram of time spent waiting for a connection
+  db_pool_timeouts         checkouts that gave up after pool_timeout
+  db_pool_overflow_checkouts checkouts served beyond pool_size
+  db_pool_connects / db_pool_invalidations
+  db_pool_checked_out / db_pool_overflow / db_pool_size   gauges
+"""
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.pool import QueuePool
+
+from app.utils.metrics import metrics
+
+# Per-dialect defaults; None means "leave SQLAlchemy's default".
+DIALECT_DEFAULTS = {
+    "mysql": {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 10,
+        # below the usual server/proxy idle timeouts so dead sockets are not handed out
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    },
+    "postgresql": {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 10,
+        "pool_recycle": 3600,
+        "pool_pre_ping": True,
+    },
+    "sqlite": {
+        # one writer at a time anyway; a few readers is plenty
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pool_timeout": 30,
+        "pool_recycle": None,
+        "pool_pre_ping": False,
+    },
+}
+
+CONFIG_KEYS = {
+    "pool_size": "DB_POOL_SIZE",
+    "max_overflow": "DB_MAX_OVERFLOW",
+    "pool_timeout": "DB_POOL_TIMEOUT",
+    "pool_recycle": "DB_POOL_RECYCLE",
+    "pool_pre_ping": "DB_POOL_PRE_PING",
+}
+
+
+class InstrumentedQueuePool(QueuePool):
+    metrics_label = "default"
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except sa.exc.TimeoutError:
+            metrics.inc("db_pool_timeouts", bind=self.metrics_label)
+            raise
+        metrics.observe("db_pool_checkout_ms", (time.perf_counter() - start) * 1000.0, bind=self.metrics_label)
+        if self.overflow() > 0 and self.checkedout() > self.size():
+            metrics.inc("db_pool_overflow_checkouts", bind=self.metrics_label)
+        return conn
+
+
+def _is_memory_sqlite(url: sa.engine.URL) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options_for(url, config) -> dict:
+    url = sa.engine.make_url(url)
+    if _is_memory_sqlite(url):
+        return {}  # Flask-SQLAlchemy uses a StaticPool there: nothing to tune
+
+    options = {"poolclass": InstrumentedQueuePool}
+    for key, value in DIALECT_DEFAULTS.get(url.get_backend_name(), DIALECT_DEFAULTS["mysql"]).items():
+        override = config.get(CONFIG_KEYS[key])
+        if override is not None:
+            value = override
+        if value is not None:
+            options[key] = value
+    return options
+
+
+def configure_engine_options(app):
+    cfg = app.config
+    options = dict(engine_options_for(cfg["SQLALCHEMY_DATABASE_URI"], cfg))
+    options.update(cfg.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    cfg["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+    binds = {}
+    for key, value in (cfg.get("SQLALCHEMY_BINDS") or {}).items():
+        if isinstance(value, (str, sa.engine.URL)):
+            value = {"url": value, **engine_options_for(value, cfg)}
+        binds[key] = value
+    cfg["SQLALCHEMY_BINDS"] = binds
+
+
+def _count(name: str, label: str):
+    def listener(*args):
+        metrics.inc(name, bind=label)
+    return listener
+
+
+def init_pool_metrics(app, db):
+    with app.app_context():
+        engines = dict(db.engines)
+
+    for key, engine in engines.items():
+        label = key or "default"
+        pool = engine.pool
+        if isinstance(pool, InstrumentedQueuePool):
+            pool.metrics_label = label
+            metrics.gauge("db_pool_size", pool.size, bind=label)
+            metrics.gauge("db_pool_checked_out", pool.checkedout, bind=label)
+            metrics.gauge("db_pool_overflow", lambda p=pool: max(0, p.overflow()), bind=label)
+        sa.event.listen(pool, "connect", _count("db_pool_connects", label))
+        sa.event.listen(pool, "invalidate", _count("db_pool_invalidations", label))
@@ -0,0 +1,280 @@
+"""
+Read/write routing for ``db.session``.
+
+Views decorated with ``@read_only`` read from a replica bind when one is
+configured and healthy; everything else - and any statement issued after the
+session has written - goes to the primary.
+
+- Read-your-writes: once a session writes (flush, bulk insert/update/delete)
+  it stays on the primary. After a request commits a write, the same user
+  (JWT identity, plus a ``db_sticky`` cookie for other workers) is pinned to
+  the primary for DB_STICKY_SECONDS.
+- Lag guard: a replica is used only while its measured lag is at most
+  DB_REPLICA_MAX_LAG seconds, re-measured at most every
+  DB_REPLICA_LAG_CHECK_INTERVAL seconds. Probes: "mysql" (SHOW REPLICA
+  STATUS), "heartbeat" (a timestamp a background thread writes to
+  tbl_cache_versions on the primary every DB_REPLICA_LAG_CHECK_INTERVAL; lag
+  is how far the replica's copy trails the primary's, so quiet periods do not
+  count) or "none" (trust the replica, e.g. two local SQLite files in tests).
+  "auto" picks mysql for MySQL, else heartbeat.
+
+Replica URLs come from DATABASE_REPLICA_URLS (comma separated) and become
+binds "replica_0", "replica_1", ...
+
+Sharded assessment tables (app/utils/sharding.py) are routed to the shard
+selected on the session before any of the above applies.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import List, Optional
+
+import sqlalchemy as sa
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+from app.utils.sharding import shard_engine, shard_router, targets_sharded_table
+
+log = logging.getLogger(__name__)
+
+HEARTBEAT_SCOPE = "replica_heartbeat"
+STICKY_COOKIE = "db_sticky"
+
+
+def read_only(fn):
+    """Allow this view's reads to be served by a replica."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.bind_keys: List[str] = []
+        self.max_lag = 2.0
+        self.check_interval = 1.0
+        self.sticky_seconds = 5.0
+        self.probe = "auto"
+        self.max_sticky_users = 10000
+        self._lag = {}
+        self._next_check = {}
+        self._sticky: "OrderedDict[str, float]" = OrderedDict()
+        self._rr = itertools.count()
+        self._lock = threading.Lock()
+        self._heartbeat = None
+        self._stop = None
+
+    def configure(self, app):
+        self.stop()
+        self.bind_keys = list(app.config.get("DB_REPLICA_BINDS") or [])
+        self.max_lag = app.config.get("DB_REPLICA_MAX_LAG", 2.0)
+        self.check_interval = app.config.get("DB_REPLICA_LAG_CHECK_INTERVAL", 1.0)
+        self.sticky_seconds = app.config.get("DB_STICKY_SECONDS", 5.0)
+        self.probe = app.config.get("DB_REPLICA_LAG_PROBE", "auto")
+        self._lag.clear()
+        self._next_check.clear()
+
+    # ---- read-your-writes ----
+
+    def mark_write(self, identity: Optional[str]):
+        if not identity:
+            return
+        with self._lock:
+            self._sticky[identity] = time.time() + self.sticky_seconds
+            self._sticky.move_to_end(identity)
+            while len(self._sticky) > self.max_sticky_users:
+                self._sticky.popitem(last=False)
+
+    def is_sticky(self, identity: Optional[str], cookie_until: Optional[float] = None) -> bool:
+        now = time.time()
+        if cookie_until is not None and cookie_until > now:
+            return True
+        return bool(identity) and self._sticky.get(identity, 0) > now
+
+    # ---- lag guard ----
+
+    def _probe_kind(self, engine) -> str:
+        if self.probe != "auto":
+            return self.probe
+        return "mysql" if engine.dialect.name in ("mysql", "mariadb") else "heartbeat"
+
+    def _measure(self, primary, replica) -> Optional[float]:
+        kind = self._probe_kind(replica)
+        if kind == "none":
+            return 0.0
+        if kind == "mysql":
+            with replica.connect() as conn:
+                try:
+                    row = conn.exec_driver_sql("SHOW REPLICA STATUS").mappings().first()
+                except sa.exc.DBAPIError:
+                    row = conn.exec_driver_sql("SHOW SLAVE STATUS").mappings().first()
+            if row is None:
+                return None
+            lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+            return None if lag is None else float(lag)
+
+        # heartbeat: how far the replica's copy trails the primary's
+        from app.models import CacheVersion
+
+        table = CacheVersion.__table__
+        query = sa.select(table.c.version).where(table.c.scope == HEARTBEAT_SCOPE)
+        with primary.connect() as conn:
+            current = conn.execute(query).scalar()
+        # no writer running (yet): the replica's progress cannot be told
+        if current is None or time.time() * 1000 - int(current) > (self.check_interval + self.max_lag) * 1000:
+            return None
+        with replica.connect() as conn:
+            seen = conn.execute(query).scalar()
+        if seen is None:
+            return None
+        return max(0.0, (int(current) - int(seen)) / 1000.0)
+
+    def write_heartbeat(self, primary):
+        """Store "now" on the primary for the heartbeat probe."""
+        from app.models import CacheVersion
+
+        table = CacheVersion.__table__
+        now_ms = int(time.time() * 1000)
+        with primary.begin() as conn:
+            res = conn.execute(
+                table.update().where(table.c.scope == HEARTBEAT_SCOPE).values(version=now_ms, updated_at=sa.func.now())
+            )
+            if res.rowcount == 0:
+                conn.execute(table.insert().values(scope=HEARTBEAT_SCOPE, version=now_ms, updated_at=sa.func.now()))
+
+    def start_heartbeat(self, app, db):
+        stop = threading.Event()
+
+        def run():
+            with app.app_context():
+                engines = db.engines
+                if not any(self._probe_kind(engines[k]) == "heartbeat" for k in self.bind_keys if k in engines):
+                    return
+                while True:
+                    try:
+                        self.write_heartbeat(engines[None])
+                    except Exception:
+                        log.warning("replica heartbeat write failed", exc_info=True)
+                    if stop.wait(self.check_interval):
+                        return
+
+        self._stop = stop
+        self._heartbeat = threading.Thread(target=run, name="replica-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._heartbeat.join(timeout=5)
+        self._stop = self._heartbeat = None
+
+    def lag(self, key: str, primary, replica) -> Optional[float]:
+        now = time.monotonic()
+        if now >= self._next_check.get(key, 0.0):
+            self._next_check[key] = now + self.check_interval
+            try:
+                self._lag[key] = self._measure(primary, replica)
+            except Exception:  # replica down/unreachable: do not route to it
+                log.warning("replica %s lag probe failed", key, exc_info=True)
+                self._lag[key] = None
+        return self._lag.get(key)
+
+    def healthy(self, engines) -> List[str]:
+        primary = engines[None]
+        out = []
+        for key in self.bind_keys:
+            if key not in engines:
+                continue
+            lag = self.lag(key, primary, engines[key])
+            if lag is not None and lag <= self.max_lag:
+                out.append(key)
+        return out
+
+    def pick(self, engines) -> Optional[str]:
+        keys = self.healthy(engines)
+        if not keys:
+            return None
+        return keys[next(self._rr) % len(keys)]
+
+
+replica_router = ReplicaRouter()
+
+
+def _request_identity() -> Optional[str]:
+    try:
+        from flask_jwt_extended import get_jwt_identity
+        identity = get_jwt_identity()
+    except RuntimeError:  # no verified JWT in this request
+        return None
+    return str(identity) if identity is not None else None
+
+
+def _request_is_sticky() -> bool:
+    try:
+        cookie_until = float(request.cookies.get(STICKY_COOKIE, "0") or 0)
+    except ValueError:
+        cookie_until = None
+    return replica_router.is_sticky(_request_identity(), cookie_until)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and shard_router.enabled and targets_sharded_table(mapper, clause):
+            return shard_engine(self, self._db.engines)
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        engines = self._db.engines
+        # explicit binds and models on other bind keys are left alone
+        if bind is not None or engine is not engines.get(None):
+            return engine
+        if self._flushing or self.info.get("wrote") or not replica_router.bind_keys:
+            return engine
+        if not (has_request_context() and g.get("db_read_only")):
+            return engine
+
+        key = self.info.get("replica_key")
+        if key is None:
+            if _request_is_sticky():
+                self.info["replica_key"] = False
+                return engine
+            key = replica_router.pick(engines) or False
+            self.info["replica_key"] = key  # one replica per session: monotonic reads
+        return engines[key] if key else engine
+
+
+def _note_write(session, *args):
+    session.info["wrote"] = True
+    session.info.pop("replica_key", None)
+
+
+def _note_orm_execute(state):
+    if not state.is_select:
+        _note_write(state.session)
+
+
+def _after_commit(session):
+    if session.info.get("wrote") and has_request_context():
+        g.db_wrote = True
+
+
+def init_db_routing(app, db):
+    replica_router.configure(app)
+    if replica_router.bind_keys and app.config.get("DB_REPLICA_HEARTBEAT_THREAD", True):
+        replica_router.start_heartbeat(app, db)
+    for name, fn in (("after_flush", _note_write), ("do_orm_execute", _note_orm_execute), ("after_commit", _after_commit)):
+        if not sa.event.contains(db.session, name, fn):
+            sa.event.listen(db.session, name, fn)
+
+    @app.after_request
+    def _stick_to_primary_after_write(response):
+        if g.get("db_wrote") and replica_router.bind_keys:
+            replica_router.mark_write(_request_identity())
+            until = time.time() + replica_router.sticky_seconds
+            response.set_cookie(
+                STICKY_COOKIE, f"{until:.3f}", max_age=int(replica_router.sticky_seconds) + 1, httponly=True
+            )
+        return response
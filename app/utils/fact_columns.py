@@ -0,0 +1,280 @@
+"""
+Bit-packed columnar file of assessment facts, readable zero-copy via mmap.
+
+Written by ``flask export-facts``; reading needs no app or database (the
+standard library, plus NumPy when installed). Layout, little-endian throughout:
+
+    [0:8)       magic b"FACTCOL1"
+    [64:...)    sections, each 64-byte aligned, at the offsets in the footer:
+                  known     uint8[bits, row_bytes]  bit-plane per symptom bit:
+                                                    bit r of plane b set <=> row r answered it
+                  values    uint8[bits, row_bytes]  ... and the answer was YES
+                  assessment_id  int64[rows]
+                  completed_at   int64[rows]        epoch seconds (UTC), 0 = unknown
+                  diagnosis      uint16[rows]       index into footer "diagnosis_labels"
+                  risk           uint16[rows]       index into footer "risk_labels"
+    footer      JSON (symptom code -> bit, offsets, labels, row count)
+    [-16:-8)    uint64 footer length
+    [-8:)       magic
+
+Planes use the same bit numbering as Symptom.bit_index / the fact masks
+(app/utils/fact_masks.py), and rows are packed like
+``numpy.packbits(..., bitorder="little")``. Label index 0 is "no value".
+"""
+import json
+import mmap
+import os
+import struct
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from app.utils.fact_masks import iter_bits
+
+try:  # optional: vectorized filters and zero-copy arrays
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+MAGIC = b"FACTCOL1"
+FORMAT = 1
+ALIGN = 64
+_TRAILER = struct.Struct("<Q8s")
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _layout(rows: int, bits: int) -> Dict[str, dict]:
+    row_bytes = (rows + 7) // 8
+    sections, offset = {}, ALIGN
+    for name, dtype, size in (
+        ("known", "|u1", bits * row_bytes),
+        ("values", "|u1", bits * row_bytes),
+        ("assessment_id", "<i8", 8 * rows),
+        ("completed_at", "<i8", 8 * rows),
+        ("diagnosis", "<u2", 2 * rows),
+        ("risk", "<u2", 2 * rows),
+    ):
+        sections[name] = {"offset": offset, "dtype": dtype, "nbytes": size}
+        offset = _align(offset + size)
+    return sections
+
+
+def _epoch(value: Optional[datetime]) -> int:
+    if value is None:
+        return 0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+class FactFileWriter:
+    """
+    Fills a preallocated file row by row. ``capacity`` must be known up front
+    (the planes are laid out by row count); fewer rows may be written. The
+    file is built as ``<path>.part`` and renamed into place by ``close``.
+    """
+
+    def __init__(self, path: str, capacity: int, bits: int):
+        self.path = path
+        self.capacity = capacity
+        self.bits = bits
+        self.row_bytes = (capacity + 7) // 8
+        self.sections = _layout(capacity, bits)
+        self.rows = 0
+        self._labels = {"diagnosis": [""], "risk": [""]}
+        self._label_index = {"diagnosis": {"": 0}, "risk": {"": 0}}
+        end = max(s["offset"] + s["nbytes"] for s in self.sections.values())
+        self._part = path + ".part"
+        self._file = open(self._part, "w+b")
+        self._file.truncate(max(_align(end), ALIGN * 2))
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self._mm[0:len(MAGIC)] = MAGIC
+        self._known = self.sections["known"]["offset"]
+        self._values = self.sections["values"]["offset"]
+
+    def _label(self, kind: str, value: Optional[str]) -> int:
+        index = self._label_index[kind]
+        value = value or ""
+        if value not in index:
+            index[value] = len(self._labels[kind])
+            self._labels[kind].append(value)
+        return index[value]
+
+    def append(self, assessment_id: int, completed_at: Optional[datetime], diagnosis_code: Optional[str],
+               risk_level: Optional[str], known: int, values: int) -> bool:
+        """Add one row from its fact masks (as ints); False once the file is full."""
+        r = self.rows
+        if r >= self.capacity:
+            return False
+        byte, flag = r >> 3, 1 << (r & 7)
+        mm, rb = self._mm, self.row_bytes
+        for bit in iter_bits(known):
+            if bit >= self.bits:
+                continue
+            at = self._known + bit * rb + byte
+            mm[at] |= flag
+            if values >> bit & 1:
+                at = self._values + bit * rb + byte
+                mm[at] |= flag
+        s = self.sections
+        struct.pack_into("<q", mm, s["assessment_id"]["offset"] + 8 * r, assessment_id)
+        struct.pack_into("<q", mm, s["completed_at"]["offset"] + 8 * r, _epoch(completed_at))
+        struct.pack_into("<H", mm, s["diagnosis"]["offset"] + 2 * r, self._label("diagnosis", diagnosis_code))
+        struct.pack_into("<H", mm, s["risk"]["offset"] + 2 * r, self._label("risk", risk_level))
+        self.rows += 1
+        return True
+
+    def close(self, symptoms: Dict[str, int]):
+        """Write the footer; ``symptoms`` maps symptom code -> bit."""
+        end = len(self._mm)
+        self._mm.flush()
+        self._mm.close()
+        footer = json.dumps({
+            "format": FORMAT,
+            "rows": self.rows,
+            "capacity": self.capacity,
+            "bits": self.bits,
+            "row_bytes": self.row_bytes,
+            "symptoms": symptoms,
+            "sections": self.sections,
+            "diagnosis_labels": self._labels["diagnosis"],
+            "risk_labels": self._labels["risk"],
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }, separators=(",", ":")).encode("utf-8")
+        self._file.seek(end)
+        self._file.write(footer)
+        self._file.write(_TRAILER.pack(len(footer), MAGIC))
+        self._file.close()
+        os.replace(self._part, self.path)
+
+    def abort(self):
+        self._mm.close()
+        self._file.close()
+        os.remove(self._part)
+
+
+class FactFile:
+    """
+    Read-only, memory-mapped view of a fact file.
+
+        ff = FactFile("facts.bin")
+        ff.count({"polyuria": True, "weight_loss": False}, risk_level="HIGH")
+
+    Selections are row bitsets (Python ints, bit r = row r) combined with
+    AND / AND-NOT over the planes, so a query touches only the planes it
+    names. ``arrays()`` exposes every section as a zero-copy NumPy array.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        length, magic = _TRAILER.unpack_from(self._mm, len(self._mm) - _TRAILER.size)
+        if magic != MAGIC or self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a fact file")
+        start = len(self._mm) - _TRAILER.size - length
+        self.meta = json.loads(self._mm[start:start + length])
+        if self.meta["format"] != FORMAT:
+            raise ValueError(f"unsupported fact file format {self.meta['format']}")
+        self.rows: int = self.meta["rows"]
+        self.row_bytes: int = self.meta["row_bytes"]
+        self.symptoms: Dict[str, int] = self.meta["symptoms"]
+        self.diagnosis_labels: List[str] = self.meta["diagnosis_labels"]
+        self.risk_labels: List[str] = self.meta["risk_labels"]
+        self._sections = self.meta["sections"]
+        self._all = (1 << self.rows) - 1
+        self._label_sets = {}
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    # ---- raw access ----
+
+    def _section(self, name: str) -> memoryview:
+        s = self._sections[name]
+        return memoryview(self._mm)[s["offset"]:s["offset"] + s["nbytes"]]
+
+    def plane(self, code: str, which: str = "known") -> memoryview:
+        """Bit-plane of one symptom: ``which`` is "known" or "values"."""
+        bit = self.symptoms[code]
+        offset = self._sections[which]["offset"] + bit * self.row_bytes
+        return memoryview(self._mm)[offset:offset + self.row_bytes]
+
+    def column(self, name: str) -> memoryview:
+        """assessment_id / completed_at (int64) or diagnosis / risk (uint16 label indexes)."""
+        fmt = {"<i8": "q", "<u2": "H"}[self._sections[name]["dtype"]]
+        return self._section(name).cast(fmt)[:self.rows]
+
+    def arrays(self) -> dict:
+        """Zero-copy NumPy arrays of every section (needs NumPy)."""
+        if np is None:
+            raise RuntimeError("numpy is not installed")
+        out = {}
+        for name, s in self._sections.items():
+            arr = np.frombuffer(self._mm, dtype=s["dtype"], count=s["nbytes"] // np.dtype(s["dtype"]).itemsize,
+                                offset=s["offset"])
+            if name in ("known", "values"):
+                arr = arr.reshape(self.meta["bits"], self.row_bytes)
+            else:
+                arr = arr[:self.rows]
+            out[name] = arr
+        return out
+
+    # ---- selections ----
+
+    def _bits(self, view: memoryview) -> int:
+        return int.from_bytes(view, "little") & self._all
+
+    def _label_set(self, name: str, label: str) -> int:
+        key = (name, label)
+        if key not in self._label_sets:
+            labels = self.diagnosis_labels if name == "diagnosis" else self.risk_labels
+            if label not in labels:
+                return 0
+            index = labels.index(label)
+            if np is not None:
+                hits = np.frombuffer(self._mm, dtype="<u2", count=self.rows,
+                                     offset=self._sections[name]["offset"]) == index
+                packed = np.packbits(hits, bitorder="little").tobytes()
+            else:
+                packed = bytearray(self.row_bytes)
+                for r, value in enumerate(self.column(name)):
+                    if value == index:
+                        packed[r >> 3] |= 1 << (r & 7)
+            self._label_sets[key] = int.from_bytes(packed, "little")
+        return self._label_sets[key]
+
+    def select(self, facts: Optional[Dict[str, bool]] = None, diagnosis_code: Optional[str] = None,
+               risk_level: Optional[str] = None) -> int:
+        """Row bitset matching every fact (code -> answer) and label filter."""
+        rows = self._all
+        for code, answer in (facts or {}).items():
+            if code not in self.symptoms:
+                return 0
+            known = self._bits(self.plane(code, "known"))
+            values = self._bits(self.plane(code, "values"))
+            rows &= known & (values if answer else ~values)
+        if diagnosis_code is not None:
+            rows &= self._label_set("diagnosis", diagnosis_code)
+        if risk_level is not None:
+            rows &= self._label_set("risk", risk_level)
+        return rows
+
+    def count(self, facts: Optional[Dict[str, bool]] = None, **labels) -> int:
+        return self.select(facts, **labels).bit_count()
+
+    def assessment_ids(self, selection: int) -> List[int]:
+        ids = self.column("assessment_id")
+        return [ids[r] for r in iter_bits(selection)]
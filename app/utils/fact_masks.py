@@ -0,0 +1,113 @@
+"""
+Bitmask encoding of an assessment's facts.
+
+Every symptom has a stable ``bit_index`` (assigned once, never reused). An
+assessment's answers are mirrored in two masks over those positions:
+
+    fact_known   bit i set  <=>  symptom with bit_index i was answered
+    fact_values  bit i set  <=>  ... and the answer was YES
+
+Masks are stored as little-endian bytes (bit i = byte i // 8, bit i % 8), so
+their width grows with the number of symptoms and never needs a migration.
+
+``fact_bit(column, i)`` reads one bit in SQL: native expressions on MySQL /
+MariaDB and PostgreSQL, a registered function on SQLite. ``has_fact`` builds
+"answered X with YES/NO" filters on top of it.
+"""
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+def encode_mask(mask: int) -> bytes:
+    return mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+
+
+def decode_mask(blob: Optional[bytes]) -> int:
+    return int.from_bytes(blob, "little") if blob else 0
+
+
+def masks_for(facts: Dict[int, bool], bit_of: Dict[int, int]) -> Tuple[bytes, bytes]:
+    """(known, values) masks for {symptom_id: answer}; every symptom must have a bit."""
+    known = values = 0
+    for sid, answer in facts.items():
+        bit = 1 << bit_of[sid]
+        known |= bit
+        if answer:
+            values |= bit
+    return encode_mask(known), encode_mask(values)
+
+
+def facts_from(known_blob: Optional[bytes], values_blob: Optional[bytes],
+               symptom_at: Dict[int, int]) -> Optional[Dict[int, bool]]:
+    """{symptom_id: answer} from masks, or None if a set bit maps to no known symptom."""
+    values = decode_mask(values_blob)
+    facts = {}
+    for bit in iter_bits(decode_mask(known_blob)):
+        sid = symptom_at.get(bit)
+        if sid is None:
+            return None
+        facts[sid] = bool(values >> bit & 1)
+    return facts
+
+
+def iter_bits(mask: int) -> Iterable[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# ---------- SQL ----------
+
+class fact_bit(FunctionElement):
+    """1 if bit ``index`` of the mask column is set, else 0 (NULL/short masks read as 0)."""
+
+    type = sa.Integer()
+    name = "fact_bit"
+    inherit_cache = True
+
+    def __init__(self, column, index: int):
+        self.index = int(index)
+        super().__init__(column, sa.literal_column(str(self.index)))
+
+
+@compiles(fact_bit)
+def _fact_bit_sqlite(element, compiler, **kw):
+    return f"fact_bit({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(fact_bit, "mysql")
+@compiles(fact_bit, "mariadb")
+def _fact_bit_mysql(element, compiler, **kw):
+    col = compiler.process(list(element.clauses)[0], **kw)
+    return f"((ASCII(SUBSTRING({col}, {element.index // 8 + 1}, 1)) >> {element.index % 8}) & 1)"
+
+
+@compiles(fact_bit, "postgresql")
+def _fact_bit_postgresql(element, compiler, **kw):
+    col = compiler.process(list(element.clauses)[0], **kw)
+    return f"(CASE WHEN length({col}) * 8 > {element.index} THEN get_bit({col}, {element.index}) ELSE 0 END)"
+
+
+def has_fact(known_col, values_col, bit_index: int, answer: bool):
+    return sa.and_(fact_bit(known_col, bit_index) == 1, fact_bit(values_col, bit_index) == (1 if answer else 0))
+
+
+def _sqlite_fact_bit(blob, index):
+    if blob is None:
+        return 0
+    byte = index >> 3
+    return (blob[byte] >> (index & 7)) & 1 if byte < len(blob) else 0
+
+
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("fact_bit", 2, _sqlite_fact_bit, deterministic=True)
+
+
+if not sa.event.contains(sa.engine.Engine, "connect", _register_sqlite_functions):
+    sa.event.listen(sa.engine.Engine, "connect", _register_sqlite_functions)
@@ -0,0 +1,96 @@
+import json
+from typing import Any, Union
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:  # optional speedup, the stdlib encoder is used when it is missing
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _orjson_options(sort_keys: bool, indent: bool) -> int:
+    # Keep Flask's own handling of datetimes/dataclasses (http dates, asdict)
+    # by passing them through to ``default`` instead of orjson's ISO format.
+    opts = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    if sort_keys:
+        opts |= orjson.OPT_SORT_KEYS
+    if indent:
+        opts |= orjson.OPT_INDENT_2
+    return opts
+
+
+def json_bytes_response(body: Union[bytes, str], status: int = 200):
+    """
+    Response for a document that is already serialized (e.g. a stored
+    payload): the bytes go to the body as-is, skipping the encode step.
+    """
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return current_app.response_class(body, status=status, mimetype=current_app.json.mimetype)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that uses orjson when it is installed and falls back to the
+    stdlib encoder otherwise (or for anything orjson refuses, e.g. ints > 64 bit).
+
+    Config:
+      JSON_SERIALIZER: "auto" (default), "orjson" or "stdlib"
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        backend = (app.config.get("JSON_SERIALIZER") or "auto").lower()
+        if backend == "orjson" and orjson is None:
+            raise RuntimeError("JSON_SERIALIZER=orjson but orjson is not installed")
+        self.use_orjson = orjson is not None and backend in ("auto", "orjson")
+
+    @property
+    def backend(self) -> str:
+        return "orjson" if self.use_orjson else "stdlib"
+
+    def dumps_bytes(self, obj: Any, sort_keys: bool = None, indent: bool = False, default=None) -> bytes:
+        if sort_keys is None:
+            sort_keys = self.sort_keys
+        if default is None:
+            default = self.default
+
+        if self.use_orjson:
+            try:
+                return orjson.dumps(obj, default=default, option=_orjson_options(sort_keys, indent))
+            except (orjson.JSONEncodeError, TypeError):
+                pass
+
+        return json.dumps(
+            obj,
+            default=default,
+            ensure_ascii=self.ensure_ascii,
+            sort_keys=sort_keys,
+            indent=2 if indent else None,
+            separators=None if indent else (",", ":"),
+        ).encode("utf-8")
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # Unknown encoder arguments (cls, separators...) are stdlib-only.
+        if self.use_orjson and set(kwargs) <= {"default", "sort_keys", "ensure_ascii"}:
+            return self.dumps_bytes(
+                obj, sort_keys=kwargs.get("sort_keys", self.sort_keys), default=kwargs.get("default"),
+            ).decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if self.use_orjson and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                # let the stdlib raise its usual (more descriptive) error
+                pass
+        return json.loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = self.dumps_bytes(obj, indent=indent)
+        return self._app.response_class(body, mimetype=self.mimetype)
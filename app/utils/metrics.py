@@ -0,0 +1,126 @@
+"""
+Minimal in-process metrics: counters, gauges (read at scrape time) and
+latency histograms, served as JSON from ``/metrics`` (JWT with METRICS_VIEW).
+
+Metric keys carry their labels Prometheus-style: ``db_pool_timeouts{bind="default"}``.
+Values are per worker process.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, Optional
+
+# milliseconds
+DEFAULT_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def metric_key(name: str, labels: Optional[dict] = None) -> str:
+    if not labels:
+        return name
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "total", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None when empty)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        cumulative, running = {}, 0
+        for bound, n in zip(self.buckets + ("+Inf",), self.counts):
+            running += n
+            cumulative[str(bound)] = running
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "max": round(self.max, 3),
+            "avg": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": cumulative,
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._counters: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = metric_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = metric_key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(value)
+
+    def gauge(self, name: str, fn: Callable[[], float], **labels):
+        """Register a callable sampled on every snapshot."""
+        with self._lock:
+            self._gauges[metric_key(name, labels)] = fn
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: h.to_dict() for k, h in self._histograms.items()}
+            gauges = dict(self._gauges)
+        sampled = {}
+        for key, fn in gauges.items():
+            try:
+                sampled[key] = fn()
+            except Exception:  # a gauge must never break the scrape
+                sampled[key] = None
+        return {"counters": counters, "gauges": sampled, "histograms": histograms}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def init_metrics(app):
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    from flask_jwt_extended import jwt_required
+    from app.utils.decorators import require_permission
+
+    @app.get("/metrics")
+    @jwt_required()
+    @require_permission("METRICS_VIEW")
+    def metrics_endpoint():
+        return metrics.snapshot()
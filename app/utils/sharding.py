@@ -0,0 +1,234 @@
+"""
+Optional horizontal sharding of the assessment tables.
+
+When DATABASE_SHARD_URLS is set, tbl_assessments, tbl_assessment_answers,
+tbl_assessment_results and tbl_assessment_archive live on binds "shard_0",
+"shard_1", ... while users, RBAC and the KB stay on the default bind.
+
+- Placement: a new assessment goes to ``shard_for_user(user_id)`` (crc32 of
+  the user id modulo the shard count).
+- Ids: assessment ids are allocated from tbl_assessment_directory on the
+  default bind, so they are unique across shards, and the directory row
+  records where the assessment lives. Lookups by id go through the directory,
+  so changing the shard count only moves where *new* assessments are placed.
+- Routing: a session works on one shard at a time, selected with
+  ``use_shard`` / ``use_user_shard`` / ``use_assessment_shard`` (the choice is
+  kept in ``session.info`` and dropped when the request's session is removed).
+  Touching a sharded table with no shard selected raises ``ShardNotSelected``
+  instead of silently reading the wrong database.
+- Cross-shard reads: ``fan_out`` runs a callable against every shard in
+  parallel, each with its own short-lived session, and returns the results
+  per shard for the caller to merge.
+
+Writes that span the default bind and a shard (directory row + assessment)
+commit one database after the other; a failure in between leaves at most an
+unused directory row, which lookups treat as "not found".
+
+With no shards configured every helper here is a no-op and everything stays
+on ``db.session``.
+"""
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session as PlainSession
+from sqlalchemy.sql.util import find_tables
+
+SHARDED_TABLES = frozenset({
+    "tbl_assessments", "tbl_assessment_answers", "tbl_assessment_results", "tbl_assessment_archive",
+})
+
+
+class ShardNotSelected(RuntimeError):
+    pass
+
+
+class ShardRouter:
+    def __init__(self):
+        self.keys: List[str] = []
+        self.max_workers = 8
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.keys)
+
+    def configure(self, app):
+        self.keys = list(app.config.get("DB_SHARD_BINDS") or [])
+        self.max_workers = app.config.get("DB_SHARD_FANOUT_WORKERS", 8)
+
+    def shard_for_user(self, user_id: int) -> Optional[str]:
+        if not self.keys:
+            return None
+        return self.keys[zlib.crc32(str(int(user_id)).encode()) % len(self.keys)]
+
+
+shard_router = ShardRouter()
+
+
+def targets_sharded_table(mapper=None, clause=None) -> bool:
+    if mapper is not None:
+        return getattr(mapper.local_table, "name", None) in SHARDED_TABLES
+    if clause is not None:
+        return any(getattr(t, "name", None) in SHARDED_TABLES for t in find_tables(clause, include_crud=True))
+    return False
+
+
+def shard_engine(session, engines):
+    """Engine for the shard selected on ``session`` (used by RoutingSession.get_bind)."""
+    key = session.info.get("shard")
+    if key is None:
+        raise ShardNotSelected(
+            "assessment tables are sharded: select a shard with use_shard/use_user_shard/"
+            "use_assessment_shard, or use fan_out for cross-shard queries"
+        )
+    return engines[key]
+
+
+def _session(session=None):
+    if session is None:
+        from app.extensions import db
+        session = db.session
+    return session
+
+
+def use_shard(key: Optional[str], session=None) -> Optional[str]:
+    session = _session(session)
+    current = session.info.get("shard")
+    if current is not None and current != key and (session.new or session.dirty or session.deleted):
+        raise RuntimeError(f"session has pending changes on {current}; commit before switching to {key}")
+    session.info["shard"] = key
+    return key
+
+
+def use_user_shard(user_id: int, session=None) -> Optional[str]:
+    """Select the shard new assessments of ``user_id`` are placed on."""
+    if not shard_router.enabled:
+        return None
+    return use_shard(shard_router.shard_for_user(user_id), session)
+
+
+def lookup_shard(assessment_id: int, session=None) -> Optional[str]:
+    if not shard_router.enabled:
+        return None
+    session = _session(session)
+    known = session.info.setdefault("shard_of", {})
+    if assessment_id not in known:
+        from app.models import AssessmentDirectory
+        known[assessment_id] = session.execute(
+            sa.select(AssessmentDirectory.shard_key).where(AssessmentDirectory.id == assessment_id)
+        ).scalar()
+    return known[assessment_id]
+
+
+def use_assessment_shard(assessment_id: int, session=None) -> Optional[str]:
+    """Select the shard holding ``assessment_id``; returns None if sharding is off or the id is unknown."""
+    key = lookup_shard(assessment_id, session)
+    if key is not None:
+        use_shard(key, session)
+    return key
+
+
+def assessment_shards_for_user(user_id: int, session=None) -> List[str]:
+    """Shards holding any assessment of ``user_id`` (normally exactly one)."""
+    if not shard_router.enabled:
+        return []
+    from app.models import AssessmentDirectory
+
+    session = _session(session)
+    keys = session.execute(
+        sa.select(AssessmentDirectory.shard_key).where(AssessmentDirectory.user_id == user_id).distinct()
+    ).scalars().all()
+    return sorted(keys, key=shard_router.keys.index) if keys else [shard_router.shard_for_user(user_id)]
+
+
+# ---- cross-shard reads ----
+
+def fan_out(fn: Callable, keys: Optional[Iterable[str]] = None) -> Dict[Optional[str], object]:
+    """
+    Run ``fn(session)`` once per shard, in parallel, and return {shard_key: result}.
+
+    Each call gets its own session bound to that shard, closed afterwards, so
+    ``fn`` should return plain rows/values rather than ORM instances. Without
+    sharding, ``fn`` runs once on ``db.session`` under the key None.
+    """
+    from app.extensions import db
+
+    if not shard_router.enabled:
+        return {None: fn(db.session)}
+
+    keys = list(keys) if keys is not None else list(shard_router.keys)
+    engines = {key: db.engines[key] for key in keys}
+
+    def run(key):
+        with PlainSession(bind=engines[key]) as session:
+            return fn(session)
+
+    if len(keys) == 1:
+        return {keys[0]: run(keys[0])}
+    with ThreadPoolExecutor(max_workers=min(shard_router.max_workers, len(keys))) as pool:
+        return dict(zip(keys, pool.map(run, keys)))
+
+
+def scalars_all_shards(stmt) -> list:
+    """Concatenated ``.scalars().all()`` of ``stmt`` over every shard."""
+    out = []
+    for values in fan_out(lambda s: s.execute(stmt).scalars().all()).values():
+        out.extend(values)
+    return out
+
+
+# ---- id allocation ----
+
+def _allocate_assessment_ids(session, flush_context, instances):
+    if not shard_router.enabled:
+        return
+    from app.models import Assessment, AssessmentDirectory
+
+    directory = AssessmentDirectory.__table__
+    for obj in list(session.new):
+        if not isinstance(obj, Assessment) or obj.id is not None:
+            continue
+        key = shard_router.shard_for_user(obj.user_id)
+        obj.id = session.execute(
+            directory.insert().values(user_id=obj.user_id, shard_key=key, created_at=sa.func.now())
+        ).inserted_primary_key[0]
+        session.info.setdefault("shard_of", {})[obj.id] = key
+        if session.info.get("shard") not in (None, key):
+            raise RuntimeError("cannot create assessments on two shards in one flush")
+        session.info["shard"] = key
+
+
+# ---- schema ----
+
+def shard_metadata() -> sa.MetaData:
+    """The sharded tables without their foreign keys to default-bind tables."""
+    from app.extensions import db
+
+    md = sa.MetaData()
+    for name in sorted(SHARDED_TABLES):
+        db.metadata.tables[name].to_metadata(md)
+    for table in md.tables.values():
+        for fk in list(table.foreign_key_constraints):
+            if fk.elements[0].target_fullname.split(".")[0] not in SHARDED_TABLES:
+                table.constraints.discard(fk)
+                for element in fk.elements:
+                    element.parent.foreign_keys.discard(element)
+                    table.foreign_keys.discard(element)
+    return md
+
+
+def create_shard_schema(keys: Optional[Iterable[str]] = None) -> List[str]:
+    from app.extensions import db
+
+    md = shard_metadata()
+    keys = list(keys) if keys is not None else list(shard_router.keys)
+    for key in keys:
+        md.create_all(db.engines[key])
+    return keys
+
+
+def init_sharding(app, db):
+    shard_router.configure(app)
+    if not sa.event.contains(db.session, "before_flush", _allocate_assessment_ids):
+        sa.event.listen(db.session, "before_flush", _allocate_assessment_ids)
@@ -0,0 +1,26 @@
+"""
+"Insert the row, or add to the one that is already there" for counter tables
+(daily rollups, symptom answer stats): one atomic statement on SQLite,
+PostgreSQL and MySQL / MariaDB, UPDATE-then-INSERT elsewhere.
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+
+def upsert_add(session, table, key: dict, counts: dict):
+    insert = table.insert()
+    dialect = session.get_bind(clause=insert).dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table).values(**key, **counts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key), set_={c: table.c[c] + stmt.excluded[c] for c in counts},
+        )
+        session.execute(stmt)
+    elif dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table).values(**key, **counts)
+        session.execute(stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in counts}))
+    else:
+        match = [table.c[k] == v for k, v in key.items()]
+        bump = sa.update(table).where(*match).values({c: table.c[c] + n for c, n in counts.items()})
+        if not session.execute(bump).rowcount:
+            session.execute(insert.values(**key, **counts))
@@ -0,0 +1,90 @@
+"""
+Shared helpers for the scripts in this package: build an app on a throwaway
+database, seed roles/users, log in through the API.
+"""
+import os
+import random
+import tempfile
+
+from app import create_app
+from app.extensions import db
+from app.models import Symptom, Rule, RuleCondition, Advice, Assessment, AssessmentAnswer, AssessmentResult, User
+from app.seed_rbac_v2 import seed_roles_permissions_v2
+from app.seed_users import seed_default_users
+
+USER_LOGIN = ("user@example.com", "User123!")
+ADMIN_LOGIN = ("admin@example.com", "Admin123!")
+
+
+def temp_sqlite_uri(name: str = "bench") -> str:
+    fd, path = tempfile.mkstemp(prefix=f"{name}-", suffix=".db")
+    os.close(fd)
+    return f"sqlite:///{path}"
+
+
+def build_app(db_uri: str = None, **overrides):
+    """Create the app on ``db_uri`` (a temp SQLite file by default) with all tables."""
+    cfg = {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": db_uri or temp_sqlite_uri(),
+        "JWT_SECRET_KEY": "bench-secret-key-that-is-long-enough-for-hs256",
+    }
+    cfg.update(overrides)
+    app = create_app(cfg)
+    with app.app_context():
+        db.create_all()
+        seed_roles_permissions_v2()
+        seed_default_users()
+    return app
+
+
+def login(client, email: str, password: str) -> dict:
+    r = client.post("/api/auth/login", json={"email": email, "password": password})
+    if r.status_code != 200:
+        raise RuntimeError(f"login failed for {email}: {r.status_code}")
+    return {"Authorization": "Bearer " + r.get_json()["access_token"]}
+
+
+def seed_history(n_symptoms: int = 40, n_rules: int = 300, n_assessments: int = 50, seed: int = 7):
+    """
+    Bulk-load a KB and completed assessments for the default user so list/history/report
+    endpoints return realistically sized payloads. Must run inside an app context.
+    """
+    rnd = random.Random(seed)
+
+    symptoms = [
+        Symptom(code=f"sym_{i}", question_text=f"Do you have symptom number {i}?", priority_order=i, is_active=True)
+        for i in range(n_symptoms)
+    ]
+    db.session.add_all(symptoms)
+    db.session.flush()
+
+    risks = ("LOW", "MODERATE", "HIGH")
+    for i in range(n_rules):
+        rule = Rule(
+            name=f"Synthetic rule {i}",
+            diagnosis_code="DIABETES_RISK",
+            risk_level=rnd.choice(risks),
+            priority=rnd.randint(0, 20),
+            is_active=True,
+        )
+        for s in rnd.sample(symptoms, rnd.randint(2, 5)):
+            rule.conditions.append(RuleCondition(symptom_id=s.id, expected_value=rnd.random() < 0.7))
+        db.session.add(rule)
+
+    for risk in risks:
+        db.session.add(Advice(
+            diagnosis_code="DIABETES_RISK", risk_level=risk, title=f"{risk} advice",
+            content="Please talk to a doctor about screening (FBS, HbA1c). " * 4, severity="INFO",
+        ))
+
+    user = User.query.filter_by(email=USER_LOGIN[0]).first()
+    for _ in range(n_assessments):
+        a = Assessment(user_id=user.id, status="COMPLETED")
+        for s in rnd.sample(symptoms, min(8, n_symptoms)):
+            a.answers.append(AssessmentAnswer(symptom_id=s.id, answer_bool=rnd.random() < 0.5))
+        a.result = AssessmentResult(diagnosis_code="DIABETES_RISK", risk_level=rnd.choice(risks), explanation_json="{}")
+        db.session.add(a)
+
+    db.session.commit()
+    return user
@@ -0,0 +1,188 @@
+"""
+Inference engine microbenchmarks on a synthetic KB (benchmarks/synthetic_kb.py).
+
+    python -m benchmarks.engine [--symptoms 40] [--rules 300] [--conditions 2-5] [--priorities uniform]
+                                [--samples 200] [--repeat 5] [--json]
+                                [--save-baseline PATH] [--baseline PATH] [--threshold 0.2]
+
+Inputs are simulated patients: random answers to the questions the engine
+asks until it concludes (``--answer-yes`` is P(YES)). Each case calls its
+function once per input and reports the median per-call time over --repeat
+rounds, in microseconds:
+
+    rule_status        _rule_status, one rule against a partial fact set
+    infer_diagnosis    infer_diagnosis on a partial fact set (compiled KB)
+    next_question      next_question for an IN_PROGRESS assessment
+    infer_if_complete  infer_if_complete finalizing an assessment (includes the commit)
+    build_report       build_report of a completed assessment
+
+--save-baseline writes the results with the parameters they were measured
+with; --baseline compares against such a file and exits 1 if a case is slower
+by more than --threshold (0.2 = 20%). Baselines are per machine: save one
+before a change, compare after it.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from app.extensions import db
+from app.models import Assessment, AssessmentAnswer, AssessmentResult, User
+from app.services.inference_engine import (
+    _rule_status, conclude, fact_masks, infer_diagnosis, infer_if_complete, next_question, select_question,
+)
+from app.services.kb_cache import kb_cache, pin_current_kb_version
+from app.services.report_builder import build_report
+from benchmarks.common import USER_LOGIN, build_app
+from benchmarks.synthetic_kb import add_arguments, generate_kb, kb_params, load_kb
+
+CASES = ("rule_status", "infer_diagnosis", "next_question", "infer_if_complete", "build_report")
+
+
+def _walk(kb, rnd: random.Random, p_yes: float) -> list:
+    """Answers [(symptom_id, answer)] of one simulated patient, in the order asked."""
+    facts, answers = {}, []
+    while conclude(kb, facts) is None:
+        question = select_question(kb, facts)
+        answer = rnd.random() < p_yes
+        facts[question.id] = answer
+        answers.append((question.id, answer))
+    return answers
+
+
+def _prefix(answers: list, rnd: random.Random) -> dict:
+    return dict(answers[:rnd.randint(0, max(0, len(answers) - 1))])
+
+
+def _add_assessment(kb, user_id: int, answers: list) -> int:
+    facts = dict(answers)
+    known, values = fact_masks(kb, facts)
+    a = Assessment(user_id=user_id, kb_version_id=kb.version_id, status="IN_PROGRESS",
+                   fact_known=known, fact_values=values)
+    for sid, answer in answers:
+        a.answers.append(AssessmentAnswer(symptom_id=sid, answer_bool=answer))
+    db.session.add(a)
+    db.session.flush()
+    return a.id
+
+
+def _reopen(ids: list):
+    """Undo infer_if_complete so the same assessments can be finalized again."""
+    db.session.execute(db.delete(AssessmentResult).where(AssessmentResult.assessment_id.in_(ids)))
+    db.session.execute(
+        db.update(Assessment).where(Assessment.id.in_(ids))
+        .values(status="IN_PROGRESS", completed_at=None, completion_seq=None)
+    )
+    db.session.commit()
+    db.session.expire_all()
+
+
+def _median_us(fn, inputs: list, repeat: int, reset=None) -> float:
+    rounds = []
+    for _ in range(repeat):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        for item in inputs:
+            fn(item)
+        rounds.append((time.perf_counter() - start) / len(inputs) * 1e6)
+    return round(statistics.median(rounds), 2)
+
+
+def run(args) -> dict:
+    app = build_app()
+    rnd = random.Random(args.seed)
+    results = {}
+    with app.app_context():
+        params = kb_params(args)
+        params["conditions"] = tuple(params["conditions"])
+        load_kb(generate_kb(**params))
+        kb = kb_cache.get(pin_current_kb_version())
+        db.session.commit()
+        user_id = db.session.query(User.id).filter_by(email=USER_LOGIN[0]).scalar()
+
+        walks = [_walk(kb, rnd, args.answer_yes) for _ in range(args.samples)]
+        partial = [_prefix(answers, rnd) for answers in walks]
+        pairs = [(rnd.choice(kb.rules), facts) for facts in partial]
+        results["rule_status"] = _median_us(lambda item: _rule_status(*item), pairs, args.repeat)
+        results["infer_diagnosis"] = _median_us(lambda facts: infer_diagnosis(facts, kb), partial, args.repeat)
+
+        asking = [_add_assessment(kb, user_id, list(facts.items())) for facts in partial]
+        finishing = [_add_assessment(kb, user_id, answers) for answers in walks]
+        db.session.commit()
+        asking_rows = Assessment.query.filter(Assessment.id.in_(asking)).all()
+        results["next_question"] = _median_us(next_question, asking_rows, args.repeat)
+
+        def finish(aid):
+            infer_if_complete(db.session.get(Assessment, aid))
+
+        results["infer_if_complete"] = _median_us(finish, finishing, args.repeat, reset=lambda: _reopen(finishing))
+        results["build_report"] = _median_us(build_report, finishing, args.repeat)
+
+    return {
+        "params": {**kb_params(args), "samples": args.samples, "repeat": args.repeat, "answer_yes": args.answer_yes},
+        "python": platform.python_version(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "avg_questions": round(sum(len(w) for w in walks) / len(walks), 2),
+        "results_us": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """[(case, baseline_us, current_us, change, regressed)] for cases in both."""
+    rows = []
+    for case in CASES:
+        before, after = baseline["results_us"].get(case), current["results_us"].get(case)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        rows.append((case, before, after, change, change > threshold))
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(ap)
+    ap.add_argument("--samples", type=int, default=200, help="simulated patients")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--answer-yes", type=float, default=0.5, help="P(YES) of a simulated answer")
+    ap.add_argument("--save-baseline", metavar="PATH")
+    ap.add_argument("--baseline", metavar="PATH", help="compare against this baseline")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging")
+    ap.add_argument("--json", dest="as_json", action="store_true", help="print results as JSON")
+    args = ap.parse_args(argv)
+
+    current = run(args)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fh:
+            json.dump(current, fh, indent=2)
+
+    if args.as_json:
+        print(json.dumps(current, indent=2))
+    else:
+        print(f"avg questions per patient: {current['avg_questions']}")
+        for case, us in current["results_us"].items():
+            print(f"{case:>18}  {us:>10.2f} us")
+
+    if not args.baseline:
+        return
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    if baseline.get("params") != current["params"]:
+        print(f"baseline {args.baseline} was measured with other parameters: {baseline.get('params')}", file=sys.stderr)
+        sys.exit(2)
+    rows = compare(current, baseline, args.threshold)
+    print(f"\n{'case':>18}  {'baseline':>10}  {'current':>10}  {'change':>8}")
+    for case, before, after, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{case:>18}  {before:>10.2f}  {after:>10.2f}  {change:>+7.1%}{flag}")
+    if any(row[4] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
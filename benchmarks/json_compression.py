@@ -0,0 +1,97 @@
+"""
+Bytes on the wire and serialization CPU per endpoint.
+
+    python -m benchmarks.json_compression [--rules 300] [--assessments 50] [--iterations 200]
+
+For each endpoint the JSON body is fetched once, then re-encoded with every
+available serializer and compressed with gzip/deflate at the configured level.
+"""
+import argparse
+import gzip
+import json
+import time
+import zlib
+
+from app.extensions import db
+from app.models import Assessment
+from app.utils.json_provider import orjson
+from benchmarks.common import ADMIN_LOGIN, USER_LOGIN, build_app, login, seed_history
+
+
+def _serializers():
+    out = {"stdlib": lambda o: json.dumps(o, sort_keys=True, separators=(",", ":")).encode("utf-8")}
+    if orjson is not None:
+        out["orjson"] = lambda o: orjson.dumps(o, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return out
+
+
+def _time_per_call(fn, arg, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - start) / iterations * 1e6  # microseconds
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--symptoms", type=int, default=40)
+    ap.add_argument("--rules", type=int, default=300)
+    ap.add_argument("--assessments", type=int, default=50)
+    ap.add_argument("--iterations", type=int, default=200)
+    ap.add_argument("--level", type=int, default=6, help="compression level")
+    ap.add_argument("--json", dest="as_json", action="store_true", help="print results as JSON")
+    args = ap.parse_args(argv)
+
+    app = build_app(COMPRESS_ENABLED=False)
+    with app.app_context():
+        seed_history(args.symptoms, args.rules, args.assessments)
+        report_id = db.session.query(db.func.max(Assessment.id)).scalar()
+
+    client = app.test_client()
+    user_h = login(client, *USER_LOGIN)
+    admin_h = login(client, *ADMIN_LOGIN)
+
+    endpoints = [
+        ("list_rules", "/api/kb/rules", admin_h),
+        ("list_symptoms", "/api/kb/symptoms", admin_h),
+        ("history", "/api/diagnosis/history", user_h),
+        ("report", f"/api/diagnosis/assessments/{report_id}/report", user_h),
+    ]
+    serializers = _serializers()
+
+    rows = []
+    for name, url, headers in endpoints:
+        r = client.get(url, headers=headers)
+        if r.status_code != 200:
+            raise RuntimeError(f"{url} -> {r.status_code}")
+        obj = json.loads(r.get_data())
+        row = {"endpoint": name}
+
+        for sname, fn in serializers.items():
+            row[f"{sname}_us"] = round(_time_per_call(fn, obj, args.iterations), 1)
+
+        body = serializers["stdlib"](obj)
+        row["raw_bytes"] = len(body)
+        for enc in ("gzip", "deflate"):
+            start = time.perf_counter()
+            if enc == "gzip":
+                packed = gzip.compress(body, compresslevel=args.level, mtime=0)
+            else:
+                packed = zlib.compress(body, args.level)
+            row[f"{enc}_bytes"] = len(packed)
+            row[f"{enc}_us"] = round((time.perf_counter() - start) * 1e6, 1)
+        row["ratio"] = round(len(body) / max(1, row["gzip_bytes"]), 1)
+        rows.append(row)
+
+    if args.as_json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    cols = list(rows[0].keys())
+    print("  ".join(f"{c:>14}" for c in cols))
+    for row in rows:
+        print("  ".join(f"{str(row[c]):>14}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
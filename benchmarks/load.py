@@ -0,0 +1,248 @@
+"""
+End-to-end load test of the diagnosis flow.
+
+    python -m benchmarks.load [--patients 200] [--concurrency 8] [--kb demo|synthetic]
+                              [--p-yes 0.5] [--p-yes-for CODE=P ...] [--lookahead 0]
+                              [--db URI] [--db-latency-ms 0] [--url http://127.0.0.1:5000] [--json]
+
+Every simulated patient registers, logs in, POSTs /start, answers until the
+assessment completes and GETs /report. An answer is YES with probability
+--p-yes, or the --p-yes-for override for that symptom code.
+
+By default the app runs in this process on --db (a throwaway SQLite file
+unless given) with the demo KB or a synthetic one (--kb synthetic, sized by
+the benchmarks/synthetic_kb.py options), and --concurrency threads drive it
+through the Flask test client. SQL statements are counted per request on
+every engine, and --db-latency-ms sleeps before each statement to imitate a
+database across a network.
+
+With --url the same flow goes over HTTP to a running server, against its
+own database and KB; SQL counts and the latency shim are not available there.
+
+Reported per endpoint: requests, errors (non-2xx), requests/s over the whole
+run, p50/p95/p99 latency and SQL statements per request.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.seed_kb import seed_demo_kb
+from benchmarks.common import build_app, temp_sqlite_uri
+from benchmarks.synthetic_kb import add_arguments, generate_kb, kb_params, load_kb
+
+ENDPOINTS = ("register", "login", "start", "answer", "report")
+PASSWORD = "LoadTest123!"
+
+
+# ---------- transports ----------
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, method: str, path: str, body=None, headers=None):
+        r = self.app.test_client().open(path, method=method, json=body, headers=headers or {})
+        return r.status_code, r.get_json(silent=True)
+
+
+class HttpTransport:
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def __call__(self, method: str, path: str, body=None, headers=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json", **(headers or {})})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                status, raw = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        try:
+            return status, json.loads(raw) if raw else None
+        except ValueError:
+            return status, None
+
+
+# ---------- SQL counting / latency shim (in-process only) ----------
+
+class SqlProbe:
+    """Counts statements per thread on the given engines; optionally sleeps before each one."""
+
+    def __init__(self, engines, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self._local = threading.local()
+        for engine in engines:
+            sa.event.listen(engine, "before_cursor_execute", self._before)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.count = getattr(self._local, "count", 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def count(self) -> int:
+        return getattr(self._local, "count", 0)
+
+
+# ---------- recording ----------
+
+class Recorder:
+    def __init__(self, probe=None):
+        self.probe = probe
+        self.samples = defaultdict(list)  # endpoint -> [(seconds, status, statements)]
+        self._lock = threading.Lock()
+
+    def call(self, transport, endpoint: str, method: str, path: str, body=None, headers=None):
+        before = self.probe.count() if self.probe else 0
+        start = time.perf_counter()
+        status, payload = transport(method, path, body, headers)
+        elapsed = time.perf_counter() - start
+        statements = self.probe.count() - before if self.probe else None
+        with self._lock:
+            self.samples[endpoint].append((elapsed, status, statements))
+        return status, payload
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))]
+
+
+def summarize(recorder: Recorder, wall: float) -> dict:
+    out = {}
+    for endpoint in ENDPOINTS:
+        samples = recorder.samples.get(endpoint, [])
+        if not samples:
+            continue
+        latencies = sorted(s[0] * 1000 for s in samples)
+        statements = [s[2] for s in samples if s[2] is not None]
+        out[endpoint] = {
+            "requests": len(samples),
+            "errors": sum(1 for s in samples if not 200 <= s[1] < 300),
+            "rps": round(len(samples) / wall, 1),
+            "p50_ms": round(_percentile(latencies, 0.50), 2),
+            "p95_ms": round(_percentile(latencies, 0.95), 2),
+            "p99_ms": round(_percentile(latencies, 0.99), 2),
+            "sql_per_request": round(sum(statements) / len(statements), 2) if statements else None,
+        }
+    return out
+
+
+# ---------- one patient ----------
+
+def patient(transport, recorder: Recorder, n: int, run_id: str, p_yes: float, p_yes_for: dict,
+            lookahead: int, seed: int) -> bool:
+    """Walk one simulated patient through the flow; True if a report came back."""
+    rnd = random.Random(seed * 1_000_003 + n)
+    email = f"load-{run_id}-{n}@example.com"
+    status, _ = recorder.call(transport, "register", "POST", "/api/auth/register",
+                              {"name": f"Load patient {n}", "email": email, "password": PASSWORD})
+    if status != 201:
+        return False
+    status, body = recorder.call(transport, "login", "POST", "/api/auth/login",
+                                 {"email": email, "password": PASSWORD})
+    if status != 200:
+        return False
+    headers = {"Authorization": "Bearer " + body["access_token"]}
+    query = f"?lookahead={lookahead}" if lookahead else ""
+
+    status, body = recorder.call(transport, "start", "POST", "/api/diagnosis/start" + query, headers=headers)
+    if status not in (200, 201) or not body:
+        return False
+    aid = body.get("assessment_id")
+    while body and body.get("next_question"):
+        question = body["next_question"]
+        answer = rnd.random() < p_yes_for.get(question.get("code"), p_yes)
+        status, body = recorder.call(transport, "answer", "POST", f"/api/diagnosis/assessments/{aid}/answer{query}",
+                                     {"symptom_id": question["symptom_id"], "answer": answer}, headers)
+        if status != 200:
+            return False
+    status, _ = recorder.call(transport, "report", "GET", f"/api/diagnosis/assessments/{aid}/report",
+                              headers=headers)
+    return status == 200
+
+
+# ---------- main ----------
+
+def _p_yes_override(value: str):
+    code, _, p = value.partition("=")
+    return code, float(p)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--patients", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--kb", choices=("demo", "synthetic"), default="demo")
+    add_arguments(ap)
+    ap.add_argument("--p-yes", type=float, default=0.5, help="P(YES) for any answer")
+    ap.add_argument("--p-yes-for", type=_p_yes_override, action="append", default=[], metavar="CODE=P",
+                    help="P(YES) for one symptom code (repeatable)")
+    ap.add_argument("--lookahead", type=int, default=0, help="?lookahead= on start/answer")
+    ap.add_argument("--db", default=None, help="SQLAlchemy URI for the in-process app (default: temp SQLite file)")
+    ap.add_argument("--db-latency-ms", type=float, default=0.0, help="sleep before every SQL statement")
+    ap.add_argument("--url", default=None, help="drive a running server instead of an in-process app")
+    ap.add_argument("--json", dest="as_json", action="store_true", help="print results as JSON")
+    args = ap.parse_args(argv)
+
+    probe = None
+    if args.url:
+        transport = HttpTransport(args.url)
+    else:
+        app = build_app(args.db or temp_sqlite_uri("load"))
+        with app.app_context():
+            if args.kb == "demo":
+                seed_demo_kb()
+            else:
+                params = kb_params(args)
+                params["conditions"] = tuple(params["conditions"])
+                load_kb(generate_kb(**params))
+            probe = SqlProbe(set(db.engines.values()), args.db_latency_ms)
+        transport = TestClientTransport(app)
+
+    recorder = Recorder(probe)
+    run_id = uuid.uuid4().hex[:8]
+    p_yes_for = dict(args.p_yes_for)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        done = list(pool.map(
+            lambda n: patient(transport, recorder, n, run_id, args.p_yes, p_yes_for, args.lookahead, args.seed),
+            range(args.patients),
+        ))
+    wall = time.perf_counter() - start
+
+    report = {
+        "patients": args.patients,
+        "completed": sum(done),
+        "concurrency": args.concurrency,
+        "wall_s": round(wall, 2),
+        "patients_per_s": round(sum(done) / wall, 2),
+        "avg_answers": round(len(recorder.samples.get("answer", [])) / max(1, sum(done)), 2),
+        "endpoints": summarize(recorder, wall),
+    }
+    if args.as_json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['completed']}/{report['patients']} patients in {report['wall_s']}s "
+          f"({report['patients_per_s']}/s, {report['avg_answers']} answers each, concurrency {args.concurrency})")
+    cols = ("requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "sql_per_request")
+    print(f"{'endpoint':>10}  " + "  ".join(f"{c:>15}" for c in cols))
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:>10}  " + "  ".join(f"{str(row[c]):>15}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
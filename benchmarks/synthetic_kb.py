@@ -0,0 +1,119 @@
+"""
+Synthetic knowledge bases of any size, as kb-snapshot documents.
+
+    python -m benchmarks.synthetic_kb [PATH] [--symptoms 40] [--rules 300] [--conditions 2-5]
+                                      [--priorities uniform|skewed|tiers] [--max-priority 20]
+                                      [--diagnoses 1] [--yes-ratio 0.7] [--seed 7]
+
+Priorities: ``uniform`` over 0..max, ``skewed`` (most rules near 0, a few
+high) or ``tiers`` (three levels, so many rules tie and the engine's
+same-priority specificity check matters). The document loads with
+``flask kb import PATH`` (.gz compresses, - for stdout); ``load_kb`` imports
+it inside an app context.
+"""
+import argparse
+import random
+from datetime import datetime
+from typing import Tuple
+
+from app.extensions import db
+from app.services.kb_snapshot import FORMAT, FORMAT_VERSION, dump_snapshot, import_snapshot
+
+PRIORITIES = ("uniform", "skewed", "tiers")
+RISKS = ("LOW", "MODERATE", "HIGH")
+
+
+def _priority(rnd: random.Random, distribution: str, max_priority: int) -> int:
+    if distribution == "uniform":
+        return rnd.randint(0, max_priority)
+    if distribution == "skewed":
+        return int(max_priority * rnd.random() ** 3)
+    if distribution == "tiers":
+        return rnd.choice((0, max_priority // 2, max_priority))
+    raise ValueError(f"unknown priority distribution {distribution!r}")
+
+
+def generate_kb(symptoms: int = 40, rules: int = 300, conditions: Tuple[int, int] = (2, 5),
+                priorities: str = "uniform", max_priority: int = 20, diagnoses: int = 1,
+                yes_ratio: float = 0.7, seed: int = 7) -> dict:
+    """A kb-snapshot document; ``conditions`` is the (min, max) number per rule."""
+    rnd = random.Random(seed)
+    codes = [f"sym_{i}" for i in range(symptoms)]
+    diagnosis_codes = ["DIABETES_RISK"] + [f"SYNTHETIC_DX_{i}" for i in range(1, diagnoses)]
+    low, high = conditions
+    return {
+        "format": FORMAT,
+        "format_version": FORMAT_VERSION,
+        "kb_version": None,
+        "exported_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "symptoms": [
+            {"code": code, "question_text": f"Do you have symptom number {i}?", "category": None,
+             "is_active": True, "priority_order": i}
+            for i, code in enumerate(codes)
+        ],
+        "rules": [
+            {
+                "name": f"Synthetic rule {i}",
+                "diagnosis_code": rnd.choice(diagnosis_codes),
+                "risk_level": rnd.choice(RISKS),
+                "priority": _priority(rnd, priorities, max_priority),
+                "is_active": True,
+                "conditions": [
+                    [code, rnd.random() < yes_ratio]
+                    for code in rnd.sample(codes, min(symptoms, rnd.randint(low, high)))
+                ],
+            }
+            for i in range(rules)
+        ],
+        "advices": [
+            {"diagnosis_code": d, "risk_level": risk, "title": f"{d} {risk} advice",
+             "content": "Please talk to a doctor about screening (FBS, HbA1c). " * 4,
+             "severity": "INFO", "is_active": True}
+            for d in diagnosis_codes for risk in RISKS
+        ],
+    }
+
+
+def load_kb(snapshot: dict) -> dict:
+    """Import ``snapshot`` into the current database and commit; returns the import summary."""
+    summary = import_snapshot(snapshot)
+    db.session.commit()
+    return summary
+
+
+def parse_range(value: str) -> Tuple[int, int]:
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+def add_arguments(ap: argparse.ArgumentParser):
+    ap.add_argument("--symptoms", type=int, default=40)
+    ap.add_argument("--rules", type=int, default=300)
+    ap.add_argument("--conditions", type=parse_range, default=(2, 5), help="per rule, MIN-MAX")
+    ap.add_argument("--priorities", choices=PRIORITIES, default="uniform")
+    ap.add_argument("--max-priority", type=int, default=20)
+    ap.add_argument("--diagnoses", type=int, default=1)
+    ap.add_argument("--yes-ratio", type=float, default=0.7, help="share of conditions expecting YES")
+    ap.add_argument("--seed", type=int, default=7)
+
+
+def kb_params(args) -> dict:
+    return {
+        "symptoms": args.symptoms, "rules": args.rules, "conditions": list(args.conditions),
+        "priorities": args.priorities, "max_priority": args.max_priority, "diagnoses": args.diagnoses,
+        "yes_ratio": args.yes_ratio, "seed": args.seed,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("path", nargs="?", default="-")
+    add_arguments(ap)
+    args = ap.parse_args(argv)
+    params = kb_params(args)
+    params["conditions"] = tuple(params["conditions"])
+    dump_snapshot(generate_kb(**params), args.path)
+
+
+if __name__ == "__main__":
+    main()
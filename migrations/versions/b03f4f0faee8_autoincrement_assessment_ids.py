@@ -0,0 +1,44 @@
+"""autoincrement assessment ids
+
+Revision ID: b03f4f0faee8
+Revises: a3c55d7f792d
+Create Date: 2026-10-19 04:06:04.220503
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b03f4f0faee8'
+down_revision = 'a3c55d7f792d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite only: without AUTOINCREMENT a deleted (archived) top id is handed out again.
+    # Other backends never reuse sequence values.
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('tbl_assessments', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+    # continue above every id handed out so far, archived ones included
+    top = conn.execute(sa.text(
+        "SELECT max(id) FROM (SELECT max(id) AS id FROM tbl_assessments"
+        " UNION ALL SELECT max(id) FROM tbl_assessment_archive)"
+    )).scalar()
+    if top:
+        conn.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'tbl_assessments'"))
+        conn.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('tbl_assessments', :top)"), {"top": top})
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('tbl_assessments', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
@@ -0,0 +1,52 @@
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.seed_kb import seed_demo_kb
+from app.seed_rbac_v2 import seed_roles_permissions_v2
+from app.seed_users import seed_default_users
+from app.services import session_store as session_store_module
+from app.services.session_store import session_store
+
+USER_LOGIN = ("user@example.com", "User123!")
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """``make_app(**config)``: an app on one SQLite file per test; later calls are restarted workers."""
+    monkeypatch.setattr(session_store_module, "_shared_local", None)
+    uri = f"sqlite:///{tmp_path / 'test.db'}"
+    seeded = []
+
+    def make(**overrides):
+        cfg = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": uri,
+            "JWT_SECRET_KEY": "test-secret-key-that-is-long-enough-for-hs256",
+            "SESSION_STORE_FLUSH_THREAD": False,
+            "SESSION_STORE_FLUSH_INTERVAL": 1000,
+        }
+        cfg.update(overrides)
+        app = create_app(cfg)
+        if not seeded:
+            with app.app_context():
+                db.create_all()
+                seed_roles_permissions_v2()
+                seed_default_users()
+                seed_demo_kb()
+            seeded.append(True)
+        return app
+
+    yield make
+    session_store.stop()
+    session_store.backend = None
+
+
+@pytest.fixture
+def login():
+    """``login(client)``: bearer headers for the seeded patient account."""
+    def do(client, email: str = USER_LOGIN[0], password: str = USER_LOGIN[1]) -> dict:
+        r = client.post("/api/auth/login", json={"email": email, "password": password})
+        assert r.status_code == 200, r.get_json()
+        return {"Authorization": "Bearer " + r.get_json()["access_token"]}
+    return do
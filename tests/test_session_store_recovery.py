@@ -0,0 +1,110 @@
+"""Crash recovery of the write-behind answer store (app/services/session_store.py)."""
+import os
+
+import pytest
+
+from app.extensions import db
+from app.models import AssessmentAnswer
+from app.services.session_store import AssessmentState, session_store
+
+
+def _answer_rows(app, assessment_id):
+    with app.app_context():
+        return sorted(
+            db.session.query(AssessmentAnswer.symptom_id, AssessmentAnswer.answer_bool)
+            .filter(AssessmentAnswer.assessment_id == assessment_id).all()
+        )
+
+
+def _start(client, headers):
+    r = client.post("/api/diagnosis/start", headers=headers)
+    assert r.status_code in (200, 201), r.get_json()
+    body = r.get_json()
+    return body["assessment_id"], body["next_question"]["symptom_id"]
+
+
+def _answer(client, headers, assessment_id, symptom_id, answer=True):
+    r = client.post(f"/api/diagnosis/assessments/{assessment_id}/answer", headers=headers,
+                    json={"symptom_id": symptom_id, "answer": answer})
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()
+
+
+def _next(client, headers, assessment_id):
+    r = client.get(f"/api/diagnosis/assessments/{assessment_id}/next", headers=headers)
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()["next_question"]["symptom_id"]
+
+
+@pytest.mark.parametrize("spec", ["memory", "local"])
+def test_flush_is_idempotent(make_app, login, spec):
+    app = make_app(SESSION_STORE=spec)
+    client = app.test_client()
+    headers = login(client)
+    aid, first = _start(client, headers)
+    _answer(client, headers, aid, first)
+    assert _answer_rows(app, aid) == []
+
+    with app.app_context():
+        crashed = session_store.backend.get(aid)
+        assert session_store.flush() == 1
+        assert session_store.flush() == 0
+        # the worker died after the commit but before dropping its pending answers
+        session_store.backend.update(aid, lambda _: AssessmentState(aid, crashed.facts, crashed.pending))
+        assert session_store.backend.dirty_ids() == [aid]
+        assert session_store.flush() == 0
+        assert session_store.backend.dirty_ids() == []
+
+    assert _answer_rows(app, aid) == [(first, True)]
+
+
+def test_memory_store_loses_unflushed_answers(make_app, login):
+    app = make_app(SESSION_STORE="memory")
+    client = app.test_client()
+    headers = login(client)
+    aid, first = _start(client, headers)
+    second = _answer(client, headers, aid, first)["next_question"]["symptom_id"]
+    with app.app_context():
+        assert session_store.flush() == 1
+    assert _answer(client, headers, aid, second)["next_question"]  # still in progress: nothing flushed
+
+    restarted = make_app(SESSION_STORE="memory")
+    client = restarted.test_client()
+    # the flushed answer survives; the unflushed one is gone and its question comes again
+    assert _answer_rows(restarted, aid) == [(first, True)]
+    assert _next(client, headers, aid) == second
+    _answer(client, headers, aid, second)
+    with restarted.app_context():
+        assert session_store.flush() == 1
+    assert _answer_rows(restarted, aid) == sorted([(first, True), (second, True)])
+
+
+def _resume_after_restart(make_app, login, spec):
+    app = make_app(SESSION_STORE=spec)
+    client = app.test_client()
+    headers = login(client)
+    aid, first = _start(client, headers)
+    following = _answer(client, headers, aid, first)["next_question"]["symptom_id"]
+    assert _answer_rows(app, aid) == []
+
+    restarted = make_app(SESSION_STORE=spec)
+    client = restarted.test_client()
+    assert _next(client, headers, aid) == following
+    with restarted.app_context():
+        assert session_store.flush() == 1
+    assert _answer_rows(restarted, aid) == [(first, True)]
+
+
+def test_local_store_resumes_after_worker_restart(make_app, login):
+    _resume_after_restart(make_app, login, "local")
+
+
+def test_redis_store_resumes_after_worker_restart(make_app, login):
+    pytest.importorskip("redis")
+    url = os.environ.get("TEST_REDIS_URL")
+    if not url:
+        pytest.skip("set TEST_REDIS_URL to run against a Redis server")
+    try:
+        _resume_after_restart(make_app, login, url)
+    finally:
+        session_store.backend.clear()